@@ -8,6 +8,17 @@ let commandQueue = [];
 let overrideMessage = null; 
 let overridePromiseResolve = null; // Store resolve function for external trigger
 
+// Seconds the main native host may hold a keep_alive open waiting for messages (overrides are sent after it returns)
+const LONG_POLL_SECONDS = 10;
+
+// Keep one connectNative port to the main native host instead of launching it for every message
+const USE_STREAMING_HOST = false;
+const STREAM_RECONNECT_ATTEMPTS = 5; // Reconnects tried after the port drops before falling back to keep_alive polling
+const STREAM_RECONNECT_DELAY_MS = 500; // First reconnect delay, doubled after every failed attempt
+let mainHostPort = null; // Open port while streaming, null otherwise
+let mainHostReconnects = 0; // Failed reconnects since the port last delivered a message
+let mainHostChunks = {}; // {chunk id: [text parts]} of pushed messages above the 1 MB native messaging limit
+
 const Background_Protocols = {
   async generate_ID() {
     // Name: generate_ID
@@ -57,16 +68,22 @@ const Background_Protocols = {
   },
 
   CommunicationProtocols: {
-    async communicateWithMainHost(initialMessage) {
+    async communicateWithMainHost(initialMessage, streaming = USE_STREAMING_HOST) {
       // Name: communicateWithMainHost
       // Description: This function is used to communicate with the main native host
       // Prerequisites: The main native host must be setup
-      // Inputs: initialMessage (object) - The initial message to send to the main native host
+      // Inputs: initialMessage (object) - The initial message to send to the main native host, streaming (boolean) - Use a connectNative port instead of polling
       // Outputs: None
       // Tags: Communication, Native Messaging, Message, Messaging, Main Host, Background, Send Message, Receive Message, Handle Message
       // Subprotocols: Background_Protocols.CommunicationProtocols.sendMainHostMessage, Background_Protocols.CommunicationProtocols.handleGeneralMessages
       // Location: Background_Protocols.CommunicationProtocols.communicateWithMainHost
 
+      if (streaming) {
+        // Replies are pushed over the port, so there is nothing to poll for
+        this.connectMainHost(initialMessage);
+        return;
+      }
+
       let continueCommunication = true;
       let lastMessageWasOverride = false; // Track if the last message was an override
 
@@ -103,7 +120,8 @@ const Background_Protocols = {
           // Prepare the next message to keep the communication alive
           if (continueCommunication && !overrideMessage) {
             console.log('Setting next message as keep_alive');
-            initialMessage = { action: "keep_alive" };
+            // Ask for every pending message in one reply, letting the host hold the reply until one arrives
+            initialMessage = { action: "keep_alive", batch: true, wait: LONG_POLL_SECONDS };
           }
 
         } catch (error) {
@@ -113,6 +131,60 @@ const Background_Protocols = {
       }
     },
 
+    connectMainHost(initialMessage) {
+      // Name: connectMainHost
+      // Description: This function is used to open a persistent port to the main native host, which pushes messages as they arrive; a dropped port is reconnected with backoff, then replaced by keep_alive polling
+      // Prerequisites: The main native host must be setup
+      // Inputs: initialMessage (object) - The first message to send over the port
+      // Outputs: None
+      // Tags: Communication, Native Messaging, Main Host, Background, Port, Streaming, Receive Message
+      // Subprotocols: Background_Protocols.CommunicationProtocols.handleGeneralMessages
+      // Location: Background_Protocols.CommunicationProtocols.connectMainHost
+
+      mainHostPort = chrome.runtime.connectNative('com.jarvis.mainnativehost');
+      mainHostPort.onMessage.addListener((message) => {
+        if (message.chunk) {
+          // Large messages arrive as slices of their JSON text; join them once all are here
+          const { id, index, count } = message.chunk;
+          const parts = mainHostChunks[id] = mainHostChunks[id] || [];
+          parts[index] = message.data;
+          if (parts.filter((part) => part !== undefined).length < count) {
+            return;
+          }
+          delete mainHostChunks[id];
+          message = JSON.parse(parts.join(''));
+        }
+        mainHostReconnects = 0; // The port works again
+        console.log('Pushed from main native host:', message);
+        Background_Protocols.CommunicationProtocols.handleGeneralMessages(message);
+      });
+      mainHostPort.onDisconnect.addListener(() => {
+        console.error('Main native host disconnected:', chrome.runtime.lastError);
+        mainHostPort = null; // Messages sent meanwhile fall back to sendNativeMessage
+        mainHostChunks = {};
+
+        if (mainHostReconnects < STREAM_RECONNECT_ATTEMPTS) {
+          const delay = STREAM_RECONNECT_DELAY_MS * 2 ** mainHostReconnects;
+          mainHostReconnects += 1;
+          console.log(`Reconnecting to main native host in ${delay} ms`);
+          setTimeout(() => Background_Protocols.CommunicationProtocols.connectMainHost(null), delay);
+        } else {
+          // Nothing would deliver messages from MAIN_COMMUNICATION any more; poll for them instead
+          console.warn('Main native host port keeps dropping, falling back to keep_alive polling');
+          mainHostReconnects = 0;
+          Background_Protocols.CommunicationProtocols.communicateWithMainHost(
+            { action: "keep_alive", batch: true, wait: LONG_POLL_SECONDS },
+            false
+          );
+        }
+      });
+
+      mainHostPort.postMessage({ action: "stream" }); // Switches the host into streaming mode
+      if (initialMessage) {
+        mainHostPort.postMessage(initialMessage);
+      }
+    },
+
     async sendnextMainHostNMessage(altMessage) {
       // Name: sendnextMainHostNMessage
       // Description: This function is used to temporarily override the keep_alive message and send a custom message to the main native host
@@ -138,11 +210,17 @@ const Background_Protocols = {
       // Description: This function is used to send a message to the main native host
       // Prerequisites: The main native host must be setup
       // Inputs: message (object) - The message to send to the main native host
-      // Outputs: Promise - Resolves with the response from the main native host
+      // Outputs: Promise - Resolves with the response from the main native host ({} while streaming, replies are pushed)
       // Tags: Communication, Native Messaging, Message, Messaging, Main Host, Background, Send Message
       // Subprotocols: None
       // Location: Background_Protocols.CommunicationProtocols.sendMainHostMessage
 
+      if (mainHostPort) {
+        // Streaming: the frame is relayed and any reply arrives through the port listener
+        mainHostPort.postMessage(message);
+        return {};
+      }
+
       return new Promise((resolve, reject) => {
           chrome.runtime.sendNativeMessage('com.jarvis.mainnativehost', message, (response) => {
               if (chrome.runtime.lastError) {
@@ -211,14 +289,33 @@ const Background_Protocols = {
       // Name: handleGeneralMessages
       // Description: This function is used to handle general messages from different sources
       // Prerequisites: None
-      // Inputs: message (object) - The message to handle, sender (object), sendResponse (function)
+      // Inputs: message (object) - The message to handle, or a batch {messages: [...]} from the main native host, sender (object), sendResponse (function)
       // Outputs: Boolean - Indicates if the message was handled successfully
       // Tags: Communication, Message, Messaging, Background, Handle Message
       // Subprotocols: Background_Protocols.CommunicationProtocols.sendMainHostMessage, Background_Protocols.CommunicationProtocols.sendMessageToSpecificTab
       // Location: Background_Protocols.CommunicationProtocols.handleGeneralMessages
 
+      // Batched replies from the main native host: handle every message in order
+      if (message && Array.isArray(message.messages)) {
+        for (const batchedMessage of message.messages) {
+          await Background_Protocols.CommunicationProtocols.handleGeneralMessages(batchedMessage, sender, sendResponse);
+        }
+        if (message.error) {
+          console.warn('Main native host:', message.error);
+        }
+        return true;
+      }
+
+      // Empty keep_alive replies and host errors carry no receiver
+      if (!message || typeof message.receiver !== 'string') {
+        if (message && message.error) {
+          console.warn('Main native host:', message.error);
+        }
+        return true;
+      }
+
       console.log('Handling message from tab:', message);
-    
+
       if (message.receiver.startsWith('Protocols/')) {
         // Route the message to the main host
         Background_Protocols.CommunicationProtocols.sendMainHostMessage(message);
@@ -5,17 +5,34 @@ import subprocess
 import threading
 import zmq
 import json
-import ast
 import random
 import hashlib
-
-from assets.globalvariable import GlobalVariable
+import atexit
+
+from assets.protocolregistry import ProtocolRegistry
+from assets.segments import SegmentedLog, SegmentReader
+from assets.ringbuffer import RingBuffer, RingFileReader
+from assets.dispatcher import MessageDispatcher
+from assets.router import PrefixRouter
+from assets.codec import LineDecoder
+from assets.async_engine import AsyncEngine
+from assets.zygote import ZygoteClient
+from assets.inprocess import InProcessChannel, InProcessProtocol, runs_in_process
+from assets.metrics import LatencyHistogram
+from assets.protocolpool import ProtocolPool
+from assets.teardown import stop_processes, join_threads
+from assets.protocol_runtime import describe_startup
+from assets.readiness import ReadinessRegistry
+from assets.message import Message, to_wire
+from assets import wirecodec
+from assets import logger as logging_runtime
 
 
 #%% Constants
 PYTHON_INTERPRETER = "/usr/local/bin/python3"
 LOG_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.basename(os.path.abspath(__file__)).replace("_", "").replace(".py", ".log"))
 open(LOG_FILE_PATH, 'a').close() # Create log file if not exist
+logger = logging_runtime.get_logger(LOG_FILE_PATH)
 
 def find_local_folder(folder_name="Jarvis-on-Github"):
     current_path = os.path.abspath(__file__)  # Absolute path of the current script
@@ -35,109 +52,172 @@ def find_local_folder(folder_name="Jarvis-on-Github"):
 LOCAL_FOLDER = find_local_folder()
 EXTENSION_COMMS_LOG = LOCAL_FOLDER + "Communication-Folder/extension_comms.log"
 COMPUTER_COMMS_LOG = LOCAL_FOLDER + "Communication-Folder/computer_comms.log"
+COMMS_SEGMENT_BYTES = 1024 * 1024 # Size at which a comms bus starts a new segment file
+USE_COMMS_RING = False # Exchange messages with the native host through shared-memory ring buffers, keeping the files as fallback
+EXTENSION_COMMS_RING = LOCAL_FOLDER + "Communication-Folder/extension_comms.ring"
+COMPUTER_COMMS_RING = LOCAL_FOLDER + "Communication-Folder/computer_comms.ring"
+COMMS_RING_BYTES = 1024 * 1024 # Capacity of each ring buffer
+COMMS_RING_SEND_TIMEOUT = 0.05 # Seconds to wait for room in a full ring before falling back to the file bus
 
 MESSAGE_RATE = 10 # Rate at which messages are sent per seconds
-
-#-- active_protocols = {subprotocolID: {subprotocol_path, mother_protocolID, main_protocolID, process, pipe, loaded, thread, other_info: {}}}
-active_protocols = GlobalVariable({})
+DISPATCH_POOL_SIZE = 8 # Worker threads handling messages from the extension
+DISPATCH_QUEUE_DEPTH = 256 # Messages each worker may have queued before the reader blocks
+DISPATCH_BLOCKING_WORKERS = 16 # Subprotocols whose MAIN_COMMUNICATION commands, which may block until a protocol loads, run at once
+USE_ASYNC_ENGINE = False # Multiplex every pipe and the extension channel on one event loop instead of threads
+ASYNC_ENGINE_WORKERS = 8 # Threads the async engine may use for blocking MAIN_COMMUNICATION commands
+USE_ZYGOTE = False # Fork protocols from a pre-warmed zygote instead of starting a fresh interpreter
+ZYGOTE_IDLE_WORKERS = 2 # Pre-forked workers the zygote keeps waiting for a script
+ZYGOTE_SOCKET = LOCAL_FOLDER + "Communication-Folder/zygote.sock"
+PROTOCOL_LOAD_TIMEOUT = 30 # Seconds to wait for "Protocol loaded" before giving up on an activation
+PROTOCOL_SETUP_GRACE = 1 # Seconds a timed-out activation still waits for its setup thread before cleaning up
+TEARDOWN_GRACE_SECONDS = 2 # Seconds deactivated protocols get to exit after SIGTERM before they are killed
+TEARDOWN_KILL_SECONDS = 1 # Seconds to wait for killed protocols before giving up on them
+USE_PROTOCOL_POOL = False # Keep finished protocols that support "rebind" alive and reuse them for the next activation of the same script
+PROTOCOL_POOL_SIZE = 8 # Idle protocol instances kept at most; the least recently used is stopped first
+PROTOCOL_POOL_IDLE_TTL = 300 # Seconds an idle pooled protocol is kept before it is stopped
+PROTOCOL_RELEASE_TIMEOUT = 5 # Seconds a deactivated protocol gets to finish its work and confirm it is idle before it is stopped instead of pooled
+ALLOW_IN_PROCESS_PROTOCOLS = False # Run protocols whose docstring says "Execution: in-process" on a thread here instead of a subprocess
+
+#-- active_protocols = {subprotocolID: {subprotocol_path, mother_protocolID, main_protocolID, process, pipe, loaded, comms_handler, codec, other_info: {}}}
+active_protocols = ProtocolRegistry() # Indexed by mother_protocolID and main_protocolID for subtree lookups
 context = zmq.Context() # Initialize the ZMQ context
+line_decoder = LineDecoder() # JSON first, literal_eval only for legacy lines
+# Comms buses are segmented (<log>.00000000, ...); consumed segments are deleted once the reader acknowledges them
+extension_bus = SegmentedLog(EXTENSION_COMMS_LOG, segment_bytes=COMMS_SEGMENT_BYTES)
+computer_bus = SegmentedLog(COMPUTER_COMMS_LOG, segment_bytes=COMMS_SEGMENT_BYTES)
+extension_ring = None # Set by start_comms_rings when USE_COMMS_RING is enabled
+computer_ring = None # Set by start_comms_rings when USE_COMMS_RING is enabled
+async_engine = None # Set by start_async_engine when USE_ASYNC_ENGINE is enabled
+zygote = None # Set by start_zygote when USE_ZYGOTE is enabled
+protocol_pool = None # Set by start_protocol_pool when USE_PROTOCOL_POOL is enabled
+spawn_latency = LatencyHistogram() # Time from spawn to "Protocol loaded", labelled "cold", "warm", "in-process" or "pooled"
+protocol_readiness = ReadinessRegistry() # Completed by the "Protocol loaded" response, keyed by subprotocolID
+protocol_releases = ReadinessRegistry() # Completed by the "Protocol released" response, keyed by the release request's messageID
 
 
 #%% Logs
 def log(message, file_path=LOG_FILE_PATH):
     """Utility function to log into the log file"""    
-    with open(file_path, "a") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    logging_runtime.get_logger(file_path).info(message)
 
 def clear_log(file_path):
     """Utility function to clear the contents of a log file"""
-    with open(file_path, "w") as log_file:
-        log_file.write("")  # Clear the file content
+    logging_runtime.clear(file_path)
     log(f"Log file {file_path} cleared.")
 
 def clear_all_logs():
     """Utility function to clear all logs it is connected to"""
     # Clear logs on start
     clear_log(LOG_FILE_PATH)
-    clear_log(COMPUTER_COMMS_LOG)
-    clear_log(EXTENSION_COMMS_LOG)
+    computer_bus.reset()
+    extension_bus.reset()
     log("All logs cleared.")
 
 
 
 #%% Communications
 def send_google_message(message):
-    """Send message to the extension through the computer_comms.log file"""
-    json_message = json.dumps(message)
-    with open(COMPUTER_COMMS_LOG, "a") as log_file:
-        log_file.write(f"{str(json_message)}\n")
+    """Send message to the extension through the computer ring, or the computer_comms.log file"""
+    json_message = to_wire(message)
+    if computer_ring is not None:
+        # Overflows to the file bus, keeping the order the native host reads them in
+        computer_ring.send_or_append(json_message, computer_bus, timeout=COMMS_RING_SEND_TIMEOUT)
+    else:
+        computer_bus.append(json_message)
 
     print(f"Sent to Google Jarvis: {str(json_message)}")
 
-def initialize_google_message_receiver():
-    """Continuously read new messages from the extension log file in real-time."""
-    global MESSAGE_RATE
-    last_position = 0  # Track last read position
-
-    if not os.path.exists(EXTENSION_COMMS_LOG):
-        log(f"Extension log file not found: {EXTENSION_COMMS_LOG}")
-        return
-
+def decode_extension_lines(lines):
+    """Parses a batch of lines from the extension into message dicts, logging the ones that fail."""
+    messages = []
+    fallbacks = line_decoder.fallbacks
+    for line, message, error in line_decoder.decode_batch(lines):
+        if error is not None or not isinstance(message, dict):
+            log(f"Failed to parse: {line} | Error: {error or 'not a message dict'}")
+            continue
+        logger.info("Processing: %s", line)
+        messages.append(message)
+
+    if line_decoder.fallbacks != fallbacks:
+        log(f"Legacy lines parsed with literal_eval: {line_decoder.stats()}")
+    return messages
+
+def main_command_key(message):
+    """Orders MAIN_COMMUNICATION commands per subprotocol, so a deactivate never overtakes the activate before it.
+
+    Never the sender: a "Protocol loaded" response must not queue behind the activation waiting for it."""
+    input = message.get('input')
+    return input.get('subprotocolID', '') if isinstance(input, dict) else ''
+
+def receive_extension_messages(source, dispatcher):
+    """Feeds every batch read from source (a SegmentReader or RingBuffer) to the dispatcher."""
     while True:
         try:
-            with open(EXTENSION_COMMS_LOG, "r") as comm_file:
-                comm_file.seek(last_position)  # Move to last known position
-
-                for line in comm_file:
-                    line = line.strip()
-                    if not line:  # Skip empty lines
-                        continue
-
-                    log(f"Processing: {line}")
-                    try:
-                        message = ast.literal_eval(line)
-                        threading.Thread(
-                            target=handle_message, 
-                            args=(message,),
-                            daemon=True
-                        ).start()
-                    except (SyntaxError, ValueError) as e:
-                        log(f"Failed to parse: {line} | Error: {e}")
-
-                # Update last known position
-                last_position = comm_file.tell()
-
-            # Sleep before retrying (allows new messages to be written)
-            time.sleep(1 / MESSAGE_RATE)
+            for lines in source.follow_batches():
+                for message in decode_extension_lines(lines):
+                    dispatcher.submit(message)
 
-            # Check if the file has been truncated (reset position if needed)
-            if os.path.getsize(EXTENSION_COMMS_LOG) < last_position:
-                last_position = 0  # Reset position if file is cleared
+                source.ack()  # Segments before the cursor are consumed and can be deleted
 
-        except FileNotFoundError:
-            log(f"File not found: {EXTENSION_COMMS_LOG}")
-            time.sleep(1 / MESSAGE_RATE)  # Wait and retry
         except Exception as e:
             log(f"Error in message receiver: {e}")
             time.sleep(1 / MESSAGE_RATE)
 
+def initialize_google_message_receiver():
+    """Continuously read new messages from the extension log file in real-time."""
+    global MESSAGE_RATE
+
+    # Keeps the segment open and sleeps until new data is appended
+    reader = SegmentReader(extension_bus, poll_interval=1 / MESSAGE_RATE)
+    # Handles messages on a fixed pool, keeping them in order per receiver
+    dispatcher = MessageDispatcher(
+        handle_message,
+        pool_size=DISPATCH_POOL_SIZE,
+        queue_depth=DISPATCH_QUEUE_DEPTH,
+        on_error=lambda message, e: log(f"Error handling {message}: {type(e).__name__} - {e}"),
+        name="extension-dispatcher",
+        # activate_subprocess waits for the protocol to load; keep it off the shard workers
+        blocking=lambda message: message_router.resolve(message.get('receiver', '')) is handle_message_for_main,
+        blocking_workers=DISPATCH_BLOCKING_WORKERS,
+        blocking_key=main_command_key
+    )
+    if extension_ring is not None:
+        # The native host writes to the ring, and to the file only when the ring is unavailable or full; read both in order
+        reader = RingFileReader(extension_ring, reader)
+    receive_extension_messages(reader, dispatcher)
+
 def send_subprocess_message(message, subprotocolID):
     """Send a message to a subprocess via its pipe."""
     global active_protocols
 
-    if not isinstance(message, dict):
+    if not isinstance(message, (dict, Message)):
         raise ValueError("Message must be a dictionary.")
 
-    if subprotocolID in active_protocols:
-        pipe = active_protocols[subprotocolID]['pipe']
-        try:
-            pipe.send_string(json.dumps(message))
-            log(f"Sent to {subprotocolID}: {message}")
-        except zmq.ZMQError as e:
-            log(f"Error sending to {subprotocolID}: {e}")
+    # One lookup, so the pipe and codec belong to the same entry even if it is being torn down
+    subprocess_info = active_protocols.get(subprotocolID)
+    if subprocess_info is not None:
+        send_to_protocol_instance(message, subprotocolID, subprocess_info)
     else:
         log(f"Subprocess {subprotocolID} not found.")
 
+def send_to_protocol_instance(message, subprotocolID, subprocess_info):
+    """Sends a message through the pipe in subprocess_info, also for protocols no longer in active_protocols."""
+    pipe = subprocess_info['pipe']
+    if isinstance(pipe, InProcessChannel):
+        pipe.send(message)  # Handed over as is, nothing to encode
+        logger.info("Sent to %s: %s", subprotocolID, message)
+        return
+    # Binary frames once the protocol has negotiated a codec, one JSON string otherwise
+    frames = wirecodec.encode(message, subprocess_info.get('codec'))
+    try:
+        if async_engine is not None:
+            async_engine.send(pipe, frames)
+        else:
+            pipe.send_multipart(frames)
+        logger.info("Sent to %s: %s", subprotocolID, message)
+    except zmq.ZMQError as e:
+        log(f"Error sending to {subprotocolID}: {e}")
+
 
 
 
@@ -178,6 +258,102 @@ def generate_subprocessID(script_path):
     """Generates a unique subprotocol ID based on the script path."""
     return f"subprocess_{script_path}_{generate_ID()}"
 
+def close_protocol_instances(instances):
+    """Stops protocols that left active_protocols, given as [(subprotocolID, info)], all at once.
+
+    The processes are signalled together and reaped under one deadline, escalating
+    to SIGKILL in bulk; pipes are closed and communication threads joined only
+    once the processes are gone."""
+    if not instances:
+        return
+    deadline = time.monotonic() + TEARDOWN_GRACE_SECONDS + TEARDOWN_KILL_SECONDS
+    report = stop_processes([info['process'] for _, info in instances], grace=TEARDOWN_GRACE_SECONDS, kill_timeout=TEARDOWN_KILL_SECONDS)
+    log(f"Stopped {len(instances)} protocols: {len(report['exited'])} already stopped, {len(report['terminated'])} terminated, "
+        f"{len(report['killed'])} killed, {len(report['stuck'])} still running.")
+
+    for subprotocolID, info in instances:
+        pipe = info['pipe']
+        try:
+            if async_engine is not None and not isinstance(pipe, InProcessChannel):
+                async_engine.remove_socket(pipe)
+            else:
+                pipe.close()
+        except Exception as e:
+            log(f"Error closing pipe for {subprotocolID or info['subprocess_path']}: {type(e).__name__} - {e}")
+
+    alive = join_threads([info.get('comms_handler') for _, info in instances], deadline)
+    if alive:
+        log(f"{len(alive)} communication threads still running after teardown.")
+
+def request_release(subprotocolID):
+    """Takes a poolable protocol out of active_protocols and asks it to confirm once it is idle.
+
+    Returns (subprotocolID, subprocess_info, release messageID) for finish_releases(),
+    or None if the protocol cannot be pooled and has to be stopped."""
+    if protocol_pool is None:
+        return None
+    # Checked and removed in one step, so a concurrent teardown cannot also stop it
+    with active_protocols.transaction():
+        subprocess_info = active_protocols[subprotocolID]
+        if subprocess_info is None or not subprocess_info.get('rebindable') or subprocess_info['process'].poll() is not None:
+            return None
+        del active_protocols[subprotocolID]
+
+    release_message = {
+        "request": "release",
+        "input": None,
+        "sender": "Main-communication/MAIN_COMMUNICATION.py",
+        "receiver": subprotocolID,
+        "messageID": f"Main-communication/MAIN_COMMUNICATION.py_{generate_ID()}",
+        "other_info": {}
+    }
+    protocol_releases.expect(release_message['messageID'])
+    send_to_protocol_instance(release_message, subprotocolID, subprocess_info)
+    return subprotocolID, subprocess_info, release_message['messageID']
+
+def finish_releases(releasing):
+    """Pools the protocols that confirmed they are idle. Returns the others, as [(subprotocolID, info)], to be stopped.
+
+    A protocol still running the previous activation must not be handed to the next
+    one, so every protocol that does not confirm within PROTOCOL_RELEASE_TIMEOUT is
+    stopped instead."""
+    deadline = time.monotonic() + PROTOCOL_RELEASE_TIMEOUT
+    stopping = []
+    for subprotocolID, subprocess_info, messageID in releasing:
+        released = protocol_releases.wait(messageID, timeout=max(0.0, deadline - time.monotonic()))
+        protocol_releases.discard(messageID)
+        if not released or subprocess_info['process'].poll() is not None:
+            log(f"{subprotocolID} did not confirm it is idle; stopping it instead of pooling it.")
+            stopping.append((subprotocolID, subprocess_info))
+            continue
+        instance = {key: subprocess_info.get(key) for key in ('subprocess_path', 'process', 'pipe', 'comms_handler', 'codec', 'rebindable')}
+        protocol_pool.release(subprotocolID, instance['subprocess_path'], instance)
+        log(f"{subprotocolID} returned to the protocol pool.")
+    return stopping
+
+def reuse_pooled_protocol(script_path, subprotocolID, protocol_info):
+    """Rebinds an idle pooled instance of script_path to subprotocolID. Returns False on a pool miss."""
+    if protocol_pool is None:
+        return False
+    instance = protocol_pool.acquire(script_path, is_alive=lambda instance: instance['process'].poll() is None)
+    if instance is None:
+        return False
+
+    subprocess_info = {**instance, **protocol_info, 'loaded': True, "other_info": {}}
+    active_protocols[subprotocolID] = subprocess_info
+    # The same info a new subprocess would read from stdin; the protocol adopts the new identity
+    subprocess_info = json.loads(json.dumps({subprotocolID: subprocess_info}, default=lambda obj: str(obj)))
+    rebind_message = {
+        "request": "rebind",
+        "input": subprocess_info,
+        "sender": "Main-communication/MAIN_COMMUNICATION.py",
+        "receiver": subprotocolID,
+        "messageID": f"Main-communication/MAIN_COMMUNICATION.py_{generate_ID()}",
+        "other_info": {}
+    }
+    send_subprocess_message(rebind_message, subprotocolID)
+    return True
+
 def initialize_subprocess(script_path, subprotocolID, protocol_info=None):
     """Activates a subprocess using the file path."""
     global active_protocols
@@ -186,14 +362,90 @@ def initialize_subprocess(script_path, subprotocolID, protocol_info=None):
         """Handles messages received from the subprocess."""
         while True:
             try:
-                message = json.loads(pipe.recv_string().replace("'", '"'))
+                frames = pipe.recv_multipart(copy=False)
+                if wirecodec.is_hello(frames):
+                    answer_codec_offer(pipe, frames)
+                    continue
+                message = wirecodec.decode(frames)
+            except (ValueError, TypeError) as e:
+                log(f"Failed to parse message from {subprotocolID}: {e}")
+                continue
+            except zmq.ZMQError as e:
+                log(f"Error in communication with {subprotocolID}: {e}")
+                break
 
-                log(f"Received message from {subprotocolID}: {message}")
+            try:
+                logger.info("Received message from %s: %s", subprotocolID, message)
                 handle_message(message)
+            except (ValueError, TypeError) as e:
+                log(f"Failed to handle message from {subprotocolID}: {e}")
             except zmq.ZMQError as e:
                 log(f"Error in communication with {subprotocolID}: {e}")
                 break
 
+    def answer_codec_offer(pipe, frames):
+        """Picks the wire codec offered by the subprocess and confirms it."""
+        codec, reply = wirecodec.answer(frames)
+        active_protocols.set_path([subprotocolID, 'codec'], codec)
+        if async_engine is not None:
+            async_engine.send(pipe, reply)
+        else:
+            pipe.send_multipart(reply)
+        log(f"{subprotocolID} uses the {codec.name.decode()} codec.")
+
+    def parse_frames(frames):
+        """Decodes frames read by the async engine, answering the codec handshake."""
+        if wirecodec.is_hello(frames):
+            answer_codec_offer(active_protocols.get_path([subprotocolID, 'pipe']), frames)
+            return None
+        return wirecodec.decode(frames)
+
+    def handle_inprocess_communication(channel):
+        """Handles messages posted by an in-process protocol."""
+        while True:
+            message = channel.receive()
+            if message is None:
+                break
+            logger.info("Received message from %s: %s", subprotocolID, message)
+            try:
+                handle_message(Message.coerce(message))
+            except (ValueError, TypeError) as e:
+                log(f"Failed to handle message from {subprotocolID}: {e}")
+
+    def start_in_process():
+        """Runs the protocol on a thread of MAIN_COMMUNICATION. Returns False if it has to run as a subprocess."""
+        nonlocal spawn_mode
+
+        channel = InProcessChannel()
+        process = InProcessProtocol(script_path, subprotocolID, channel)
+        protocol_info.update({
+            'process': process,
+            'pipe': channel,
+            'loaded': False,
+            'comms_handler': None,
+            'codec': None
+        })
+        subprocess_info = {'subprocess_path': script_path, **protocol_info, "other_info": {}}
+        active_protocols[subprotocolID] = subprocess_info
+        # The protocol sees the same info a subprocess reads from stdin
+        subprocess_info = json.loads(json.dumps({subprotocolID: subprocess_info}, default=lambda obj: str(obj)))
+        try:
+            process.start(subprocess_info)
+        except Exception as e:
+            log(f"{subprotocolID} cannot run in-process, starting a subprocess: {type(e).__name__} - {e}")
+            channel.close()
+            return False
+
+        communication_thread = threading.Thread(target=handle_inprocess_communication, args=(channel,), daemon=True)
+        communication_thread.start()
+        with active_protocols.transaction():
+            active_protocols.set_path([subprotocolID, 'comms_handler'], communication_thread)
+            active_protocols.set_path([subprotocolID, 'loaded'], True)
+        spawn_mode = "in-process"
+        protocol_readiness.mark_ready(subprotocolID)
+        log(f"{script_path} running in-process.")
+        return True
+
     def generate_ipc_path(subprotocolID):
         """Generates a unique pipe ID based on the subprotocol ID."""
         # SubprotocolID format: subprocess_{script_path}_{unique_ID}
@@ -203,111 +455,123 @@ def initialize_subprocess(script_path, subprotocolID, protocol_info=None):
 
     def setup_pipe():
         """Sets up the pipe for communication with the subprocess."""
+        nonlocal spawn_mode
+
+        if ALLOW_IN_PROCESS_PROTOCOLS and runs_in_process(script_path) and start_in_process():
+            return
+
         # Create a communication pipe
-        pipe = context.socket(zmq.PAIR)
+        pipe = (async_engine.context if async_engine is not None else context).socket(zmq.PAIR)
         pipe.bind(f"ipc://{generate_ipc_path(subprotocolID)}")
 
-        # Start the subprocess
-        process = subprocess.Popen(
-            [PYTHON_INTERPRETER, os.path.abspath(script_path)],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            text=True
-        )
+        # Start the subprocess, forked warm from the zygote when available
+        process = None
+        if zygote is not None:
+            try:
+                process = zygote.spawn(script_path)
+                spawn_mode = "warm"
+            except (OSError, RuntimeError) as e:
+                log(f"Zygote spawn failed for {subprotocolID}, starting cold: {e}")
+        if process is None:
+            process = subprocess.Popen(
+                [PYTHON_INTERPRETER, os.path.abspath(script_path)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True
+            )
         protocol_info.update({
             'process': process,
             'pipe': pipe,
             'loaded': False,
-            'comms_handler': None
+            'comms_handler': None,
+            'codec': None  # Set by the codec handshake; None means JSON strings
         })
         active_protocols[subprotocolID] = {'subprocess_path': script_path, **protocol_info, "other_info": {}}
         log(f"Subprocess {script_path} started.")
+        if abandoned.is_set():
+            # The activation timed out while we were spawning and its cleanup may have missed us
+            deactivate_subprocess(subprotocolID)
+            return
 
         send_initial_message()
 
+        # Let the event loop read the pipe instead of a dedicated thread
+        if async_engine is not None:
+            async_engine.add_socket(pipe, parse=parse_frames, multipart=True)
+            log(f"Pipe for {subprotocolID} registered with the async engine.")
+            return
+
         # Start the communication thread
         communication_thread = threading.Thread(target=handle_subprocess_communication, args=(pipe,), daemon=True)
         communication_thread.start()
-        active_protocols[subprotocolID]['comms_handler'] = communication_thread
+        active_protocols.set_path([subprotocolID, 'comms_handler'], communication_thread)
         log(f"Communication thread for {subprotocolID} started.")
     
     def send_initial_message():
         # Send the subprocess information to the subprocess
-        subprocess_info = json.dumps({subprotocolID: active_protocols[subprotocolID]}, default=lambda obj: str(obj)) + "\n"
-        active_protocols[subprotocolID]['process'].stdin.write(subprocess_info)
-        active_protocols[subprotocolID]['process'].stdin.flush()
-        active_protocols[subprotocolID]['process'].stdin.close()
+        info = active_protocols[subprotocolID]
+        subprocess_info = json.dumps({subprotocolID: info}, default=lambda obj: str(obj)) + "\n"
+        info['process'].stdin.write(subprocess_info)
+        info['process'].stdin.flush()
+        info['process'].stdin.close()
         log(f"Subprocess info sent to {subprotocolID}.")
 
     def wait_until_loaded():
         """Waits until the subprocess is loaded."""
         log(f"Waiting for {subprotocolID} to load...")
-        while not active_protocols.get(subprotocolID).get('loaded'):
-            time.sleep(1/MESSAGE_RATE)
+        loaded = protocol_readiness.wait(subprotocolID, timeout=PROTOCOL_LOAD_TIMEOUT)
+        protocol_readiness.discard(subprotocolID)
+        if not loaded:
+            # Stop whatever did start, so no process, pipe or registry entry outlives the failed activation
+            abandoned.set()  # A spawn finishing after the grace stops its own protocol
+            setup_thread.join(PROTOCOL_SETUP_GRACE)
+            deactivate_subprocess(subprotocolID)
+            raise TimeoutError(f"{subprotocolID} did not load within {PROTOCOL_LOAD_TIMEOUT}s")
+        spawn_latency.record(spawn_mode, time.perf_counter() - spawn_started)
         log(f"{subprotocolID} loaded.")
 
+    spawn_started = time.perf_counter()
+    if reuse_pooled_protocol(script_path, subprotocolID, protocol_info):
+        spawn_latency.record("pooled", time.perf_counter() - spawn_started)
+        log(f"{subprotocolID} reuses a pooled {script_path}.")
+        return
+
+    protocol_readiness.expect(subprotocolID)
+    spawn_mode = "cold"  # Set to "warm" or "in-process" by setup_pipe
+
     # Start the setup pipe in a separate thread
-    threading.Thread(target=setup_pipe, daemon=True).start()
+    abandoned = threading.Event()  # Set once wait_until_loaded gives up on the activation
+    setup_thread = threading.Thread(target=setup_pipe, daemon=True)
+    setup_thread.start()
     wait_until_loaded()
 
 def deactivate_subprocess(subprotocolID):
     """Deactivates a subprotocol and its dependent subprotocols, starting from the given protocol."""
-    global active_protocols
-
-    # Find dependents based on mother_protocolID
-    dependents = [
-        key for key, value in active_protocols.items()
-        if value['mother_protocolID'] == subprotocolID
-    ]
-
-    # Recursively deactivate dependents first
-    for dependent_id in dependents:
-        deactivate_subprocess(dependent_id)
-
-    # Deactivate the main subprotocol
-    if subprotocolID in active_protocols:
-        #-- active_protocols = {subprotocolID: {subprotocol_path, mother_protocolID, main_protocolID, process, pipe, loaded, thread, other_info: {}}}
-        subprocess_info = active_protocols[subprotocolID]
-        script_path = subprocess_info['subprocess_path']
-        process = subprocess_info['process']
-        pipe = subprocess_info['pipe']
-        communication_thread = subprocess_info['thread']
-        other_info = subprocess_info['other_info']
-
-        # Close the communication pipe
-        try:
-            pipe.close()
-            log(f"Pipe for {script_path} closed.")
-        except Exception as e:
-            log(f"Error closing pipe for {script_path}: {type(e).__name__} - {e}")
-
-        # Terminate the subprocess
-        try:
-            if process.poll() is None:
-                process.terminate()
-                process.wait(timeout=2)  # Ensure it exits properly
-                log(f"{subprotocolID} terminated.")
-            else:
-                log(f"{subprotocolID} already stopped.")
-        except subprocess.TimeoutExpired:
-            process.kill()
-            log(f"{subprotocolID} forcefully killed.")
-
-        # Wait for the communication thread to exit
-        if communication_thread and communication_thread.is_alive():
-            try:
-                communication_thread.join(timeout=2)  # Give it some time to clean up
-                log(f"Communication thread for {script_path} stopped.")
-            except Exception as e:
-                log(f"Error stopping communication thread for {script_path}: {type(e).__name__} - {e}")
-
-        # Remove the subprocess from the global list
-        del active_protocols[subprotocolID]
-        log(f"Subprotocol {script_path} successfully deactivated.")
-    else:
+    # Dependents before their mothers; the registry walks only this protocol's subtree
+    subtree = active_protocols.subtree(subprotocolID)
+    if subprotocolID not in subtree:
         log(f"Subprotocol {subprotocolID} does not exist.")
 
+    stopping = []
+    releasing = []
+    for protocolID in subtree:
+        # Keep the protocol warm for the next activation of the same script, once it has gone idle
+        release = request_release(protocolID)
+        if release is not None:
+            releasing.append(release)
+            continue
+
+        subprocess_info = active_protocols.pop(protocolID)
+        if subprocess_info is not None:  # None if deactivated concurrently
+            stopping.append((protocolID, subprocess_info))
+
+    # Releases are confirmed concurrently; the whole subtree is then stopped together, in about one grace period
+    stopping += finish_releases(releasing)
+    close_protocol_instances(stopping)
+    for protocolID, subprocess_info in stopping:
+        log(f"Subprotocol {subprocess_info['subprocess_path']} successfully deactivated.")
+
 def activate_subprocess(script_path, input, subprotocolID, mother_protocolID=None, main_protocolID=None):
     """Activates a protocol (main or subprotocol) with the given input and mother protocol ID"""
     # Activate the subprocess
@@ -317,12 +581,13 @@ def activate_subprocess(script_path, input, subprotocolID, mother_protocolID=Non
         mother_protocolID = "Main-communication/MAIN_COMMUNICATION.py"
     protocol_info = { 
         'mother_protocolID': mother_protocolID,
-        'main_protocolID': subprotocolID if (mother_protocolID is None or mother_protocolID=='Main-communication/MAIN_COMMUNICATION.py') else active_protocols[mother_protocolID]['main_protocolID']
+        'main_protocolID': subprotocolID if (mother_protocolID is None or mother_protocolID=='Main-communication/MAIN_COMMUNICATION.py') else active_protocols.get_path([mother_protocolID, 'main_protocolID'])
     }
     try:
         initialize_subprocess(script_path, subprotocolID, protocol_info)
     except Exception as e:
         log(f"Error activating {subprotocolID}: {e}")
+        return  # Nothing is running to receive the start message
     
     # Send the start message to the subprocess
     start_message = {
@@ -340,7 +605,7 @@ def activate_subprocess(script_path, input, subprotocolID, mother_protocolID=Non
 
 def handle_message_for_main(message, command_map=None):
     """Handles messages for MAIN_COMMUNICATION"""
-    log(f"Handling message for MAIN_COMMUNICATION: {message}")
+    logger.info("Handling message for MAIN_COMMUNICATION: %s", message)
     # Action / Request
     if message.get('request') or message.get('action'):
         command = message.get('request') or message.get('action')
@@ -352,6 +617,7 @@ def handle_message_for_main(message, command_map=None):
                 "initialize_subprocess": initialize_subprocess,
                 "deactivate_subprocess": deactivate_subprocess,
                 "activate_subprocess": activate_subprocess,
+                "get_protocol_pool_stats": lambda: protocol_pool.stats() if protocol_pool is not None else {},
             }
 
         # Check if the command is recognized
@@ -364,21 +630,14 @@ def handle_message_for_main(message, command_map=None):
         try:
             output = func(**message['input']) if message.get('input') else func()
             if output is not None:
-                log("Output: " + str(output))
-                response_message = {
-                    "response": f"{message.get('messageID')} completed",
-                    "input": output,
-                    "sender": message.get('receiver'),
-                    "receiver": message.get('sender'),
-                    "messageID": message.get('messageID'),
-                    "other_info": {}
-                }
+                logger.info("Output: %s", output)
+                response_message = Message.coerce(message).respond(output)
         except TypeError as e:
             log(f"Error executing {command}: {e}")
 
         # Respond
         if message.get('request'):
-            if response_message == {}:
+            if not response_message:
                 send_response_message(message, default=True)
             else:
                 send_response_message(response_message, default=False)
@@ -386,8 +645,19 @@ def handle_message_for_main(message, command_map=None):
     # Response
     elif message.get('response'):
         if message.get('response') == "Protocol loaded":
-            active_protocols[message.get('sender')]['loaded'] = True
+            # Both flags change together, so request_release never sees a loaded protocol without its rebindable flag
+            with active_protocols.transaction():
+                active_protocols.set_path([message.get('sender'), 'loaded'], True)
+                active_protocols.set_path([message.get('sender'), 'rebindable'], bool((message.get('other_info') or {}).get('rebindable')))
+            protocol_readiness.mark_ready(message.get('sender'))
             log(f"Subprocess {message.get('sender')} loaded.")
+            startup = (message.get('other_info') or {}).get('startup')
+            if startup:
+                log(f"{message.get('sender')}: {describe_startup(startup)}")
+
+        elif message.get('response') == "Protocol released":
+            # The protocol finished its in-flight work; finish_releases may pool it
+            protocol_releases.mark_ready(message.get('messageID'))
 
     # Error
     else:
@@ -401,45 +671,54 @@ MESSAGE_HANDLERS = {
     "tab_": send_google_message,
     "MAIN-communication/MAIN_COMMUNICATION.py": handle_message_for_main,
 }
+# Longest-prefix router over MESSAGE_HANDLERS; use message_router.register/unregister to change routes at runtime
+message_router = PrefixRouter(MESSAGE_HANDLERS)
 
 def send_response_message(message, default=True):
     """Sends a response message to the appropriate receiver."""
     if default:
-        message = {
-            "response": f"{message.get('messageID')} completed",
-            "input": None,
-            "sender": message.get('receiver'),
-            "receiver": message.get('sender'),
-            "messageID": message.get('messageID'),
-            "other_info": {}
-        }
+        message = Message.coerce(message).respond()
     
     # Determine the correct handler dynamically
     receiver = message.get('receiver', '')
-    for prefix, handler in MESSAGE_HANDLERS.items():
-        if receiver.startswith(prefix):
-            handler(message)
-            return
+    if message_router.route(message):
+        return
 
-    log(f"Warning: Response message not sent to {receiver}: {message}")
+    logger.warning("Response message not sent to %s: %s", receiver, message)
 
 def handle_message(message):
     """Handles all messages from subprocesses and the extension."""
     # Check if the message is empty
-    if message == {}:
+    if not message:
         return
 
-    log(f"Handling message from {message.get('sender')}: {message}")
+    logger.info("Handling message from %s: %s", message.get('sender'), message)
     
     # Determine the correct handler dynamically
     receiver = message.get('receiver', '')
-    for prefix, handler in MESSAGE_HANDLERS.items():
-        if receiver.startswith(prefix):
-            handler(message)
-            return
+    if message_router.route(message):
+        return
 
     log(f"Warning: Message not sent to {receiver}")
 
+async def handle_message_async(message):
+    """Coroutine counterpart of handle_message used by the async engine."""
+    if not message:
+        return
+
+    logger.info("Handling message from %s: %s", message.get('sender'), message)
+
+    receiver = message.get('receiver', '')
+    handler = message_router.resolve(receiver)
+    if handler is None:
+        log(f"Warning: Message not sent to {receiver}")
+    elif handler is handle_message_for_main:
+        # Commands such as activate_subprocess block until the protocol loads
+        await async_engine.run_blocking(handler, message)
+    else:
+        # Sending to a pipe or the extension file does not block
+        handler(message)
+
 
 
 # %% Debug Tools
@@ -448,14 +727,84 @@ def debug_write_extension_comms(message):
 
     json_message = json.dumps(message)
 
-    log(f"Writing into extension_comms: {str(json_message)}")
+    logger.info("Writing into extension_comms: %s", json_message)
 
-    with open(EXTENSION_COMMS_LOG, "a") as log_file:
-        log_file.write(f"{str(json_message)}\n")
+    extension_bus.append(json_message)
 
 
 
 # %% Startup
+def start_zygote():
+    """Starts the zygote that forks pre-warmed protocol workers"""
+    global zygote
+
+    client = ZygoteClient(PYTHON_INTERPRETER, ZYGOTE_SOCKET, idle_workers=ZYGOTE_IDLE_WORKERS)
+    if client.wait_ready():
+        zygote = client
+        log("Zygote started")
+    else:
+        client.close()
+        log("Zygote failed to start, protocols will be started cold")
+
+def start_protocol_pool():
+    """Starts the warm protocol pool and the thread that stops protocols idle for too long"""
+    global protocol_pool
+
+    protocol_pool = ProtocolPool(max_size=PROTOCOL_POOL_SIZE, idle_ttl=PROTOCOL_POOL_IDLE_TTL, on_evict=lambda instances: close_protocol_instances([(None, instance) for instance in instances]))
+
+    def evict_idle_protocols():
+        while True:
+            time.sleep(PROTOCOL_POOL_IDLE_TTL / 4)
+            evicted = protocol_pool.evict_idle()
+            if evicted:
+                log(f"Stopped {evicted} idle pooled protocols. Pool: {protocol_pool}")
+
+    threading.Thread(target=evict_idle_protocols, daemon=True).start()
+    log("Protocol pool started")
+
+def start_comms_rings():
+    """Creates the ring buffers shared with the native host, staying on the file bus if that fails"""
+    global extension_ring, computer_ring
+
+    try:
+        extension_ring = RingBuffer(EXTENSION_COMMS_RING, capacity=COMMS_RING_BYTES, create=True)
+        computer_ring = RingBuffer(COMPUTER_COMMS_RING, capacity=COMMS_RING_BYTES, create=True)
+    except (OSError, ValueError) as e:
+        log(f"Comms rings unavailable, using the comms files only: {e}")
+        extension_ring = computer_ring = None
+        return
+    # The native host checks the owner PID in the header; removing the files also covers a restart without rings
+    atexit.register(remove_comms_rings)
+    log("Comms rings started")
+
+def remove_comms_rings():
+    """Deletes the ring buffers so the native host goes back to the comms files"""
+    for path in (EXTENSION_COMMS_RING, COMPUTER_COMMS_RING):
+        RingBuffer.remove(path)
+
+def start_async_engine():
+    """Starts the event loop that reads every pipe and the extension channel"""
+    global async_engine
+
+    async_engine = AsyncEngine(
+        handle_message_async,
+        max_workers=ASYNC_ENGINE_WORKERS,
+        on_error=lambda message, e: log(f"Error handling {message}: {type(e).__name__} - {e}")
+    )
+    async_engine.start()
+
+    reader = SegmentReader(extension_bus, poll_interval=1 / MESSAGE_RATE)
+    if extension_ring is not None:
+        reader = RingFileReader(extension_ring, reader)
+
+    def parse_lines(lines):
+        messages = decode_extension_lines(lines)
+        reader.ack()
+        return messages
+
+    async_engine.watch_file(reader, parse_lines)
+    log("Async engine started")
+
 def start_main_communication():
     """Starts up the MAIN_COMMUNICATION process"""
     
@@ -463,8 +812,22 @@ def start_main_communication():
     clear_all_logs()
     log("MAIN_COMMUNICATION started")
 
-    extension_comms_thread = threading.Thread(target=initialize_google_message_receiver, daemon=True)
-    extension_comms_thread.start()
+    if USE_COMMS_RING:
+        start_comms_rings()
+    else:
+        remove_comms_rings()  # Left behind by an earlier run with rings
+
+    if USE_ZYGOTE:
+        start_zygote()
+
+    if USE_PROTOCOL_POOL:
+        start_protocol_pool()
+
+    if USE_ASYNC_ENGINE:
+        start_async_engine()
+    else:
+        extension_comms_thread = threading.Thread(target=initialize_google_message_receiver, daemon=True)
+        extension_comms_thread.start()
 
     message = {
         "action": "activate_subprocess",
@@ -477,6 +840,9 @@ def start_main_communication():
     handle_message_for_main(message)
     time.sleep(10)
     log(active_protocols)
+    log(f"Protocol startup latency: {spawn_latency}")
+    if protocol_pool is not None:
+        log(f"Protocol pool: {protocol_pool}")
 
 
 
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import zmq
+import zmq.asyncio
+
+
+class AsyncEngine:
+    def __init__(self, handler, max_workers=8, key=None, on_error=None):
+        """Single event loop that multiplexes every protocol pipe and the extension channel.
+
+        handler is a coroutine function called with each incoming message. Messages that
+        share a key (the sender by default) are handled in arrival order, the same order
+        a per-pipe reader thread would give. Blocking work is pushed to a bounded thread
+        pool with run_blocking(), so the thread count does not grow with protocol count."""
+        self.handler = handler
+        self.key = key or (lambda message: message.get('sender', ''))
+        self.on_error = on_error
+        self.context = zmq.asyncio.Context.instance()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-engine")
+        self.loop = None
+
+        self._thread = None
+        self._ready = threading.Event()
+        self._poller = None
+        self._parsers = {}  # {socket: (parse, multipart)}
+        self._tails = {}  # {key: last scheduled task}, keeps per-key ordering
+        self._watchers = []
+        self._wake_send = None
+        self._wake_recv = None
+
+    ## === LIFECYCLE === ##
+
+    def start(self):
+        """Starts the event loop in a background thread and waits until it is running."""
+        self._thread = threading.Thread(target=self._run, name="async-engine", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._poller = zmq.asyncio.Poller()
+
+        # Inproc pair used to wake the poller when sockets are added or removed
+        wake_address = f"inproc://async-engine-wake-{id(self)}"
+        self._wake_recv = self.context.socket(zmq.PAIR)
+        self._wake_recv.bind(wake_address)
+        self._wake_send = self.context.socket(zmq.PAIR)
+        self._wake_send.connect(wake_address)
+        self._poller.register(self._wake_recv, zmq.POLLIN)
+
+        self.loop.create_task(self._poll_sockets())
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def stop(self):
+        """Stops the event loop and closes every registered socket."""
+        if self.loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        self._thread.join()
+        self.executor.shutdown(wait=False)
+
+    async def _shutdown(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for cleanup in self._watchers:
+            cleanup()
+        for socket in list(self._parsers):
+            socket.close(linger=0)
+        self._parsers.clear()
+        self._wake_send.close(linger=0)
+        self._wake_recv.close(linger=0)
+        self.loop.stop()
+
+    def _call(self, func, *args):
+        """Runs func on the loop thread, directly if already there."""
+        if threading.current_thread() is self._thread:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    def _wake(self):
+        self._wake_send.send(b"")
+
+    ## === SOCKETS === ##
+
+    def add_socket(self, socket, parse=json.loads, multipart=False):
+        """Starts reading messages from a zmq.asyncio socket. Thread-safe.
+
+        parse gets the text of each message, or its list of frames if multipart is set,
+        and may return None for control messages that should not be handled."""
+        def register():
+            self._parsers[socket] = (parse, multipart)
+            self._poller.register(socket, zmq.POLLIN)
+            self._wake()
+        self._call(register)
+
+    def remove_socket(self, socket, close=True):
+        """Stops reading from a socket and closes it on the loop thread. Thread-safe."""
+        def unregister():
+            if self._parsers.pop(socket, None) is not None:
+                self._poller.unregister(socket)
+            if close:
+                socket.close(linger=0)
+            self._wake()
+        self._call(unregister)
+
+    def send(self, socket, data):
+        """Sends a string, or a list of frames as one multipart message, on a registered socket from any thread."""
+        if isinstance(data, list):
+            self._call(socket.send_multipart, data)
+        else:
+            self._call(socket.send_string, data)
+
+    async def _poll_sockets(self):
+        """Waits on every registered socket at once and schedules the messages they carry."""
+        while True:
+            events = await self._poller.poll()
+            for socket, _ in events:
+                if socket is self._wake_recv:
+                    self._drain(socket)
+                    continue
+                parser = self._parsers.get(socket)
+                if parser is None:
+                    continue
+                parse, multipart = parser
+                for frames in self._drain(socket):
+                    try:
+                        message = parse(frames) if multipart else parse(frames[0].decode("utf-8"))
+                    except ValueError as e:
+                        self._report(frames, e)
+                        continue
+                    if message is not None:
+                        self.submit(message)
+
+    @staticmethod
+    def _drain(socket):
+        """Reads every message already queued on a socket without blocking, each as a list of frames."""
+        messages = []
+        while True:
+            try:
+                messages.append(socket.recv_multipart(zmq.NOBLOCK).result())
+            except zmq.Again:
+                return messages
+            except zmq.ZMQError:
+                return messages
+
+    ## === FILES === ##
+
+    def watch_file(self, reader, parse):
+        """Reads new lines from a SegmentReader (or RingFileReader) on the loop. parse(lines) returns the messages. Thread-safe."""
+        self._call(lambda: self.loop.create_task(self._follow_file(reader, parse)))
+
+    async def _follow_file(self, reader, parse):
+        fd = reader.fileno()
+        changed = asyncio.Event()
+        if fd is not None:
+            self.loop.add_reader(fd, changed.set)
+            self._watchers.append(lambda: self.loop.remove_reader(fd))
+
+        while True:
+            changed.clear()
+            if fd is not None:
+                reader.wait(timeout=0)  # Consume the pending inotify events
+            lines = reader.read_lines()
+            if lines:
+                for message in parse(lines):
+                    self.submit(message)
+                continue
+
+            if fd is None:
+                await asyncio.sleep(reader.poll_interval)
+            else:
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=1)  # Guard against missed events
+                except asyncio.TimeoutError:
+                    pass
+
+    ## === HANDLING === ##
+
+    def submit(self, message):
+        """Schedules a message for the handler, after any earlier message with the same key."""
+        key = self.key(message)
+        previous = self._tails.get(key)
+        task = self.loop.create_task(self._handle(message, previous))
+        self._tails[key] = task
+
+        def forget(done, key=key):
+            if self._tails.get(key) is done:
+                del self._tails[key]
+        task.add_done_callback(forget)
+
+    async def _handle(self, message, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.handler(message)
+        except Exception as e:
+            self._report(message, e)
+
+    def run_blocking(self, func, *args):
+        """Awaitable that runs a blocking function on the engine's thread pool."""
+        return self.loop.run_in_executor(self.executor, func, *args)
+
+    def _report(self, message, error):
+        if self.on_error:
+            self.on_error(message, error)
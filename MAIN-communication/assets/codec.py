@@ -0,0 +1,78 @@
+import ast
+import json
+import threading
+
+
+class LineDecoder:
+    def __init__(self):
+        """Decodes comms-file lines, preferring JSON and falling back to ast.literal_eval.
+
+        Producers write json.dumps output, so JSON is the fast path. literal_eval is kept
+        only for legacy lines written as Python reprs, and every use of it is counted."""
+        self._lock = threading.Lock()
+        self._decoder = json.JSONDecoder()
+        self.decoded = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    def _count(self, decoded=0, fallbacks=0, failures=0):
+        with self._lock:
+            self.decoded += decoded
+            self.fallbacks += fallbacks
+            self.failures += failures
+
+    def _decode_slow(self, line):
+        """Decodes a single line, returning (message, error, used_fallback)."""
+        try:
+            return self._decoder.decode(line), None, False
+        except (ValueError, RecursionError):
+            pass
+        try:
+            return ast.literal_eval(line), None, True
+        except Exception as e:  # Also TypeError ({[1]: 2}), RecursionError and MemoryError; the line fails, not the batch
+            return None, e, True
+
+    def decode(self, line):
+        """Decodes one line. Raises ValueError if neither JSON nor literal_eval can parse it."""
+        message, error, used_fallback = self._decode_slow(line.strip())
+        self._count(decoded=error is None, fallbacks=used_fallback and error is None, failures=error is not None)
+        if error is not None:
+            raise ValueError(f"Cannot decode line: {error}")
+        return message
+
+    def decode_batch(self, lines):
+        """Decodes many lines at once, returning a list of (line, message, error).
+
+        Each line goes through the C scanner with raw_decode, and its value is accepted
+        only if it spans exactly that line, so a malformed line can never borrow or lend
+        part of a neighbour. Lines that fail are retried with literal_eval. Blank lines
+        are skipped."""
+        raw_decode = self._decoder.raw_decode
+        results = []
+        decoded = fallbacks = failures = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message, end = raw_decode(line)
+                if end == len(line):
+                    decoded += 1
+                    results.append((line, message, None))
+                    continue
+            except (ValueError, RecursionError):
+                pass
+            message, error, used_fallback = self._decode_slow(line)
+            if error is None:
+                decoded += 1
+                fallbacks += used_fallback
+            else:
+                failures += 1
+            results.append((line, message, error))
+        self._count(decoded=decoded, fallbacks=fallbacks, failures=failures)
+        return results
+
+    def stats(self):
+        """Returns the decode counters."""
+        with self._lock:
+            return {"decoded": self.decoded, "fallbacks": self.fallbacks, "failures": self.failures}
@@ -0,0 +1,319 @@
+import threading
+from contextlib import contextmanager
+from collections.abc import Mapping
+
+DEFAULT_STRIPES = 16  # Independent locks; writers to different stripes never wait for each other
+_MISSING = object()
+
+
+class MapSnapshot(Mapping):
+    def __init__(self, stripes):
+        """Read-only view of a ConcurrentMap at one moment.
+
+        Holds the published tuple of stripe dicts, which are never modified once
+        published, so taking a snapshot costs O(1) and iterating it needs no lock."""
+        self._stripes = stripes
+
+    def __getitem__(self, key):
+        return self._stripes[hash(key) % len(self._stripes)][key]
+
+    def __contains__(self, key):
+        return key in self._stripes[hash(key) % len(self._stripes)]
+
+    def __iter__(self):
+        for stripe in self._stripes:
+            yield from stripe
+
+    def __len__(self):
+        return sum(len(stripe) for stripe in self._stripes)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class ConcurrentMap:
+    def __init__(self, initial=None, stripes=DEFAULT_STRIPES):
+        """Thread-safe dict with striped locks and copy-on-write stripes.
+
+        A key belongs to stripe hash(key) % stripes. Writers lock only that stripe,
+        copy its dict, change the copy and publish it by swapping in a new tuple of
+        stripes. Readers take no lock at all: they read whichever tuple is published,
+        so they never block writers and never see a half-applied write, including
+        multi-key writes from mset() and transaction(). snapshot() is one reference read."""
+        # Re-entrant, so the thread inside transaction() can still call the map's own methods
+        self._locks = tuple(threading.RLock() for _ in range(stripes))
+        self._publish_lock = threading.Lock()  # Held only for the tuple swap
+        initial_stripes = [{} for _ in range(stripes)]
+        if initial:
+            for key, value in dict(initial).items():
+                initial_stripes[hash(key) % stripes][key] = value
+        self._stripes = tuple(initial_stripes)
+
+    def _index(self, key):
+        return hash(key) % len(self._locks)
+
+    def _publish(self, changed):
+        """Swaps in new dicts for the stripes in changed, {index: dict}. Caller holds those stripes' locks."""
+        with self._publish_lock:
+            stripes = list(self._stripes)
+            for index, stripe in changed.items():
+                stripes[index] = stripe
+            self._stripes = tuple(stripes)
+
+    @contextmanager
+    def _locked(self, indexes):
+        """Holds the given stripe locks, always taken in index order so writers cannot deadlock."""
+        indexes = sorted(set(indexes))
+        for index in indexes:
+            self._locks[index].acquire()
+        try:
+            yield
+        finally:
+            for index in reversed(indexes):
+                self._locks[index].release()
+
+    ## === READS (lock-free) === ##
+
+    def get(self, key, default=None):
+        return self._stripes[self._index(key)].get(key, default)
+
+    def __getitem__(self, key):
+        return self._stripes[self._index(key)][key]
+
+    def __contains__(self, key):
+        return key in self._stripes[self._index(key)]
+
+    def __len__(self):
+        return sum(len(stripe) for stripe in self._stripes)
+
+    def snapshot(self):
+        """Returns a MapSnapshot; later writes do not show up in it."""
+        return MapSnapshot(self._stripes)
+
+    def mget(self, keys, default=None):
+        """Reads several keys from one snapshot, so they are consistent with each other."""
+        stripes = self._stripes
+        return [stripes[self._index(key)].get(key, default) for key in keys]
+
+    def get_path(self, path, default=None):
+        """Reads a nested value, e.g. get_path(["subprotocolID", "loaded"]). Returns default if any step is missing."""
+        value = MapSnapshot(self._stripes)
+        for step in path:
+            try:
+                value = value[step]
+            except (KeyError, IndexError, TypeError):
+                return default
+        return value
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def items(self):
+        return self.snapshot().items()
+
+    def copy(self):
+        """Returns a plain dict with the current contents."""
+        return dict(self.snapshot().items())
+
+    ## === WRITES (stripe locks, copy-on-write) === ##
+
+    def __setitem__(self, key, value):
+        index = self._index(key)
+        with self._locks[index]:
+            stripe = dict(self._stripes[index])
+            stripe[key] = value
+            self._publish({index: stripe})
+
+    def __delitem__(self, key):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def pop(self, key, default=None):
+        index = self._index(key)
+        with self._locks[index]:
+            if key not in self._stripes[index]:
+                return default
+            stripe = dict(self._stripes[index])
+            value = stripe.pop(key)
+            self._publish({index: stripe})
+            return value
+
+    def setdefault(self, key, default=None):
+        index = self._index(key)
+        with self._locks[index]:
+            current = self._stripes[index].get(key, _MISSING)
+            if current is not _MISSING:
+                return current
+            stripe = dict(self._stripes[index])
+            stripe[key] = default
+            self._publish({index: stripe})
+            return default
+
+    def popitem(self):
+        """Removes and returns some (key, value) pair. Raises KeyError if the map is empty."""
+        for index in range(len(self._locks)):
+            with self._locks[index]:
+                if self._stripes[index]:
+                    stripe = dict(self._stripes[index])
+                    item = stripe.popitem()
+                    self._publish({index: stripe})
+                    return item
+        raise KeyError("popitem(): map is empty")
+
+    def compare_and_set(self, key, expected, value):
+        """Sets key to value only if it currently equals expected (None for a missing key). Returns whether it did."""
+        index = self._index(key)
+        with self._locks[index]:
+            current = self._stripes[index].get(key)
+            if current is not expected and current != expected:
+                return False
+            stripe = dict(self._stripes[index])
+            stripe[key] = value
+            self._publish({index: stripe})
+            return True
+
+    def set_path(self, path, value):
+        """Sets a nested value, e.g. set_path(["subprotocolID", "loaded"], True), creating missing dicts.
+
+        The dicts along the path are copied, not changed in place, so snapshots
+        taken earlier keep their values."""
+        if not path:
+            raise ValueError("set_path() needs at least one key")
+        index = self._index(path[0])
+        with self._locks[index]:
+            stripe = dict(self._stripes[index])
+            stripe[path[0]] = _replace_path(stripe.get(path[0]), path[1:], value)
+            self._publish({index: stripe})
+
+    def modify_path(self, path, function):
+        """Calls function on a copy of the dict at path ({} if there is none), stores the copy there and returns the result.
+
+        Lets a nested dict be changed with the usual dict methods, e.g.
+        modify_path(["subprotocolID"], lambda info: info.pop("loaded", None)), without
+        losing concurrent writes to the same key. Nothing is stored if function raises."""
+        if not path:
+            raise ValueError("modify_path() needs at least one key")
+        index = self._index(path[0])
+        with self._locks[index]:
+            nested = self.get_path(path)
+            nested = dict(nested) if isinstance(nested, dict) else {}
+            result = function(nested)
+            stripe = dict(self._stripes[index])
+            stripe[path[0]] = _replace_path(stripe.get(path[0]), path[1:], nested)
+            self._publish({index: stripe})
+            return result
+
+    def update(self, other):
+        """Applies many assignments atomically, copying each touched stripe once."""
+        by_stripe = {}
+        for key, value in dict(other).items():
+            by_stripe.setdefault(self._index(key), {})[key] = value
+        with self._locked(by_stripe):
+            self._publish({index: {**self._stripes[index], **changes} for index, changes in by_stripe.items()})
+
+    mset = update
+
+    def clear(self):
+        with self._locked(range(len(self._locks))):
+            self._publish({index: {} for index in range(len(self._locks))})
+
+    @contextmanager
+    def transaction(self):
+        """Holds every stripe lock once and yields a Transaction; its changes are published together on exit.
+
+        Nothing is published if the block raises. Readers keep reading the old
+        contents until the block ends. Other threads' writes wait for the block; the
+        owning thread may still write through the map itself (or a GlobalVariable on
+        it), but those writes are published at once, not with the batch."""
+        with self._locked(range(len(self._locks))):
+            transaction = Transaction(self)
+            yield transaction
+            changed = {}
+            for key, value in transaction.changes.items():
+                index = self._index(key)
+                stripe = changed.get(index)
+                if stripe is None:
+                    stripe = changed[index] = dict(self._stripes[index])
+                if value is _MISSING:
+                    stripe.pop(key, None)
+                else:
+                    stripe[key] = value
+            if changed:
+                self._publish(changed)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+class Transaction:
+    def __init__(self, map):
+        """Staged changes to a ConcurrentMap inside transaction(); reads see the staged values."""
+        self._map = map
+        self.changes = {}  # {key: value or _MISSING for a deletion}
+
+    def get(self, key, default=None):
+        if key in self.changes:
+            value = self.changes[key]
+            return default if value is _MISSING else value
+        return self._map.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.changes[key] = _MISSING
+
+    def pop(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self.changes[key] = _MISSING
+        return value
+
+    def update(self, other):
+        self.changes.update(other)
+
+    def get_path(self, path, default=None):
+        value = self.get(path[0], _MISSING)
+        for step in path[1:]:
+            try:
+                value = value[step]
+            except (KeyError, IndexError, TypeError):
+                return default
+        return default if value is _MISSING else value
+
+    def set_path(self, path, value):
+        self.changes[path[0]] = _replace_path(self.get(path[0]), path[1:], value)
+
+    def compare_and_set(self, key, expected, value):
+        current = self.get(key)
+        if current is not expected and current != expected:
+            return False
+        self.changes[key] = value
+        return True
+
+
+def _replace_path(container, path, value):
+    """Returns a copy of container with value at path, creating dicts where the path is missing."""
+    if not path:
+        return value
+    container = dict(container) if isinstance(container, dict) else {}
+    container[path[0]] = _replace_path(container.get(path[0]), path[1:], value)
+    return container
@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class PendingRequests:
+    def __init__(self):
+        """Correlation table of requests waiting for their response, keyed by messageID.
+
+        Each request gets a concurrent.futures.Future that the receiving thread
+        completes, so the waiter wakes as soon as the response arrives. asyncio code can
+        await the same future with asyncio.wrap_future()."""
+        self._lock = threading.Lock()
+        self._futures = {}  # {messageID: Future}
+
+    def register(self, messageID):
+        """Creates the future for a request. Call before sending so a fast response is not missed."""
+        future = Future()
+        with self._lock:
+            self._futures[messageID] = future
+        return future
+
+    def resolve(self, messageID, response):
+        """Completes the request with its response. Returns False if nobody is waiting for it."""
+        with self._lock:
+            future = self._futures.pop(messageID, None)
+        if future is None or future.done():
+            return False
+        future.set_result(response)
+        return True
+
+    def fail(self, messageID, error):
+        """Completes the request with an exception."""
+        with self._lock:
+            future = self._futures.pop(messageID, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def discard(self, messageID):
+        """Stops waiting for a request, e.g. after its timeout."""
+        with self._lock:
+            future = self._futures.pop(messageID, None)
+        if future is not None:
+            future.cancel()
+
+    def clear(self):
+        """Forgets every request, e.g. when a pooled protocol is rebound to a new activation."""
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.cancel()
+
+    def wait(self, messageID, future, timeout=None):
+        """Blocks until the response arrives. Raises TimeoutError, forgetting the request, if timeout expires first."""
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self.discard(messageID)
+            raise TimeoutError(f"No response to {messageID} within {timeout}s") from None
+
+    def __contains__(self, messageID):
+        with self._lock:
+            return messageID in self._futures
+
+    def __len__(self):
+        with self._lock:
+            return len(self._futures)
@@ -0,0 +1,167 @@
+import threading
+import queue
+import zlib
+
+BLOCKING_IDLE_TIMEOUT = 5  # Seconds a blocking worker waits for another message for its key before it exits
+
+
+class _BlockingLane:
+    def __init__(self, queue_depth):
+        """FIFO queue and worker state for one blocking key."""
+        self.inbox = queue.Queue(maxsize=queue_depth)
+        self.submitting = 0  # submit() calls between looking the lane up and queueing; the worker stays while > 0
+        self.worker = None
+
+
+class MessageDispatcher:
+    def __init__(self, handler, pool_size=8, queue_depth=256, key=None, on_error=None, name="dispatcher", blocking=None, blocking_workers=16,
+                 blocking_key=None):
+        """Runs handler(message) on a fixed pool of worker threads.
+
+        Messages are sharded onto workers by key (the receiver by default), so messages
+        for the same receiver are always handled in the order they were submitted.
+        Each worker owns a bounded queue of queue_depth messages; submit() blocks when
+        it is full, pushing back on the producer instead of growing without bound.
+
+        Messages for which blocking(message) is true, such as commands that wait for a
+        protocol to load, leave the shards so they do not stall the receivers sharing
+        one. They are queued by blocking_key(message) (key by default) instead: each
+        such key gets its own bounded FIFO queue and worker thread, so the messages of
+        one key still run in order, one at a time. Up to blocking_workers keys run at
+        once; submit() waits for a free worker beyond that, and for queue space like
+        any other message. An idle worker exits after BLOCKING_IDLE_TIMEOUT."""
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        if queue_depth < 1:
+            raise ValueError("queue_depth must be at least 1")
+
+        self.handler = handler
+        self.pool_size = pool_size
+        self.queue_depth = queue_depth
+        self.key = key or (lambda message: message.get('receiver', ''))
+        self.on_error = on_error
+        self.blocking = blocking
+        self.blocking_key = blocking_key or self.key
+        self.name = name
+        self._lanes = {}  # {blocking key: _BlockingLane}
+        self._lanes_lock = threading.Lock()
+        self._blocking_slots = threading.BoundedSemaphore(blocking_workers)
+        self._queues = [queue.Queue(maxsize=queue_depth) for _ in range(pool_size)]
+        self._workers = []
+        self._stopped = threading.Event()
+
+        for index, inbox in enumerate(self._queues):
+            worker = threading.Thread(target=self._run, args=(inbox,), name=f"{name}-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    ## === SUBMISSION === ##
+
+    def _shard(self, message):
+        """Returns the queue responsible for the message's key."""
+        key = str(self.key(message))
+        return self._queues[zlib.crc32(key.encode()) % self.pool_size]
+
+    def submit(self, message, block=True, timeout=None):
+        """Queues a message for handling. Raises queue.Full if it cannot be queued in time."""
+        if self._stopped.is_set():
+            raise RuntimeError("Dispatcher has been shut down")
+        if self.blocking is not None and self.blocking(message):
+            self._submit_blocking(message, block, timeout)
+            return
+        self._shard(message).put(message, block=block, timeout=timeout)
+
+    def _submit_blocking(self, message, block, timeout):
+        """Queues a blocking message on its key's lane, starting the lane's worker if it has none."""
+        key = self.blocking_key(message)
+        with self._lanes_lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _BlockingLane(self.queue_depth)
+            lane.submitting += 1
+        try:
+            if lane.worker is None:
+                self._start_lane(key, lane, block, timeout)
+            lane.inbox.put(message, block=block, timeout=timeout)
+        finally:
+            with self._lanes_lock:
+                lane.submitting -= 1
+
+    def _start_lane(self, key, lane, block, timeout):
+        if not self._blocking_slots.acquire(blocking=block, timeout=timeout):
+            raise queue.Full(f"All blocking workers are busy; {key!r} waited too long")
+        with self._lanes_lock:
+            if lane.worker is not None:  # Another submit() started it meanwhile
+                self._blocking_slots.release()
+                return
+            lane.worker = threading.Thread(target=self._run_lane, args=(key, lane), name=f"{self.name}-blocking-{key}", daemon=True)
+        lane.worker.start()
+
+    def pending(self):
+        """Number of messages waiting to be handled."""
+        with self._lanes_lock:
+            lanes = list(self._lanes.values())
+        return sum(inbox.qsize() for inbox in self._queues) + sum(lane.inbox.qsize() for lane in lanes)
+
+    ## === WORKERS === ##
+
+    def _run(self, inbox):
+        """Worker loop: handles messages from its own queue one at a time."""
+        while True:
+            message = inbox.get()
+            try:
+                if message is None:  # Shutdown sentinel
+                    return
+                self._handle(message)
+            finally:
+                inbox.task_done()
+
+    def _run_lane(self, key, lane):
+        """Blocking worker loop: handles one key's messages in order, and exits once the key is idle."""
+        try:
+            while True:
+                try:
+                    message = lane.inbox.get(timeout=BLOCKING_IDLE_TIMEOUT)
+                except queue.Empty:
+                    with self._lanes_lock:
+                        if lane.submitting or not lane.inbox.empty():
+                            continue
+                        del self._lanes[key]  # The next submit() for this key starts a new lane
+                        return
+                try:
+                    if message is None:  # Shutdown sentinel
+                        return
+                    self._handle(message)
+                finally:
+                    lane.inbox.task_done()
+        finally:
+            self._blocking_slots.release()
+
+    def _handle(self, message):
+        try:
+            self.handler(message)
+        except Exception as e:
+            if self.on_error:
+                self.on_error(message, e)
+
+    def join(self):
+        """Blocks until every queued message has been handled."""
+        for inbox in self._queues:
+            inbox.join()
+        with self._lanes_lock:
+            lanes = list(self._lanes.values())
+        for lane in lanes:
+            lane.inbox.join()
+
+    def shutdown(self, wait=True):
+        """Stops the workers once they have handled the messages already queued."""
+        self._stopped.set()
+        for inbox in self._queues:
+            inbox.put(None)
+        with self._lanes_lock:
+            lanes = list(self._lanes.values())
+        for lane in lanes:
+            lane.inbox.put(None)
+        if wait:
+            for worker in self._workers + [lane.worker for lane in lanes if lane.worker is not None]:
+                worker.join()
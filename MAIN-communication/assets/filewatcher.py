@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify constants (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    """Returns libc with the inotify functions, or None when inotify is unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class DirectoryWatcher:
+    def __init__(self, directory, match, poll_interval=0.1, use_inotify=True):
+        """Sleeps until a file in directory whose name satisfies match(name) changes.
+
+        Uses inotify on Linux; elsewhere wait() simply sleeps for poll_interval."""
+        self.directory = directory
+        self.match = match
+        self.poll_interval = poll_interval
+        self._inotify_fd = None
+
+        if use_inotify:
+            self._setup_inotify()
+
+    def _setup_inotify(self):
+        """Watches the directory so appends, truncation, creation and rotation all wake us up."""
+        libc = _load_inotify()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+        if libc.inotify_add_watch(fd, self.directory.encode(), mask) < 0:
+            os.close(fd)
+            return
+        self._inotify_fd = fd
+
+    def _drain_inotify(self):
+        """Consumes pending inotify events, returning True if any concern a matching file."""
+        relevant = False
+        while True:
+            try:
+                buffer = os.read(self._inotify_fd, 4096)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                if self.match(buffer[offset:offset + length].rstrip(b"\0").decode(errors="replace")):
+                    relevant = True
+                offset += length
+
+    def fileno(self):
+        """Returns the inotify descriptor for use with select/event loops, or None when polling."""
+        return self._inotify_fd
+
+    def wait(self, timeout=None):
+        """Blocks until a matching file may have changed or the timeout expires."""
+        if self._inotify_fd is None:
+            time.sleep(self.poll_interval if timeout is None else min(timeout, self.poll_interval))
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._inotify_fd], [], [], remaining)
+            if not readable:
+                return False
+            if self._drain_inotify():
+                return True
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
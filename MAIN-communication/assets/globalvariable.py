@@ -1,16 +1,143 @@
 import threading
 import copy
+from types import MappingProxyType
+
+from assets.concurrentmap import ConcurrentMap, DEFAULT_STRIPES
+
+
+class NestedMap:
+    def __init__(self, map, path):
+        """The dict at path inside a ConcurrentMap, with the ConcurrentMap interface.
+
+        Nothing is cached: reads look the path up in the current contents and writes
+        go through the map's set_path()/modify_path(), so they show up in the parent.
+        A missing path reads as an empty dict and is created by the first write."""
+        self.map = map
+        self.path = list(path)
+
+    def _current(self):
+        value = self.map.get_path(self.path)
+        return value if isinstance(value, dict) else {}
+
+    ## === READS === ##
+
+    def get(self, key, default=None):
+        return self._current().get(key, default)
+
+    def __getitem__(self, key):
+        return self._current()[key]
+
+    def __contains__(self, key):
+        return key in self._current()
+
+    def __len__(self):
+        return len(self._current())
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def snapshot(self):
+        # Nested dicts are replaced, never changed in place, so this one stays as it is
+        return MappingProxyType(self._current())
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def items(self):
+        return self.snapshot().items()
+
+    def copy(self):
+        return dict(self._current())
+
+    def mget(self, keys, default=None):
+        current = self._current()
+        return [current.get(key, default) for key in keys]
+
+    def get_path(self, path, default=None):
+        return self.map.get_path([*self.path, *path], default)
+
+    ## === WRITES === ##
+
+    def __setitem__(self, key, value):
+        self.map.set_path([*self.path, key], value)
+
+    def set_path(self, path, value):
+        if not path:
+            raise ValueError("set_path() needs at least one key")
+        self.map.set_path([*self.path, *path], value)
+
+    def _modify(self, function):
+        return self.map.modify_path(self.path, function)
+
+    def __delitem__(self, key):
+        self._modify(lambda nested: nested.pop(key))
+
+    def pop(self, key, default=None):
+        if key not in self:
+            return default  # Does not create the dict just to leave it empty
+        return self._modify(lambda nested: nested.pop(key, default))
+
+    def setdefault(self, key, default=None):
+        return self._modify(lambda nested: nested.setdefault(key, default))
+
+    def popitem(self):
+        return self._modify(lambda nested: nested.popitem())
+
+    def compare_and_set(self, key, expected, value):
+        def compare_and_set(nested):
+            current = nested.get(key)
+            if current is not expected and current != expected:
+                return False
+            nested[key] = value
+            return True
+        return self._modify(compare_and_set)
+
+    def update(self, other):
+        other = dict(other)
+        self._modify(lambda nested: nested.update(other))
+
+    mset = update
+
+    def clear(self):
+        if self._current():
+            self._modify(lambda nested: nested.clear())
+
+    def transaction(self):
+        raise TypeError("transaction() is only available on the top-level GlobalVariable")
+
 
 class GlobalVariable:
-    def __init__(self, value):
-        """Wraps any object (dict, list, tuple) to make it thread-safe."""
+    def __init__(self, value, stripes=DEFAULT_STRIPES):
+        """Wraps any object (dict, list, tuple) to make it thread-safe.
+
+        Dicts are stored in a ConcurrentMap: reads take no lock, writers lock one
+        stripe, and iteration walks a copy-on-write snapshot that is O(1) to take.
+        Lists and tuples keep a single RLock."""
         self._lock = threading.RLock()
-        self._set_value(value)
+        self._set_value(value, stripes)
 
-    def _set_value(self, value):
+    @classmethod
+    def _view(cls, map, path):
+        """GlobalVariable for the nested dict at path, as returned by get(); writes go to the parent."""
+        view = cls.__new__(cls)
+        view._lock = threading.RLock()
+        view._type = "dict"
+        view._value = NestedMap(map, path)
+        return view
+
+    def _nested(self, key):
+        if isinstance(self._value, NestedMap):
+            return GlobalVariable._view(self._value.map, [*self._value.path, key])
+        return GlobalVariable._view(self._value, [key])
+
+    def _set_value(self, value, stripes=DEFAULT_STRIPES):
         """Detects the object type and initializes storage."""
         if isinstance(value, dict):
             self._type = "dict"
+            value = ConcurrentMap(value, stripes=stripes)
         elif isinstance(value, list):
             self._type = "list"
         elif isinstance(value, tuple):
@@ -19,107 +146,162 @@ class GlobalVariable:
             raise TypeError(f"GlobalVariable only supports dict, list, or tuple, not {type(value)}")
         self._value = value
 
+    def _check_dict(self, method):
+        if self._type != "dict":
+            raise AttributeError(f"{method}() is only available for dicts")
+
     ## === THREAD-SAFE DICTIONARY OPERATIONS === ##
 
     def keys(self):
         """Thread-safe dict.keys()"""
-        if self._type != "dict":
-            raise AttributeError("keys() is only available for dicts")
-        with self._lock:
-            return list(self._value.keys())
+        self._check_dict("keys")
+        return list(self._value.keys())
 
     def values(self):
         """Thread-safe dict.values()"""
-        if self._type != "dict":
-            raise AttributeError("values() is only available for dicts")
-        with self._lock:
-            return list(self._value.values())
+        self._check_dict("values")
+        return list(self._value.values())
 
     def items(self):
         """Thread-safe dict.items()"""
-        if self._type != "dict":
-            raise AttributeError("items() is only available for dicts")
-        with self._lock:
-            return list(self._value.items())
+        self._check_dict("items")
+        return list(self._value.items())
 
     def get(self, key, default=None):
-        """Thread-safe dict.get() with full safe nested lookups."""
-        if self._type != "dict":
-            raise AttributeError("get() is only available for dicts")
-        with self._lock:
-            value = self._value.get(key, default)
-            if value is None:
-                return GlobalVariable({})
-            if isinstance(value, dict):
-                return GlobalVariable(value)
-            return value
+        """Thread-safe dict.get() with full safe nested lookups.
+
+        Nested dicts and missing values come back as GlobalVariable views of that key,
+        so lookups can be chained, variable.get("a").get("b"), and writes reach the
+        parent: variable.get("a")["b"] = 1 sets variable["a"]["b"], creating "a" if needed."""
+        self._check_dict("get")
+        value = self._value.get(key)
+        if value is None:
+            if default is None or default == {}:
+                return self._nested(key)
+            value = default
+            return GlobalVariable(value) if isinstance(value, dict) else value
+        if isinstance(value, dict):
+            return self._nested(key)
+        return value
 
     def setdefault(self, key, default=None):
         """Thread-safe dict.setdefault()"""
-        if self._type != "dict":
-            raise AttributeError("setdefault() is only available for dicts")
-        with self._lock:
-            return self._value.setdefault(key, default)
+        self._check_dict("setdefault")
+        return self._value.setdefault(key, default)
 
     def pop(self, key, default=None):
         """Thread-safe dict.pop()"""
-        if self._type != "dict":
-            raise AttributeError("pop() is only available for dicts")
-        with self._lock:
-            return self._value.pop(key, default)
+        self._check_dict("pop")
+        return self._value.pop(key, default)
 
     def popitem(self):
         """Thread-safe dict.popitem()"""
-        if self._type != "dict":
-            raise AttributeError("popitem() is only available for dicts")
-        with self._lock:
-            return self._value.popitem()
+        self._check_dict("popitem")
+        return self._value.popitem()
 
     def copy(self):
         """Thread-safe dict.copy()"""
-        if self._type != "dict":
-            raise AttributeError("copy() is only available for dicts")
-        with self._lock:
-            return self._value.copy()
+        self._check_dict("copy")
+        return self._value.copy()
+
+    def mget(self, keys, default=None):
+        """Reads several keys at once; the values are consistent with each other."""
+        self._check_dict("mget")
+        return self._value.mget(keys, default)
+
+    def mset(self, mapping):
+        """Assigns several keys atomically: readers see all of them or none."""
+        self._check_dict("mset")
+        self._value.mset(mapping)
+
+    def compare_and_set(self, key, expected, value):
+        """Sets key to value only if it currently equals expected (None for a missing key). Returns whether it did."""
+        self._check_dict("compare_and_set")
+        return self._value.compare_and_set(key, expected, value)
+
+    def get_path(self, path, default=None):
+        """Reads a nested value in one step, e.g. get_path([subprotocolID, "loaded"])."""
+        self._check_dict("get_path")
+        return self._value.get_path(path, default)
+
+    def set_path(self, path, value):
+        """Sets a nested value under one lock acquisition, creating missing dicts along the path."""
+        self._check_dict("set_path")
+        self._value.set_path(path, value)
+
+    def transaction(self):
+        """Context manager batching several reads and writes under one acquisition of the locks.
+
+            with variable.transaction() as batch:
+                if batch.get_path([subprotocolID, "loaded"]):
+                    batch[subprotocolID] = info
+
+        The changes to batch become visible together when the block ends and are
+        dropped if it raises. Writes made on the variable itself inside the block do
+        not deadlock, but they are published immediately."""
+        self._check_dict("transaction")
+        return self._value.transaction()
+
+    def view(self):
+        """Read-only Mapping of the dict at this moment, taken without copying the entries."""
+        self._check_dict("view")
+        return self._value.snapshot()
 
     ## === GENERAL DICT/LIST METHODS === ##
     def __getitem__(self, key):
-        with self._lock:
+        if self._type == "dict":
             return self._value.get(key, None)
+        with self._lock:
+            return self._value[key]
 
     def __setitem__(self, key, value):
+        if self._type == "dict":
+            self._value[key] = value
+            return
         with self._lock:
             self._value[key] = value
 
     def __delitem__(self, key):
+        if self._type == "dict":
+            del self._value[key]
+            return
         with self._lock:
             del self._value[key]
 
     def __contains__(self, item):
+        if self._type == "dict":
+            return item in self._value
         with self._lock:
             return item in self._value
 
     def __iter__(self):
+        if self._type == "dict":
+            return iter(self._value.snapshot())
         with self._lock:
             return iter(copy.deepcopy(self._value))
 
     def __len__(self):
+        if self._type == "dict":
+            return len(self._value)
         with self._lock:
             return len(self._value)
 
     def update(self, other_dict):
         """Thread-safe dict.update()"""
-        if self._type != "dict":
-            raise AttributeError("update() is only available for dicts")
-        with self._lock:
-            self._value.update(other_dict)
+        self._check_dict("update")
+        self._value.update(other_dict)
 
     ## === SNAPSHOT FUNCTION === ##
     def snapshot(self):
-        """Returns a deep copy to prevent race conditions."""
+        """Returns a deep copy to prevent race conditions. view() is the cheap read-only alternative."""
+        if self._type == "dict":
+            return copy.deepcopy(self._value.copy())
         with self._lock:
             return copy.deepcopy(self._value)
 
     def __repr__(self):
+        if self._type == "dict":
+            return repr(self._value.copy())
         with self._lock:
             return repr(self._value)
+
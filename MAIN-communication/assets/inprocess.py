@@ -0,0 +1,161 @@
+import os
+import ast
+import sys
+import queue
+import types
+import threading
+import subprocess
+
+EXECUTION_FIELD = "Execution:"  # Docstring line that selects how a protocol runs
+IN_PROCESS = "in-process"
+
+_CLOSED = object()  # Queued by close() to stop the readers
+_docstring_cache = {}  # {absolute path: (mtime_ns, execution mode)}
+_code_cache = {}  # {absolute path: (mtime_ns, code object)}
+_cache_lock = threading.Lock()
+
+
+## === OPT-IN === ##
+
+def execution_mode(script_path):
+    """Returns the protocol's "Execution:" docstring value in lower case, "process" if it has none."""
+    path = os.path.abspath(script_path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _docstring_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r') as f:
+        docstring = ast.get_docstring(ast.parse(f.read())) or ""
+    mode = next((line.split(":", 1)[1].strip().lower() for line in docstring.splitlines()
+                 if line.startswith(EXECUTION_FIELD)), "process")
+    _docstring_cache[path] = (mtime, mode)
+    return mode
+
+def runs_in_process(script_path):
+    return execution_mode(script_path) == IN_PROCESS
+
+
+## === CHANNEL === ##
+
+class InProcessChannel:
+    def __init__(self):
+        """In-memory replacement for the PAIR pipe between MAIN_COMMUNICATION and an in-process protocol.
+
+        Messages are handed over as objects through two queues, so nothing is
+        serialised and a message reaches the other side in microseconds."""
+        self._to_protocol = queue.SimpleQueue()
+        self._to_main = queue.SimpleQueue()
+        self.closed = False
+
+    def send(self, message):
+        """MAIN_COMMUNICATION side: queues a message for the protocol."""
+        if not self.closed:
+            self._to_protocol.put(message)
+
+    def receive(self):
+        """MAIN_COMMUNICATION side: the next message from the protocol, None once closed."""
+        message = self._to_main.get()
+        return None if message is _CLOSED else message
+
+    def post(self, message):
+        """Protocol side: queues a message for MAIN_COMMUNICATION."""
+        if not self.closed:
+            self._to_main.put(message)
+
+    def listen(self):
+        """Protocol side: the next message from MAIN_COMMUNICATION, None once closed."""
+        message = self._to_protocol.get()
+        return None if message is _CLOSED else message
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._to_protocol.put(_CLOSED)
+            self._to_main.put(_CLOSED)
+
+
+## === PROTOCOL HANDLE === ##
+
+def load_module(script_path, module_name):
+    """Executes the protocol script as a fresh module, reusing its compiled code while the file is unchanged.
+
+    Every activation gets its own module, so protocol globals are never shared
+    between two activations of the same script."""
+    path = os.path.abspath(script_path)
+    mtime = os.stat(path).st_mtime_ns
+    with _cache_lock:
+        cached = _code_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r') as f:
+                cached = _code_cache[path] = (mtime, compile(f.read(), path, "exec"))
+
+    module = types.ModuleType(module_name)
+    module.__file__ = path
+    search_path = list(sys.path)
+    try:
+        exec(cached[1], module.__dict__)
+    finally:
+        # Protocols append their helper folders to sys.path on every load; keep one copy
+        sys.path[:] = list(dict.fromkeys(search_path + sys.path))
+    return module
+
+
+class InProcessProtocol:
+    def __init__(self, script_path, subprotocolID, channel):
+        """Popen-like handle for a protocol running on a thread of MAIN_COMMUNICATION.
+
+        The protocol module needs a module-level runtime (ProtocolRuntime) and a
+        handle_main_message(message) function. deactivate_subprocess treats it like
+        a process: terminate() closes the channel and the serving thread returns."""
+        self.args = [script_path]
+        self.pid = None
+        self.returncode = None
+        self.subprotocolID = subprotocolID
+        self.channel = channel
+        self.module = None
+        self._thread = None
+
+    def start(self, subprocess_info):
+        """Loads the protocol and starts serving its messages. Raises if the module cannot run in-process."""
+        module = load_module(self.args[0], f"inprocess_{self.subprotocolID}")
+        runtime = getattr(module, "runtime", None)
+        handle_message = getattr(module, "handle_main_message", None)
+        if runtime is None or handle_message is None:
+            raise RuntimeError(f"{self.args[0]} needs a module-level runtime and handle_main_message to run in-process")
+
+        runtime.attach(self.channel, subprocess_info)
+        if hasattr(module, "initialize_constants"):
+            module.initialize_constants()  # Reads the attached info instead of stdin
+        self.module = module
+        self._thread = threading.Thread(target=self._serve, args=(runtime, handle_message),
+                                        name=f"inprocess-{self.subprotocolID}", daemon=True)
+        self._thread.start()
+
+    def _serve(self, runtime, handle_message):
+        try:
+            runtime.serve(handle_message)
+            self.returncode = 0
+        except Exception:
+            self.returncode = 1
+            raise
+
+    def poll(self):
+        if self.returncode is None and self._thread is not None and not self._thread.is_alive():
+            self.returncode = 0
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.poll()
+
+    def terminate(self):
+        """Closes the channel; the protocol stops after the message it is handling."""
+        self.channel.close()
+
+    def kill(self):
+        # A thread cannot be killed: poll() keeps reporting it as running until its current message returns
+        self.channel.close()
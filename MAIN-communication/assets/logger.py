@@ -0,0 +1,230 @@
+import os
+import time
+import atexit
+import signal
+import threading
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+DEFAULT_LEVEL = INFO
+FLUSH_INTERVAL = 0.5  # Seconds between background flushes
+FLUSH_BATCH = 256  # Records queued on one logger that wake the writer early
+MAX_BYTES = 5 * 1024 * 1024  # Size at which a log file is rotated
+BACKUP_COUNT = 2  # Rotated files kept as <name>.1 ... <name>.N
+MAX_QUEUED = 100000  # Records kept per logger while the writer is behind; older ones are dropped and counted
+
+_loggers = {}  # {absolute path: Logger}
+_registry_lock = threading.Lock()
+_wake = threading.Event()
+_writer = None
+_sigterm_handled = False
+
+
+class Logger:
+    def __init__(self, path, level=DEFAULT_LEVEL, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT, max_queued=MAX_QUEUED):
+        """Buffered logger for one file.
+
+        Logging a record only appends a tuple to a deque; formatting and file writes
+        happen in the shared background writer thread, in batches."""
+        self.path = path
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._records = deque(maxlen=max_queued)
+        self.dropped = 0  # Records pushed out of the full queue, reported in the file by the next flush
+        self._io_lock = threading.RLock()  # Re-entrant so the SIGTERM flush cannot deadlock the main thread
+        self._file = None
+        self._size = 0
+
+    ## === LOGGING (hot path) === ##
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        """Queues a record. message % args is only formatted if the record is written."""
+        if level < self.level:
+            return
+        records = self._records
+        if len(records) == records.maxlen:
+            self.dropped += 1
+        records.append((time.time(), level, message, args))
+        if len(records) >= FLUSH_BATCH:
+            _wake.set()
+
+    def debug(self, message, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):
+        self.log(ERROR, message, *args)
+
+    ## === WRITING (background thread) === ##
+
+    @staticmethod
+    def _format(record):
+        """Formats a record. Never raises: a record that cannot be formatted, e.g. because an
+        argument's __repr__ raises, becomes a placeholder line."""
+        created, level, message, args = record
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))
+        prefix = "" if level == INFO else f"{LEVEL_NAMES.get(level, level)} - "
+        try:
+            if args:
+                message = message % args
+            return f"{timestamp} - {prefix}{message}\n"
+        except Exception as e:
+            return f"{timestamp} - {prefix}<unformattable record: {type(e).__name__}>\n"
+
+    def _open(self):
+        self._file = open(self.path, "a")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            open(self.path, "w").close()
+        self._open()
+
+    def _flush(self):
+        """Writes every queued record. Caller must hold _io_lock."""
+        records = self._records
+        if not records:
+            return
+        lines = []
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines.append(self._format((time.time(), WARNING, "%d records dropped: the log queue was full", (dropped,))))
+        while records:
+            lines.append(self._format(records.popleft()))
+        chunk = "".join(lines)
+
+        if self._file is None:
+            self._open()
+        if self.max_bytes and self._size and self._size + len(chunk) > self.max_bytes:
+            self._rotate()
+        self._file.write(chunk)
+        self._file.flush()
+        self._size += len(chunk)
+
+    def flush(self):
+        """Writes every queued record now."""
+        with self._io_lock:
+            self._flush()
+
+    def clear(self):
+        """Drops the queued records and empties the file."""
+        with self._io_lock:
+            self._records.clear()
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self.path, "w")
+            self._size = 0
+
+    def close(self):
+        with self._io_lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+## === SHARED WRITER === ##
+
+def _write_loop():
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush_all()
+        except Exception:
+            pass  # The writer is shared by every logger; it must outlive any one failure
+
+
+def flush_all():
+    """Writes the queued records of every logger."""
+    with _registry_lock:
+        loggers = list(_loggers.values())
+    for logger in loggers:
+        try:
+            logger.flush()
+        except Exception:
+            pass  # One logger's failure (e.g. a full disk) must not keep the others from writing
+
+
+def _flush_on_sigterm():
+    """Flushes every logger when SIGTERM arrives, which atexit does not see, then lets SIGTERM proceed.
+
+    Protocols are stopped with SIGTERM on teardown, so without this they would lose
+    up to FLUSH_INTERVAL of records. Only possible from the main thread."""
+    global _sigterm_handled
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        flush_all()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            # Die of SIGTERM as before, so the exit status still says "terminated"
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        return  # Not the main thread, e.g. an in-process protocol; MAIN flushes on its own exit
+    _sigterm_handled = True
+
+
+def get_logger(path, level=None):
+    """Returns the shared logger for a file, starting the writer thread on first use.
+
+    Records are buffered and formatted by the writer thread, so on hot paths pass
+    values as arguments, logger.info("... %s", value), instead of formatting them
+    into the message first."""
+    global _writer
+
+    path = os.path.abspath(path)
+    logger = _loggers.get(path)
+    if logger is None:
+        with _registry_lock:
+            logger = _loggers.get(path)
+            if logger is None:
+                logger = _loggers[path] = Logger(path)
+            if _writer is None:
+                _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+                _writer.start()
+            if not _sigterm_handled and threading.current_thread() is threading.main_thread():
+                _flush_on_sigterm()
+    if level is not None:
+        logger.level = level
+    return logger
+
+
+def clear(path):
+    """Empties a file, going through its logger if it has one so no queued record lands after the clear."""
+    logger = _loggers.get(os.path.abspath(path))
+    if logger is not None:
+        logger.clear()
+    else:
+        with open(path, "w") as file:
+            file.write("")
+
+
+atexit.register(flush_all)
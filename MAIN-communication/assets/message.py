@@ -0,0 +1,202 @@
+import json
+import base64
+
+FIELDS = ("request", "action", "response", "input", "sender", "receiver", "messageID", "other_info")
+BASE64_KEY = "__base64__"  # JSON text has no bytes type: binary values travel as {"__base64__": "..."}
+
+_MISSING = object()
+_UNDECODED = object()  # input still in its payload frame; decoded on first access
+_set = object.__setattr__
+
+
+def _json_default(value):
+    """json.dumps hook: base64-encodes bytes-like values for JSON-only peers."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {BASE64_KEY: base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value):
+    """json.dumps that also accepts bytes-like values (see BASE64_KEY)."""
+    return json.dumps(value, default=_json_default)
+
+def _unwrap(payload):
+    """Turns binary input sent by a JSON peer back into bytes."""
+    if type(payload) is dict and len(payload) == 1 and BASE64_KEY in payload:
+        return base64.b64decode(payload[BASE64_KEY])
+    return payload
+
+
+class Message:
+    __slots__ = ("request", "action", "response", "_input", "sender", "receiver", "messageID", "other_info",
+                 "_extra", "_wire", "_payload")
+
+    def __init__(self, request=_MISSING, action=_MISSING, response=_MISSING, input=_MISSING,
+                 sender=_MISSING, receiver=_MISSING, messageID=_MISSING, other_info=_MISSING, **extra):
+        """A protocol message: request/action/response, input, sender, receiver, messageID, other_info.
+
+        Fields live in slots instead of a per-message dict, so routing reads
+        message.receiver directly. A message decoded from the wire keeps its original
+        text, and forwarding it unchanged re-sends that text, so the payload is never
+        re-serialised on the way through. Assign fields rather than mutating the
+        payload in place, or the cached text goes stale. Supports get() and [] so code
+        written for plain dict messages keeps working.
+
+        A message decoded from binary frames (wirecodec) keeps its payload frame and
+        only decodes input when it is first read; forwarded with the same codec, the
+        frame is sent on as it is, so routing never touches the payload."""
+        self.request = request
+        self.action = action
+        self.response = response
+        self.input = input
+        self.sender = sender
+        self.receiver = receiver
+        self.messageID = messageID
+        self.other_info = other_info
+        self._extra = extra
+        self._wire = None
+        self._payload = None
+
+    def __setattr__(self, name, value):
+        if name != "_wire":
+            _set(self, "_wire", None)  # Any change invalidates the cached wire text
+        _set(self, name, value)
+
+    @property
+    def input(self):
+        value = self._input
+        if value is _UNDECODED:
+            codec, frame = self._payload
+            try:
+                value = _unwrap(codec.loads(frame))
+            except Exception as e:
+                raise ValueError(f"Undecodable {codec.name.decode(errors='replace')} payload: {e}") from e
+            _set(self, "_input", value)
+        return value
+
+    @input.setter
+    def input(self, value):
+        _set(self, "_input", value)
+        _set(self, "_payload", None)  # The payload frame no longer matches
+
+    ## === CONSTRUCTION === ##
+
+    @classmethod
+    def _build(cls, values, wire=None):
+        """Fills the slots straight from a dict it may consume, skipping __init__ and __setattr__."""
+        message = cls.__new__(cls)
+        pop = values.pop
+        for key in FIELDS:
+            _set(message, key, pop(key, _MISSING))
+        _set(message, "_input", _unwrap(message._input))
+        _set(message, "_extra", values)
+        _set(message, "_wire", wire)
+        _set(message, "_payload", None)
+        return message
+
+    @classmethod
+    def from_frames(cls, fields, codec, payload):
+        """Builds a message from its decoded header fields, leaving input in the undecoded payload frame."""
+        message = cls._build(fields)
+        _set(message, "_input", _UNDECODED)
+        _set(message, "_payload", (codec, payload))
+        return message
+
+    def payload_frame(self, codec):
+        """The received payload frame if it was encoded with codec and input has not been reassigned, else None."""
+        payload = self._payload
+        return payload[1] if payload is not None and payload[0] is codec else None
+
+    @classmethod
+    def from_wire(cls, data):
+        """Decodes JSON text or UTF-8 bytes. Raises ValueError if it is not a JSON object."""
+        text = str(data, "utf-8") if isinstance(data, (bytes, bytearray, memoryview)) else data
+        values = json.loads(text)
+        if not isinstance(values, dict):
+            raise ValueError("Message is not a JSON object")
+        return cls._build(values, text)
+
+    @classmethod
+    def from_dict(cls, message):
+        """Wraps a plain dict message. Values are shared, not copied."""
+        return cls._build(dict(message))
+
+    @classmethod
+    def coerce(cls, message):
+        """Returns message itself if it is already a Message, else wraps it."""
+        return message if isinstance(message, cls) else cls.from_dict(message)
+
+    ## === DICT COMPATIBILITY === ##
+
+    def get(self, key, default=None):
+        if key in FIELDS:
+            value = object.__getattribute__(self, key)
+            return default if value is _MISSING else value
+        return self._extra.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in FIELDS:
+            setattr(self, key, value)
+        else:
+            self._extra[key] = value
+            self._wire = None
+
+    def __contains__(self, key):
+        if key == "input":
+            return self._input is not _MISSING  # Without decoding the payload
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        # Checks _input rather than input, so listing the keys does not decode the payload
+        return [key for key in FIELDS
+                if object.__getattribute__(self, "_input" if key == "input" else key) is not _MISSING] + list(self._extra)
+
+    def to_dict(self):
+        """Returns the message as a plain dict."""
+        return {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Message({self.to_dict()!r})"
+
+    ## === SERIALISATION === ##
+
+    def to_wire(self):
+        """Returns the JSON text, reusing the received text if nothing was changed. Binary input is base64-encoded."""
+        if self._wire is None:
+            _set(self, "_wire", dumps(self.to_dict()))
+        return self._wire
+
+    ## === DERIVATION === ##
+
+    def respond(self, input=None, response=None):
+        """Builds the response to this message, addressed back to its sender."""
+        return Message(
+            response=response if response is not None else f"{self.get('messageID')} completed",
+            input=input,
+            sender=self.get("receiver"),
+            receiver=self.get("sender"),
+            messageID=self.get("messageID"),
+            other_info={}
+        )
+
+
+def to_wire(message):
+    """Serialises a Message or a plain dict message to JSON text."""
+    if isinstance(message, Message):
+        return message.to_wire()
+    return dumps(message)
@@ -0,0 +1,41 @@
+import threading
+import bisect
+
+
+class LatencyHistogram:
+    # Upper bounds of the buckets, in seconds
+    BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, bounds=None):
+        """Thread-safe latency histogram with one series per label (e.g. "cold" and "warm")."""
+        self._lock = threading.Lock()
+        self.bounds = tuple(bounds or self.BOUNDS)
+        self._series = {}
+
+    def record(self, label, seconds):
+        """Adds one observation to the label's series."""
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(self.bounds) + 1)}
+            series["count"] += 1
+            series["sum"] += seconds
+            series["max"] = max(series["max"], seconds)
+            series["buckets"][bisect.bisect_left(self.bounds, seconds)] += 1
+
+    def snapshot(self):
+        """Returns {label: {count, mean, max, buckets: {"<=bound": count, ">last": count}}}."""
+        with self._lock:
+            result = {}
+            for label, series in self._series.items():
+                names = [f"<={bound}s" for bound in self.bounds] + [f">{self.bounds[-1]}s"]
+                result[label] = {
+                    "count": series["count"],
+                    "mean": series["sum"] / series["count"],
+                    "max": series["max"],
+                    "buckets": {name: count for name, count in zip(names, series["buckets"]) if count},
+                }
+            return result
+
+    def __repr__(self):
+        return repr(self.snapshot())
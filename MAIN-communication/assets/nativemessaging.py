@@ -0,0 +1,113 @@
+import json
+import struct
+import threading
+import itertools
+
+HEADER = struct.Struct("=I")  # Native-endian payload length in front of every frame
+MAX_OUTBOUND_BYTES = 1024 * 1024  # Chrome drops host-to-extension messages above 1 MB
+INITIAL_BUFFER_BYTES = 64 * 1024
+CHUNK_OVERHEAD = 256  # Room for the chunk envelope around each slice
+
+_chunk_ids = itertools.count()
+
+
+class FrameReader:
+    def __init__(self, stream, initial_size=INITIAL_BUFFER_BYTES):
+        """Reads Chrome native messaging frames from a binary stream (sys.stdin.buffer).
+
+        Payloads are read with readinto() into one preallocated buffer, grown only for
+        larger frames, and decoded straight from a memoryview of it, so a frame is
+        copied once by the kernel and once by the UTF-8 decoder."""
+        self._stream = stream
+        self._header = bytearray(HEADER.size)
+        self._buffer = bytearray(initial_size)
+        self._view = memoryview(self._buffer)
+
+    def _fill(self, view):
+        """Reads exactly len(view) bytes into view. Returns False at end of stream."""
+        filled = 0
+        while filled < len(view):
+            count = self._stream.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def _reserve(self, length):
+        if length > len(self._buffer):
+            self._view.release()
+            self._buffer = bytearray(1 << (length - 1).bit_length())
+            self._view = memoryview(self._buffer)
+
+    def read(self):
+        """Returns the next message, or None once the stream is closed.
+
+        Raises ValueError if the payload is not valid UTF-8 JSON."""
+        if not self._fill(memoryview(self._header)):
+            return None
+        length = HEADER.unpack(self._header)[0]
+        self._reserve(length)
+        payload = self._view[:length]
+        if not self._fill(payload):
+            return None
+        return json.loads(str(payload, "utf-8"))
+
+
+class FrameWriter:
+    def __init__(self, stream, max_bytes=MAX_OUTBOUND_BYTES):
+        """Writes Chrome native messaging frames to a binary stream (sys.stdout.buffer).
+
+        Thread-safe. Payloads above max_bytes are either refused or, on a persistent
+        connectNative port, split into {"chunk": {id, index, count}, "data": text}
+        frames that the extension joins back together."""
+        self._stream = stream
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _write_frame(self, payload):
+        self._stream.write(HEADER.pack(len(payload)))
+        self._stream.write(payload)
+
+    def write(self, message, chunked=False):
+        """Sends one message. Returns the number of frames written, 0 if it was too large to send."""
+        payload = json.dumps(message).encode("utf-8")
+        if len(payload) <= self.max_bytes:
+            with self._lock:
+                self._write_frame(payload)
+                self._stream.flush()
+            return 1
+        if not chunked:
+            return 0
+
+        # json.dumps output is ASCII, and escaping it again at most doubles its size
+        step = (self.max_bytes - CHUNK_OVERHEAD) // 2
+        view = memoryview(payload)
+        count = (len(payload) + step - 1) // step
+        chunk_id = next(_chunk_ids)
+        with self._lock:  # Chunks of one message must not interleave with other frames
+            for index in range(count):
+                data = str(view[index * step:(index + 1) * step], "ascii")
+                self._write_frame(json.dumps({"chunk": {"id": chunk_id, "index": index, "count": count}, "data": data}).encode("ascii"))
+            self._stream.flush()
+        return count
+
+    def write_batch(self, messages):
+        """Sends {"messages": [...]} holding as many leading messages as fit in one frame.
+
+        Returns how many were sent; the rest belong in a later reply. Returns 0 without
+        writing anything if even the first message is too large on its own."""
+        encoded = [json.dumps(message) for message in messages]  # ASCII, so characters are bytes
+        size = len('{"messages": []}')
+        count = 0
+        for text in encoded:
+            size += len(text) + (2 if count else 0)  # ", " between items, as json.dumps writes them
+            if size > self.max_bytes:
+                break
+            count += 1
+        if messages and not count:
+            return 0
+        payload = ('{"messages": [' + ", ".join(encoded[:count]) + "]}").encode("ascii")
+        with self._lock:
+            self._write_frame(payload)
+            self._stream.flush()
+        return count
@@ -0,0 +1,198 @@
+import time
+import asyncio
+
+from assets import wirecodec
+from assets.protocol_runtime import startup_report, timed_import
+
+MAIN_ID = "MAIN-communication/MAIN_COMMUNICATION.py"
+EXTENSION_ID = "Google Jarvis/background.js"
+REQUEST_TIMEOUT = 120  # Seconds before a request raises TimeoutError
+
+
+class AsyncProtocolClient:
+    def __init__(self, identityID, mother_protocolID, generate_ID, handle_request=None, request_timeout=REQUEST_TIMEOUT,
+                 main_protocolID=None):
+        """Event-loop side of a protocol: one task reads the pipe to MAIN_COMMUNICATION.
+
+        request() sends a message and awaits its response through an asyncio future
+        keyed by messageID, so any number of requests can be in flight at once and
+        combined with asyncio.gather, wait_for or cancellation. Incoming requests are
+        passed to the handle_request coroutine, each in its own task."""
+        self.identityID = identityID
+        self.mother_protocolID = mother_protocolID
+        self.main_protocolID = main_protocolID or identityID
+        self.generate_ID = generate_ID
+        self.handle_request = handle_request
+        self.request_timeout = request_timeout
+        self.codec = None
+        self.pipe = None
+        self._pending = {}  # {messageID: asyncio.Future}
+        self._tasks = set()
+        self._reader = None
+
+    ## === LIFECYCLE === ##
+
+    async def start(self):
+        """Connects to MAIN_COMMUNICATION, negotiates the codec and reports the protocol as loaded."""
+        zmq = timed_import("zmq")  # Imported here so it is timed in the startup report
+        zmq_asyncio = timed_import("zmq.asyncio")
+        self.pipe = zmq_asyncio.Context.instance().socket(zmq.PAIR)
+        ipc_path = self.identityID.replace("subprocess_", "").replace(".py", "") + ".ipc"
+        self.pipe.connect(f"ipc://{ipc_path}")
+        self.codec = await wirecodec.negotiate_async(self.pipe)
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+
+        await self.send({
+            "response": "Protocol loaded",
+            "input": None,
+            "sender": self.identityID,
+            "receiver": MAIN_ID,
+            "messageID": self.new_messageID(),
+            "other_info": {"startup": startup_report()},
+        })
+
+    async def run_forever(self):
+        """Starts the client and serves requests until the pipe closes."""
+        await self.start()
+        await self._reader
+
+    async def close(self):
+        for task in (self._reader, *self._tasks):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in (self._reader, *self._tasks) if task is not None), return_exceptions=True)
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        if self.pipe is not None:
+            self.pipe.close(linger=0)
+
+    ## === MESSAGING === ##
+
+    def new_messageID(self):
+        return f"{self.identityID}_{self.generate_ID()}"
+
+    async def send(self, message):
+        """Sends a message without waiting for a response."""
+        frames = wirecodec.encode(message, self.codec)
+        await self.pipe.send_multipart(frames, copy=not any(len(frame) > wirecodec.ZERO_COPY_BYTES for frame in frames))
+
+    async def request(self, message, timeout=None):
+        """Sends a message and returns its response. Raises asyncio.TimeoutError after timeout seconds."""
+        messageID = message.get("messageID") or self.new_messageID()
+        message = {**message, "messageID": messageID}
+        future = asyncio.get_running_loop().create_future()
+        self._pending[messageID] = future  # Registered before sending so a fast response is not missed
+        try:
+            await self.send(message)
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.request_timeout)
+        finally:
+            self._pending.pop(messageID, None)  # Also on timeout and cancellation
+
+    async def send_output(self, output, request=None):
+        """Sends the protocol output to the mother protocol.
+
+        Pass the "start" request being answered: the output reuses its messageID, which
+        is what the mother's request() is waiting on."""
+        await self.send({
+            "response": self.identityID + " response",
+            "input": output,
+            "sender": self.identityID,
+            "receiver": self.mother_protocolID,
+            "messageID": request.get("messageID") if request else self.new_messageID(),
+        })
+
+    async def _read(self):
+        while True:
+            try:
+                message = wirecodec.decode(await self.pipe.recv_multipart(copy=False))
+            except ValueError:
+                continue  # Handshake or malformed frames
+            if message.get("response"):
+                future = self._pending.pop(message.get("messageID"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+            elif message.get("request") and self.handle_request is not None:
+                task = asyncio.get_running_loop().create_task(self.handle_request(message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+
+class AsyncSubprotocol:
+    def __init__(self, client, subprotocol_type, subprotocol_path, subprotocolID=None, tab_name=None, action=None):
+        """Awaitable counterpart of Subprotocol in template_protocol.py.
+
+        subprotocol_type is "Python file" (subprotocol_path is the script) or "Google
+        extension function" (subprotocol_path is the tab URL, action the function to run
+        in the tab). Many of these can run at once:
+
+            outputs = await asyncio.gather(*(sub.execute(input) for sub in subs))"""
+        self.client = client
+        self.subprotocol_type = subprotocol_type
+        self.subprotocol_path = subprotocol_path
+        self.subprotocolID = subprotocolID
+        self.tab_name = tab_name
+        self.action = action
+
+    def _message(self, request, input, receiver):
+        return {
+            "request": request,
+            "input": input,
+            "sender": self.client.identityID,
+            "receiver": receiver,
+            "messageID": self.client.new_messageID(),
+        }
+
+    async def activate(self, timeout=None):
+        """Starts the subprotocol (or opens its tab) and returns its ID."""
+        if self.subprotocolID:
+            return self.subprotocolID
+
+        if self.subprotocol_type == "Python file":
+            # Only loads the child; execute() sends the "start" request it answers
+            subprotocolID = f"subprocess_{self.subprotocol_path}_{self.client.generate_ID()}"
+            await self.client.request(self._message(
+                "initialize_subprocess",
+                {"script_path": self.subprotocol_path, "subprotocolID": subprotocolID,
+                 "protocol_info": {"mother_protocolID": self.client.identityID, "main_protocolID": self.client.main_protocolID}},
+                MAIN_ID), timeout)
+            self.subprotocolID = subprotocolID
+
+        elif self.subprotocol_type == "Google extension function":
+            tab_name = f"tab/{self.subprotocol_path}_{int(time.time())}"
+            response = await self.client.request(self._message(
+                "open_new_tab", {"tab_url": self.subprotocol_path, "tab_name": tab_name}, EXTENSION_ID), timeout)
+            self.subprotocolID = (response.get("input") or {}).get("tab_id")
+            self.tab_name = tab_name
+        return self.subprotocolID
+
+    async def deactivate(self, timeout=None):
+        """Stops the subprotocol (or closes its tab)."""
+        if not self.subprotocolID:
+            return
+        subprotocolID, self.subprotocolID = self.subprotocolID, None
+
+        if self.subprotocol_type == "Python file":
+            await self.client.request(self._message(
+                "deactivate_subprocess", {"subprotocolID": subprotocolID}, MAIN_ID), timeout)
+        elif self.subprotocol_type == "Google extension function":
+            await self.client.request(self._message(
+                "close_tab", {"tab_name": self.tab_name}, EXTENSION_ID), timeout)
+
+    async def execute(self, input, timeout=None):
+        """Runs the subprotocol with input and returns the response message.
+
+        The child answers with the messageID of the "start" request. A Python file
+        subprotocol is activated first and always deactivated afterwards, also when the
+        call times out or is cancelled."""
+        if self.subprotocol_type == "Google extension function":
+            if not self.subprotocolID:
+                await self.activate(timeout)
+            return await self.client.request(self._message(self.action, input, self.tab_name), timeout)
+
+        await self.activate(timeout)
+        try:
+            return await self.client.request(self._message("start", input, self.subprotocolID), timeout)
+        finally:
+            # Shielded so cancelling the caller still shuts the child down
+            await asyncio.shield(self.deactivate(timeout))
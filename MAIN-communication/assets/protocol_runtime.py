@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import types
+import random
+import hashlib
+import importlib
+import threading
+
+from assets import logger as logging_runtime
+
+MAIN_ID = "MAIN-communication/MAIN_COMMUNICATION.py"
+BASE62_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+RUNTIME_STARTED = time.perf_counter()  # Taken when the first protocol helper is imported
+import_timings = {}  # {module name: seconds spent importing it}
+_import_lock = threading.Lock()
+
+
+## === IMPORTS === ##
+
+def timed_import(name):
+    """Imports a module now, recording how long it took in import_timings."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _import_lock:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        import_timings.setdefault(name, time.perf_counter() - started)
+    return module
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        """Stand-in for a module that is imported on first attribute access.
+
+        Lets a protocol declare np = lazy_import("numpy") at the top of the file and
+        report "Protocol loaded" before paying for numpy, which is then imported the
+        first time np.something is used. The import time lands in import_timings."""
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = timed_import(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name):
+    """Returns the module if it is already imported, else a LazyModule for it."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def startup_report():
+    """Returns {seconds: since the runtime was imported, imports: {name: seconds}}, slowest import first."""
+    return {
+        "seconds": time.perf_counter() - RUNTIME_STARTED,
+        "imports": dict(sorted(import_timings.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+def describe_startup(report):
+    """One log line for a startup_report()."""
+    imports = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in report["imports"].items())
+    return f"Protocol loaded after {report['seconds'] * 1000:.1f} ms (imports: {imports or 'none timed'})"
+
+
+## === IDENTIFIERS === ##
+
+def base62_encode(num):
+    """Convert a number to Base-62 string."""
+    if num == 0:
+        return BASE62_ALPHABET[0]
+
+    base62 = []
+    while num:
+        num, rem = divmod(num, 62)
+        base62.append(BASE62_ALPHABET[rem])
+
+    return ''.join(reversed(base62))
+
+def generate_ID():
+    """Timestamp, 3 random characters and a 2 character checksum, all Base-62."""
+    timestamp_base62 = base62_encode(int(time.time() * 1000))
+    rand_str = ''.join(random.choices(BASE62_ALPHABET, k=3))
+    checksum = hashlib.md5(f"{timestamp_base62}{rand_str}".encode()).digest()
+    hash_base62 = base62_encode(int.from_bytes(checksum, "big"))[:2]
+    return f"{timestamp_base62}{rand_str}{hash_base62}"
+
+
+## === RUNTIME === ##
+
+class ProtocolRuntime:
+    def __init__(self, script_path):
+        """Pipe, logging and message loop shared by every protocol script.
+
+        script_path is the protocol's __file__. zmq and the wire codec are imported
+        only when connect() is called, and every import made through the runtime is
+        timed, so startup_report() shows where the time to "Protocol loaded" went."""
+        self.identity_path = os.path.abspath(script_path)
+        self.log_file_path = os.path.join(
+            os.path.dirname(self.identity_path),
+            os.path.basename(self.identity_path).replace("_", "").replace(".py", ".log"))
+        # Create log file if not exist
+        if not os.path.exists(self.log_file_path):
+            with open(self.log_file_path, 'a'):
+                pass
+        self.logger = logging_runtime.get_logger(self.log_file_path)
+
+        self.pipe = None
+        self.codec = None  # Wire codec agreed with MAIN_COMMUNICATION; None sends JSON strings
+        self.subprocess_info = {}
+        self.identityID = None
+        self.main_protocolID = None
+        self.mother_protocolID = None
+        self.channel = None  # InProcessChannel when MAIN_COMMUNICATION runs the protocol on one of its threads
+        self._wirecodec = None
+        self._zmq = None
+        self._send_lock = threading.Lock()
+
+    ## === LOGGING === ##
+
+    def log(self, message):
+        self.logger.info(message)
+
+    def clear_log(self):
+        logging_runtime.clear(self.log_file_path)
+
+    ## === SETUP === ##
+
+    def read_subprocess_info(self, stream=None):
+        """Reads the {subprotocolID: info} line MAIN_COMMUNICATION writes to stdin and sets the identity fields.
+
+        In-process and rebound protocols already have their info and never touch stdin."""
+        if stream is not None or not self.subprocess_info:
+            self.subprocess_info = json.loads((stream or sys.stdin).readline().strip())
+        self.logger.info("Subprocess info: %s", self.subprocess_info)
+        self.identityID = next(iter(self.subprocess_info))
+        info = self.subprocess_info[self.identityID]
+        self.main_protocolID = info.get('main_protocolID')
+        self.mother_protocolID = info.get('mother_protocolID')
+        return self.subprocess_info
+
+    def connect(self, ipc_path=None, negotiate=True):
+        """Connects the PAIR pipe to MAIN_COMMUNICATION and returns it.
+
+        ipc_path defaults to the one MAIN_COMMUNICATION binds for identityID. With
+        negotiate the wire codec handshake runs right away. In-process protocols
+        already have their channel and return it."""
+        if self.channel is not None:
+            return self.channel
+        self._zmq = timed_import("zmq")
+        self._wirecodec = timed_import("assets.wirecodec")
+
+        if ipc_path is None:
+            ipc_path = "ipc://" + self.identityID.replace("subprocess_", "").replace(".py", "") + ".ipc"
+        self.pipe = self._zmq.Context.instance().socket(self._zmq.PAIR)
+        self.pipe.connect(ipc_path)
+        if negotiate:
+            self.codec = self._wirecodec.negotiate(self.pipe)
+            self.log(f"Wire codec: {self.codec.name.decode() if self.codec else 'json string'}")
+        return self.pipe
+
+    def attach(self, channel, subprocess_info):
+        """Runs the protocol over an in-memory channel instead of a pipe (see assets/inprocess.py)."""
+        self.channel = channel
+        self.subprocess_info = subprocess_info
+        self.read_subprocess_info()
+
+    def rebind(self, subprocess_info):
+        """Adopts the identity of a new activation when MAIN_COMMUNICATION reuses this process from its pool."""
+        self.subprocess_info = subprocess_info
+        self.read_subprocess_info()
+
+    def mark_loaded(self, rebindable=False):
+        """Tells MAIN_COMMUNICATION the protocol is ready, attaching the startup report.
+
+        rebindable says the protocol handles the "rebind" request, so MAIN_COMMUNICATION
+        may keep it in its pool and reuse it instead of starting a new process."""
+        report = startup_report()
+        self.log(describe_startup(report))
+        self.send({
+            "response": "Protocol loaded",
+            "input": None,
+            "sender": self.identityID,
+            "receiver": MAIN_ID,
+            "messageID": f"{self.identityID}_{generate_ID()}",
+            "other_info": {"startup": report, "rebindable": rebindable},
+        })
+
+    ## === MESSAGING === ##
+
+    def send(self, message):
+        """Sends a message to MAIN_COMMUNICATION with the agreed codec. Returns False if the pipe is not open."""
+        if self.channel is not None:
+            self.channel.post(message)
+            self.logger.info("Message posted to MAIN_COMMUNICATION: %s", message)
+            return True
+        if self.pipe is None:
+            self.log("Pipe is not open, message not sent.")
+            return False
+        with self._send_lock:  # zmq sockets are not thread-safe
+            self._wirecodec.send(self.pipe, message, self.codec)
+        self.logger.info("Message sent to MAIN_COMMUNICATION: %s", message)
+        return True
+
+    def serve(self, handle_message):
+        """Reads messages from MAIN_COMMUNICATION and passes each to handle_message until the pipe fails."""
+        if self.channel is not None:
+            return self._serve_channel(handle_message)
+        while True:
+            try:
+                message = self._wirecodec.recv(self.pipe)  # JSON string or codec frames
+                if message is None:
+                    continue
+
+                self.logger.info("Received message from main: %s", message)
+                handle_message(message)
+            except ValueError as e:
+                self.log(f"Failed to parse message from main: {e}")
+            except self._zmq.ZMQError as e:
+                self.log(f"Error in communication with main: {e}")
+                break
+
+    def _serve_channel(self, handle_message):
+        while True:
+            message = self.channel.listen()
+            if message is None:
+                self.log("Channel to main closed")
+                return
+            self.logger.info("Received message from main: %s", message)
+            try:
+                handle_message(message)
+            except Exception as e:
+                self.log(f"Error handling message from main: {type(e).__name__} - {e}")
+
+    def serve_in_background(self, handle_message):
+        """Runs serve() on a daemon thread and returns the thread."""
+        thread = threading.Thread(target=self.serve, args=(handle_message,), daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,106 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class ProtocolPool:
+    def __init__(self, max_size=8, idle_ttl=300.0, on_evict=None):
+        """Idle protocol instances kept alive so the next activation of the same script can reuse them.
+
+        Instances are keyed by their original subprotocolID and kept in least recently
+        released order. Releasing past max_size evicts the least recently used
+        instance, and evict_idle() drops those idle for longer than idle_ttl seconds.
+        on_evict(instances) is called outside the lock with each batch of evicted instances."""
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._idle = OrderedDict()  # {poolID: (script_path, instance, released_at)}, least recently used first
+        self._stats = {}  # {script_path: {"hits", "misses", "evictions"}}
+
+    def _script_stats(self, script_path):
+        stats = self._stats.get(script_path)
+        if stats is None:
+            stats = self._stats[script_path] = {"hits": 0, "misses": 0, "evictions": 0}
+        return stats
+
+    def acquire(self, script_path, is_alive=None):
+        """Takes the most recently released idle instance of script_path, or returns None on a miss.
+
+        Instances for which is_alive(instance) is False are dropped on the way."""
+        dead = []
+        found = None
+        with self._lock:
+            for poolID in reversed(self._idle):
+                path, instance, _ = self._idle[poolID]
+                if path != script_path:
+                    continue
+                if is_alive is not None and not is_alive(instance):
+                    dead.append(poolID)
+                    continue
+                found = poolID
+                break
+            for poolID in dead:
+                del self._idle[poolID]
+            stats = self._script_stats(script_path)
+            if found is None:
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            return self._idle.pop(found)[1]
+
+    def release(self, poolID, script_path, instance):
+        """Puts a finished instance back in the pool, evicting the least recently used one if it is full."""
+        evicted = []
+        with self._lock:
+            self._idle[poolID] = (script_path, instance, time.monotonic())
+            while len(self._idle) > self.max_size:
+                _, (path, old, _) = self._idle.popitem(last=False)
+                self._script_stats(path)["evictions"] += 1
+                evicted.append(old)
+        self._evict(evicted)
+
+    def evict_idle(self, now=None):
+        """Evicts instances idle for longer than idle_ttl. Returns how many were evicted."""
+        now = time.monotonic() if now is None else now
+        evicted = []
+        with self._lock:
+            for poolID, (path, instance, released_at) in list(self._idle.items()):
+                if now - released_at < self.idle_ttl:
+                    break  # Later entries were released more recently
+                del self._idle[poolID]
+                self._script_stats(path)["evictions"] += 1
+                evicted.append(instance)
+        self._evict(evicted)
+        return len(evicted)
+
+    def clear(self):
+        """Evicts every idle instance, e.g. on shutdown."""
+        with self._lock:
+            evicted = [instance for _, instance, _ in self._idle.values()]
+            self._idle.clear()
+        self._evict(evicted)
+
+    def _evict(self, instances):
+        if instances and self.on_evict is not None:
+            self.on_evict(instances)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._idle)
+
+    def stats(self):
+        """Returns {hits, misses, evictions, hit_rate, idle, scripts: {script_path: {hits, misses, evictions, hit_rate}}}."""
+        with self._lock:
+            scripts = {path: {**stats, "hit_rate": _rate(stats)} for path, stats in self._stats.items()}
+            idle = len(self._idle)
+        total = {key: sum(stats[key] for stats in scripts.values()) for key in ("hits", "misses", "evictions")}
+        return {**total, "hit_rate": _rate(total), "idle": idle, "scripts": scripts}
+
+    def __repr__(self):
+        return repr(self.stats())
+
+
+def _rate(stats):
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
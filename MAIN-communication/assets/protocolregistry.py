@@ -0,0 +1,173 @@
+import threading
+from contextlib import contextmanager
+
+_INDEXED_FIELDS = ('mother_protocolID',)
+
+
+class ProtocolRegistry:
+    def __init__(self):
+        """Thread-safe table of active protocols, {subprotocolID: info}, with a tree index.
+
+        Alongside the entries it keeps the children of every mother_protocolID, so
+        finding a protocol's dependents or tearing down a tree costs time proportional
+        to that subtree, not to every active protocol. The index follows
+        mother_protocolID whenever an entry is stored, popped or changed with
+        set_path(). Reads behave like GlobalVariable: a missing ID reads as None."""
+        self._lock = threading.RLock()
+        self._entries = {}  # {subprotocolID: info}
+        self._children = {}  # {mother_protocolID: {subprotocolID, ...}}
+
+    ## === INDEX === ##
+
+    def _index(self, subprotocolID, info):
+        self._children.setdefault(info.get('mother_protocolID'), set()).add(subprotocolID)
+
+    def _unindex(self, subprotocolID, info):
+        mother_protocolID = info.get('mother_protocolID')
+        ids = self._children.get(mother_protocolID)
+        if ids is not None:
+            ids.discard(subprotocolID)
+            if not ids:
+                del self._children[mother_protocolID]
+
+    def children(self, subprotocolID):
+        """IDs of the protocols whose mother is subprotocolID."""
+        with self._lock:
+            return list(self._children.get(subprotocolID, ()))
+
+    def subtree(self, subprotocolID):
+        """subprotocolID and all its descendants, each after its own descendants (teardown order).
+
+        The root is included only if it is registered itself."""
+        with self._lock:
+            order = []
+            visited = {subprotocolID}
+            stack = [(subprotocolID, iter(self._children.get(subprotocolID, ())))]
+            while stack:
+                protocolID, pending = stack[-1]
+                child = next(pending, None)
+                if child is None:
+                    stack.pop()
+                    if protocolID in self._entries:
+                        order.append(protocolID)
+                elif child not in visited:
+                    visited.add(child)
+                    stack.append((child, iter(self._children.get(child, ()))))
+            return order
+
+    ## === DICTIONARY OPERATIONS === ##
+
+    def __getitem__(self, subprotocolID):
+        with self._lock:
+            return self._entries.get(subprotocolID)
+
+    def get(self, subprotocolID, default=None):
+        with self._lock:
+            return self._entries.get(subprotocolID, default)
+
+    def __setitem__(self, subprotocolID, info):
+        with self._lock:
+            old = self._entries.get(subprotocolID)
+            if old is not None:
+                self._unindex(subprotocolID, old)
+            self._entries[subprotocolID] = info
+            self._index(subprotocolID, info)
+
+    def __delitem__(self, subprotocolID):
+        with self._lock:
+            self._unindex(subprotocolID, self._entries.pop(subprotocolID))
+
+    def pop(self, subprotocolID, default=None):
+        with self._lock:
+            info = self._entries.pop(subprotocolID, None)
+            if info is None:
+                return default
+            self._unindex(subprotocolID, info)
+            return info
+
+    def __contains__(self, subprotocolID):
+        with self._lock:
+            return subprotocolID in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def values(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def items(self):
+        with self._lock:
+            return list(self._entries.items())
+
+    ## === ATOMIC OPERATIONS === ##
+
+    @contextmanager
+    def transaction(self):
+        """Holds the registry lock for a block of reads and writes, which then happen atomically.
+
+            with active_protocols.transaction():
+                if active_protocols.get_path([subprotocolID, 'loaded']):
+                    ...
+
+        The lock is re-entrant, so the registry's own methods can be used inside."""
+        with self._lock:
+            yield self
+
+    def mget(self, subprotocolIDs, default=None):
+        """Reads several entries under one lock acquisition."""
+        with self._lock:
+            return [self._entries.get(subprotocolID, default) for subprotocolID in subprotocolIDs]
+
+    def mset(self, entries):
+        """Stores several entries under one lock acquisition."""
+        with self._lock:
+            for subprotocolID, info in dict(entries).items():
+                self[subprotocolID] = info
+
+    def get_path(self, path, default=None):
+        """Reads a nested value in one step, e.g. get_path([subprotocolID, 'main_protocolID'])."""
+        with self._lock:
+            value = self._entries
+            for step in path:
+                try:
+                    value = value[step]
+                except (KeyError, IndexError, TypeError):
+                    return default
+            return value
+
+    def set_path(self, path, value):
+        """Sets a field of an entry, e.g. set_path([subprotocolID, 'loaded'], True). Returns False if the entry is gone.
+
+        Missing dicts below the entry are created. Changing mother_protocolID this
+        way moves the entry in the index."""
+        if len(path) < 2:
+            raise ValueError("set_path() needs a subprotocolID and at least one field")
+        with self._lock:
+            info = self._entries.get(path[0])
+            if info is None:
+                return False
+            reindex = path[1] in _INDEXED_FIELDS
+            if reindex:
+                self._unindex(path[0], info)
+            container = info
+            for step in path[1:-1]:
+                if not isinstance(container.get(step), dict):
+                    container[step] = {}
+                container = container[step]
+            container[path[-1]] = value
+            if reindex:
+                self._index(path[0], info)
+            return True
+
+    def __repr__(self):
+        with self._lock:
+            return repr(self._entries)
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+
+class ReadinessRegistry:
+    def __init__(self):
+        """Tracks which keys (e.g. subprotocol IDs) have signalled that they are ready.
+
+        Waiters block on a threading.Event or await an asyncio future, so they wake as
+        soon as mark_ready() is called and use no CPU while waiting."""
+        self._lock = threading.Lock()
+        self._events = {}  # {key: threading.Event}
+        self._futures = {}  # {key: [(loop, future)]}
+
+    def _event(self, key):
+        with self._lock:
+            event = self._events.get(key)
+            if event is None:
+                event = self._events[key] = threading.Event()
+            return event
+
+    def expect(self, key):
+        """Registers a key before it can become ready, so an early signal is not lost."""
+        self._event(key)
+
+    def mark_ready(self, key):
+        """Signals that key is ready, waking every waiter. Returns False, doing nothing, if key is not expected.
+
+        Late signals for keys that were already discarded are ignored, so they do not
+        leave an event behind that nobody will ever remove."""
+        with self._lock:
+            event = self._events.get(key)
+            if event is None:
+                return False
+            event.set()
+            waiters = self._futures.pop(key, [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(lambda future=future: future.done() or future.set_result(True))
+        return True
+
+    def is_ready(self, key):
+        with self._lock:
+            event = self._events.get(key)
+        return event is not None and event.is_set()
+
+    def wait(self, key, timeout=None):
+        """Blocks until key is ready. Returns False if the timeout expires first."""
+        return self._event(key).wait(timeout)
+
+    async def wait_async(self, key, timeout=None):
+        """Coroutine version of wait()."""
+        event = self._event(key)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if event.is_set():
+                return True
+            self._futures.setdefault(key, []).append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                waiters = self._futures.get(key, [])
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+                if not waiters:
+                    self._futures.pop(key, None)
+
+    def discard(self, key):
+        """Forgets a key once nobody needs to wait on it any more."""
+        with self._lock:
+            self._events.pop(key, None)
+            self._futures.pop(key, None)
@@ -0,0 +1,355 @@
+import os
+import mmap
+import time
+import stat
+import errno
+import fcntl
+import struct
+import select
+import threading
+from contextlib import contextmanager
+
+MAGIC = b"JRB1"
+HEADER = struct.Struct("<4sI")  # magic, capacity
+INDEX = struct.Struct("<Q")
+HEAD_OFFSET = 8  # Total bytes ever written (producer-owned)
+TAIL_OFFSET = 16  # Total bytes ever consumed (consumer-owned)
+OWNER_OFFSET = 24  # PID of the process that created the buffer
+FILE_MARK_OFFSET = 32  # File-bus position just after the last record a producer diverted there (producer-owned)
+FILE_READ_OFFSET = 40  # File-bus position the consumer has read up to (consumer-owned)
+DATA_OFFSET = 64
+RECORD = struct.Struct("<I")  # Payload length in front of every record
+WRAP = 0xFFFFFFFF  # Length value meaning "skip to the start of the buffer"
+
+_fence_lock = threading.Lock()
+
+
+def _position(cursor):
+    """Packs a SegmentedLog (segment, offset) position into one 64-bit index, ordered like the tuple."""
+    seq, offset = cursor
+    return (seq << 32) | offset
+
+
+@contextmanager
+def _flocked(path):
+    """Exclusive cross-process lock on a lock file."""
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _fence():
+    """Store barrier: a mutex round trip is a full memory barrier on every platform we run on."""
+    with _fence_lock:
+        pass
+
+
+class RingBuffer:
+    def __init__(self, path, capacity=1024 * 1024, create=False):
+        """Shared-memory ring buffer of length-prefixed records between two processes.
+
+        The buffer is an mmap of path; head and tail are monotonically increasing byte
+        counts owned by the producer and the consumer respectively. A FIFO next to it
+        (path + ".bell") is the doorbell: the producer writes a byte after publishing
+        and the consumer sleeps in select() on it, so neither side polls.
+
+        Producers and consumers each take an flock, so several short-lived processes
+        may share one side safely; within a side it behaves as single-producer,
+        single-consumer. Opening with create=False raises OSError/ValueError if the
+        buffer has not been created, which callers use to fall back to the file bus.
+
+        The creating process records its PID in the header; owner_alive() tells the
+        other side whether anyone still reads or writes the buffer. Creating replaces
+        the file atomically, so processes holding the previous buffer keep a private
+        copy whose owner is gone instead of a file changing underneath them."""
+        self.path = path
+        self.bell_path = path + ".bell"
+        self.poll_interval = 0.1  # Only used by callers when fileno() is None
+        self._send_lock = threading.Lock()
+        self._receive_lock = threading.Lock()
+        self._bell_reader = None
+        self._bell_keepalive = None
+        self._bell_writer = None
+        self._peeked = None  # (tail when peeked, [tail after each peeked record]) from receive(consume=False)
+
+        if create:
+            with open(path + ".tmp", "wb") as file:
+                file.write(HEADER.pack(MAGIC, capacity))
+                file.truncate(DATA_OFFSET + capacity)
+                file.seek(OWNER_OFFSET)
+                file.write(INDEX.pack(os.getpid()))
+            os.replace(path + ".tmp", path)
+            if os.path.exists(self.bell_path) and not stat.S_ISFIFO(os.stat(self.bell_path).st_mode):
+                os.remove(self.bell_path)
+            if not os.path.exists(self.bell_path):
+                os.mkfifo(self.bell_path)
+
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.capacity = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) < DATA_OFFSET + self.capacity:
+            self.close()
+            raise ValueError(f"{path} is not a ring buffer")
+        self._producer_lock_path = path + ".send.lock"
+        self._consumer_lock_path = path + ".receive.lock"
+
+    ## === INDICES === ##
+
+    def _get(self, offset):
+        return INDEX.unpack_from(self._map, offset)[0]
+
+    def _set(self, offset, value):
+        INDEX.pack_into(self._map, offset, value)
+
+    def pending(self):
+        """Bytes published but not yet consumed."""
+        return self._get(HEAD_OFFSET) - self._get(TAIL_OFFSET)
+
+    def owner_alive(self):
+        """Whether the process that created the buffer is still running."""
+        try:
+            os.kill(self._get(OWNER_OFFSET), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass  # Running, under another user
+        return True
+
+    def file_pending(self):
+        """Whether records diverted to the file bus have not all been read yet."""
+        return self._get(FILE_READ_OFFSET) < self._get(FILE_MARK_OFFSET)
+
+    def mark_file_read(self, cursor):
+        """Consumer: records that the file bus has been read up to cursor, a (segment, offset) position."""
+        if cursor[0] is not None:
+            self._set(FILE_READ_OFFSET, _position(cursor))
+
+    @staticmethod
+    def remove(path):
+        """Deletes the buffer at path and its doorbell and lock files, e.g. on shutdown or when rings are disabled."""
+        for suffix in ("", ".bell", ".send.lock", ".receive.lock", ".tmp"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+    ## === PRODUCER === ##
+
+    def send(self, data, timeout=0):
+        """Publishes one record. Returns False if there is no room within timeout seconds."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if RECORD.size + len(data) > self.capacity // 2:
+            raise ValueError(f"Record of {len(data)} bytes is too large for the ring buffer")
+
+        with self._send_lock, _flocked(self._producer_lock_path):
+            sent = self._publish(data, timeout)
+        if sent:
+            self._ring()
+        return sent
+
+    def send_or_append(self, line, bus, timeout=0):
+        """Publishes line, or appends it to bus (a SegmentedLog) if the ring is full or the line too large.
+
+        Once a record has gone to the file, later records follow it there until the
+        consumer reports having read past it (mark_file_read), so a consumer that
+        reads the ring first and the file second still sees them in order. Returns
+        True if the line went through the ring."""
+        data = line.encode("utf-8") if isinstance(line, str) else line
+        fits = RECORD.size + len(data) <= self.capacity // 2
+        with self._send_lock, _flocked(self._producer_lock_path):
+            sent = fits and not self.file_pending() and self._publish(data, timeout)
+            if not sent:
+                self._set(FILE_MARK_OFFSET, _position(bus.append(data.decode("utf-8"))))
+        self._ring()  # File records wake the consumer too
+        return sent
+
+    def _publish(self, data, timeout):
+        """Writes one record. Caller holds the producer locks."""
+        size = RECORD.size + len(data)
+        deadline = time.monotonic() + timeout
+        head = self._get(HEAD_OFFSET)
+        position = head % self.capacity
+        room_to_end = self.capacity - position
+        needed = size if room_to_end >= size else room_to_end + size
+
+        while self.capacity - (head - self._get(TAIL_OFFSET)) < needed:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.0005)
+
+        if room_to_end < size:
+            # Not enough contiguous space: mark the rest as skipped and wrap around
+            if room_to_end >= RECORD.size:
+                RECORD.pack_into(self._map, DATA_OFFSET + position, WRAP)
+            position = 0
+        start = DATA_OFFSET + position
+        RECORD.pack_into(self._map, start, len(data))
+        self._map[start + RECORD.size:start + size] = data
+        _fence()  # The record must be visible before the head that publishes it
+        self._set(HEAD_OFFSET, head + needed)
+        return True
+
+    def _ring(self):
+        """Wakes the consumer, if one is listening."""
+        if self._bell_writer is None:
+            try:
+                self._bell_writer = os.open(self.bell_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                return  # ENXIO: no consumer has the doorbell open
+        try:
+            os.write(self._bell_writer, b"\0")
+        except BlockingIOError:
+            pass  # Doorbell already full of pending wake-ups
+        except OSError as e:
+            if e.errno == errno.EPIPE:
+                os.close(self._bell_writer)
+                self._bell_writer = None
+
+    ## === CONSUMER === ##
+
+    def receive(self, limit=None, max_bytes=None, consume=True):
+        """Returns published records as bytes, at most limit of them and max_bytes in total if given.
+
+        The first record is always returned, whatever its size. With consume=False the
+        records stay in the buffer until consume(count) says how many were used."""
+        records = []
+        tails = []
+        used = 0
+        with self._receive_lock, _flocked(self._consumer_lock_path):
+            head = self._get(HEAD_OFFSET)
+            _fence()  # Read the head before the records it publishes
+            tail = first = self._get(TAIL_OFFSET)
+            while tail < head and (limit is None or len(records) < limit):
+                position = tail % self.capacity
+                room_to_end = self.capacity - position
+                if room_to_end < RECORD.size:
+                    tail += room_to_end
+                    continue
+                start = DATA_OFFSET + position
+                length = RECORD.unpack_from(self._map, start)[0]
+                if length == WRAP:
+                    tail += room_to_end
+                    continue
+                if max_bytes is not None and records and used + length > max_bytes:
+                    break
+                used += length
+                records.append(self._map[start + RECORD.size:start + RECORD.size + length])
+                tail += RECORD.size + length
+                tails.append(tail)
+            if consume:
+                self._set(TAIL_OFFSET, tail)
+            else:
+                self._peeked = (first, tails)
+        return records
+
+    def consume(self, count):
+        """Removes the first count records returned by the last receive(consume=False)."""
+        with self._receive_lock, _flocked(self._consumer_lock_path):
+            if count and self._peeked is not None and self._get(TAIL_OFFSET) == self._peeked[0]:
+                self._set(TAIL_OFFSET, self._peeked[1][count - 1])
+            self._peeked = None
+
+    def read_lines(self, limit=None, max_bytes=None, consume=True):
+        """receive() decoded as text, matching the SegmentReader interface."""
+        return [record.decode("utf-8", errors="replace") for record in self.receive(limit, max_bytes, consume)]
+
+    def ack(self):
+        """Records are consumed as they are read; kept for parity with SegmentReader."""
+
+    def fileno(self):
+        """Returns the doorbell descriptor for select/event loops."""
+        if self._bell_reader is None:
+            self._bell_reader = os.open(self.bell_path, os.O_RDONLY | os.O_NONBLOCK)
+            # Holding a writer ourselves keeps the FIFO from reporting EOF when no producer is open
+            self._bell_keepalive = os.open(self.bell_path, os.O_WRONLY | os.O_NONBLOCK)
+        return self._bell_reader
+
+    def wait(self, timeout=None):
+        """Blocks until the producer rings or the timeout expires."""
+        bell = self.fileno()
+        readable, _, _ = select.select([bell], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            while os.read(bell, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def follow_batches(self):
+        """Yields every batch of new records as text, sleeping while nothing is published."""
+        while True:
+            lines = self.read_lines()
+            if not lines:
+                self.wait(timeout=1)
+                continue
+            yield lines
+
+    def close(self):
+        for fd in (self._bell_reader, self._bell_keepalive, self._bell_writer):
+            if fd is not None:
+                os.close(fd)
+        self._bell_reader = self._bell_keepalive = self._bell_writer = None
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class RingFileReader:
+    def __init__(self, ring, reader):
+        """Reads a RingBuffer and the SegmentReader of its fallback file bus as one ordered stream.
+
+        Every read drains the ring before the file and reports the file position back
+        to the ring, which is what RingBuffer.send_or_append relies on to keep records
+        that overflowed to the file in order. Offers the SegmentReader interface."""
+        self.ring = ring
+        self.reader = reader
+        self.poll_interval = reader.poll_interval
+
+    def read_lines(self, limit=None, max_bytes=None):
+        lines = self.ring.read_lines(limit, max_bytes)
+        used = sum(len(line) for line in lines)
+        if (limit is None or len(lines) < limit) and (max_bytes is None or used < max_bytes):
+            lines += self.reader.read_lines(
+                None if limit is None else limit - len(lines),
+                None if max_bytes is None else max_bytes - used
+            )
+            self.ring.mark_file_read(self.reader.cursor)
+        return lines
+
+    def ack(self):
+        self.reader.ack()
+
+    def fileno(self):
+        """The ring's doorbell, which producers also ring for records sent to the file."""
+        return self.ring.fileno()
+
+    def wait(self, timeout=None):
+        """Blocks until the ring's doorbell rings, the file bus changes or the timeout expires."""
+        descriptors = [fd for fd in (self.ring.fileno(), self.reader.fileno()) if fd is not None]
+        if self.reader.fileno() is None:
+            timeout = self.poll_interval if timeout is None else min(timeout, self.poll_interval)
+        readable, _, _ = select.select(descriptors, [], [], timeout)
+        # Consume the wake-ups so the next wait blocks again
+        self.ring.wait(0)
+        if self.reader.fileno() is not None:
+            self.reader.wait(0)
+        return bool(readable)
+
+    def follow_batches(self):
+        """Yields every batch of new lines, sleeping while nothing is sent."""
+        while True:
+            lines = self.read_lines()
+            if not lines:
+                self.wait(timeout=1)
+                continue
+            yield lines
+
+    def close(self):
+        self.reader.close()
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+
+
+class PrefixRouter:
+    def __init__(self, routes=None, cache_size=1024):
+        """Maps receiver names to handlers by their longest registered prefix.
+
+        Prefixes are compiled into a character trie, and resolved receivers are kept
+        in an LRU cache, so repeat lookups cost one dict hit no matter how many
+        receivers or routes exist. Routes can be added and removed at runtime."""
+        self._lock = threading.RLock()
+        self._root = {}
+        self._routes = {}
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+        for prefix, handler in (routes or {}).items():
+            self.register(prefix, handler)
+
+    ## === ROUTE TABLE === ##
+
+    def register(self, prefix, handler):
+        """Adds or replaces the handler for a prefix."""
+        with self._lock:
+            node = self._root
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[None] = handler  # None marks the end of a prefix
+            self._routes[prefix] = handler
+            self._cache.clear()
+
+    def unregister(self, prefix):
+        """Removes a prefix, returning its handler (or None if it was not registered)."""
+        with self._lock:
+            if prefix not in self._routes:
+                return None
+            # Walk down, remembering the path so empty branches can be pruned
+            path = [self._root]
+            for char in prefix:
+                path.append(path[-1][char])
+            handler = path[-1].pop(None)
+            for depth in range(len(prefix), 0, -1):
+                if path[depth]:
+                    break
+                del path[depth - 1][prefix[depth - 1]]
+            del self._routes[prefix]
+            self._cache.clear()
+            return handler
+
+    def routes(self):
+        """Returns a copy of the registered {prefix: handler} table."""
+        with self._lock:
+            return dict(self._routes)
+
+    ## === LOOKUP === ##
+
+    def _match(self, receiver):
+        """Walks the trie and returns the handler of the longest matching prefix."""
+        node = self._root
+        handler = node.get(None)
+        for char in receiver:
+            node = node.get(char)
+            if node is None:
+                break
+            handler = node.get(None, handler)
+        return handler
+
+    def resolve(self, receiver):
+        """Returns the handler for a receiver, or None if no prefix matches."""
+        with self._lock:
+            if receiver in self._cache:
+                self._cache.move_to_end(receiver)
+                self.hits += 1
+                return self._cache[receiver]
+
+            self.misses += 1
+            handler = self._match(receiver)
+            self._cache[receiver] = handler
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return handler
+
+    def route(self, message):
+        """Passes the message to its receiver's handler. Returns False if none matched."""
+        handler = self.resolve(message.get('receiver', ''))
+        if handler is None:
+            return False
+        handler(message)
+        return True
@@ -0,0 +1,229 @@
+import os
+import fcntl
+from contextlib import contextmanager
+
+from assets.filewatcher import DirectoryWatcher
+
+SEGMENT_BYTES = 1024 * 1024  # Size after which writers start a new segment
+
+
+class SegmentedLog:
+    def __init__(self, base_path, segment_bytes=SEGMENT_BYTES):
+        """Append-only comms bus split into numbered segment files <base_path>.00000000, ...
+
+        Writers always append to the highest segment and start a new one once it is
+        segment_bytes long. Segments are only written while they are the highest, so a
+        reader that has drained a segment after seeing a newer one can move on, and
+        segments behind every reader's cursor can be deleted (compact)."""
+        self.base_path = os.path.abspath(base_path)
+        self.directory = os.path.dirname(self.base_path)
+        self.prefix = os.path.basename(self.base_path) + "."
+        self.segment_bytes = segment_bytes
+        self._head = None
+
+    ## === SEGMENTS === ##
+
+    def segment_path(self, seq):
+        return f"{self.base_path}.{seq:08d}"
+
+    def is_segment(self, name):
+        return name.startswith(self.prefix) and name[len(self.prefix):].isdigit()
+
+    def segments(self):
+        """Returns the sequence numbers of the existing segments, in order."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[len(self.prefix):]) for name in names if self.is_segment(name))
+
+    @contextmanager
+    def _locked(self):
+        """Serialises writers, rollover and compaction across processes."""
+        with open(self.base_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    ## === WRITING === ##
+
+    def append(self, line):
+        """Appends one line to the head segment, starting a new segment when it is full.
+
+        Returns the (segment, offset) a reader's cursor reaches once it has read the line."""
+        data = (line.rstrip("\n") + "\n").encode("utf-8")
+        with self._locked():
+            seq = self._head
+            try:
+                if seq is None or os.path.getsize(self.segment_path(seq)) >= self.segment_bytes:
+                    raise FileNotFoundError
+            except FileNotFoundError:
+                # Cached head is unknown, full, or was removed by a reset
+                seqs = self.segments()
+                seq = seqs[-1] if seqs else 0
+                if seqs and os.path.getsize(self.segment_path(seq)) >= self.segment_bytes:
+                    seq += 1
+            with open(self.segment_path(seq), "ab") as segment:
+                segment.write(data)
+                offset = segment.tell()
+            self._head = seq
+        return (seq, offset)
+
+    ## === MAINTENANCE === ##
+
+    def compact(self, seq):
+        """Deletes every segment before seq. Returns how many were removed."""
+        removed = 0
+        with self._locked():
+            for old in self.segments():
+                if old >= seq:
+                    break
+                try:
+                    os.remove(self.segment_path(old))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def reset(self):
+        """Deletes every segment, e.g. when the system starts, leaving an empty head segment.
+
+        Numbering continues after the highest deleted segment instead of restarting at
+        0, so a (segment, offset) cursor saved before the reset can never point into a
+        new segment; the reader just moves on to the new head."""
+        with self._locked():
+            seqs = self.segments()
+            for seq in seqs:
+                try:
+                    os.remove(self.segment_path(seq))
+                except FileNotFoundError:
+                    pass
+            head = seqs[-1] + 1 if seqs else 0
+            open(self.segment_path(head), "ab").close()
+            self._head = head
+
+
+class SegmentReader:
+    def __init__(self, log, cursor=None, poll_interval=0.1, use_inotify=True):
+        """Reads lines from a SegmentedLog, tracking a (segment, offset) cursor.
+
+        The cursor can be saved and passed back in by short-lived readers. ack() tells
+        the log that everything before the cursor's segment is consumed and may be
+        deleted. read_lines() never blocks; wait() and fileno() let callers and
+        event loops sleep until the log's directory changes."""
+        self.log = log
+        self.poll_interval = poll_interval
+        self._seq, self._offset = cursor if cursor else (None, 0)
+        self._acked = None
+        self._file = None
+        self._file_seq = None
+        self._inode = None
+        self._watcher = DirectoryWatcher(log.directory, log.is_segment, poll_interval, use_inotify)
+
+    @property
+    def cursor(self):
+        """(segment, byte offset) just after the last complete line returned."""
+        return (self._seq, self._offset)
+
+    def _open(self, seq):
+        """Opens segment seq, returning False if it no longer exists."""
+        self._close_file()
+        try:
+            self._file = open(self.log.segment_path(seq), "rb")
+        except FileNotFoundError:
+            return False
+        self._file_seq = seq
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        return True
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._file_seq = None
+
+    def _realign(self, seqs):
+        """Moves the cursor onto an existing segment after a reset or external compaction."""
+        if self._seq is None or self._seq > seqs[-1] or self._seq < seqs[0]:
+            self._seq, self._offset = seqs[0], 0
+        elif self._seq not in seqs:
+            self._seq, self._offset = next(seq for seq in seqs if seq > self._seq), 0
+
+    def read_lines(self, limit=None, max_bytes=None):
+        """Returns new complete lines without blocking, at most limit of them if given.
+
+        max_bytes caps the total size of the lines returned; the first line is always
+        returned so an oversized line cannot stall the reader."""
+        lines = []
+        used = 0
+        full = False
+        while not full and (limit is None or len(lines) < limit):
+            seqs = self.log.segments()
+            if not seqs:
+                self._close_file()
+                return lines
+            self._realign(seqs)
+            newer_exists = seqs[-1] > self._seq  # Checked before reading: the segment is then final
+
+            if self._file_seq != self._seq and not self._open(self._seq):
+                continue  # Removed between listing and opening
+            try:
+                if os.stat(self.log.segment_path(self._seq)).st_ino != self._inode:
+                    self._open(self._seq)  # Same number, new file: the log was reset
+                    self._offset = 0
+            except FileNotFoundError:
+                pass
+            if os.fstat(self._file.fileno()).st_size < self._offset:
+                self._offset = 0  # Truncated underneath us
+
+            self._file.seek(self._offset)
+            data = self._file.read()
+            end = data.rfind(b"\n") + 1  # Only consume complete lines
+            chunk = data[:end].split(b"\n")[:-1]
+            if limit is not None and len(lines) + len(chunk) > limit:
+                chunk = chunk[:limit - len(lines)]
+                end = sum(len(line) + 1 for line in chunk)
+            if max_bytes is not None:
+                for index, line in enumerate(chunk):
+                    if (lines or index) and used + len(line) + 1 > max_bytes:
+                        chunk, full = chunk[:index], True
+                        end = sum(len(line) + 1 for line in chunk)
+                        break
+                    used += len(line) + 1
+            self._offset += end
+            lines.extend(line.decode("utf-8", errors="replace") for line in chunk)
+
+            if newer_exists and end == len(data) and not full and (limit is None or len(lines) < limit):
+                self._seq, self._offset = self._seq + 1, 0
+                continue
+            break
+        return lines
+
+    def ack(self):
+        """Lets the log delete every segment before the cursor's segment."""
+        if self._seq is not None and self._seq != self._acked:
+            self.log.compact(self._seq)
+            self._acked = self._seq
+
+    ## === WAITING === ##
+
+    def fileno(self):
+        return self._watcher.fileno()
+
+    def wait(self, timeout=None):
+        return self._watcher.wait(timeout)
+
+    def follow_batches(self):
+        """Yields every batch of newly appended lines, sleeping while nothing is written."""
+        while True:
+            lines = self.read_lines()
+            if not lines:
+                self.wait(timeout=1)  # Periodic wake-up guards against missed events
+                continue
+            yield lines
+
+    def close(self):
+        self._close_file()
+        self._watcher.close()
@@ -0,0 +1,55 @@
+import time
+
+GRACE_SECONDS = 2.0  # Time protocols get to exit after SIGTERM
+KILL_SECONDS = 1.0  # Time to reap protocols after SIGKILL
+POLL_INTERVAL = 0.01  # Longest sleep between reaping rounds
+
+
+def stop_processes(processes, grace=GRACE_SECONDS, kill_timeout=KILL_SECONDS):
+    """Stops many Popen-like processes concurrently under one deadline.
+
+    Every running process is sent SIGTERM at once and all are reaped together for up
+    to grace seconds; whatever is still running then gets SIGKILL in one batch.
+    The whole call takes at most grace + kill_timeout seconds however many
+    processes there are. Returns {"exited", "terminated", "killed", "stuck"} lists."""
+    report = {"exited": [], "terminated": [], "killed": [], "stuck": []}
+    running = []
+    for process in processes:
+        if process.poll() is None:
+            running.append(process)
+        else:
+            report["exited"].append(process)
+
+    for process in running:
+        process.terminate()
+    running = _reap(running, time.monotonic() + grace, report["terminated"])
+
+    for process in running:
+        process.kill()
+    report["stuck"] = _reap(running, time.monotonic() + kill_timeout, report["killed"])
+    return report
+
+def _reap(running, deadline, reaped):
+    """Polls until every process exited or the deadline passed. Returns the ones still running."""
+    interval = 0.001
+    while running:
+        still_running = []
+        for process in running:
+            (reaped if process.poll() is not None else still_running).append(process)
+        running = still_running
+        remaining = deadline - time.monotonic()
+        if not running or remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, POLL_INTERVAL)
+    return running
+
+def join_threads(threads, deadline):
+    """Joins threads until the shared monotonic deadline. Returns the threads still alive."""
+    alive = []
+    for thread in threads:
+        if thread is not None and thread.is_alive():
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                alive.append(thread)
+    return alive
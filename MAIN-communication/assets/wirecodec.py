@@ -0,0 +1,154 @@
+import json
+
+from assets.message import Message, dumps as json_dumps
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HELLO = b"JRV1-HELLO"  # [HELLO, b"codec,codec,..."]: sent by a protocol right after connecting
+CHOSEN = b"JRV1-CODEC"  # [CHOSEN, b"codec"]: MAIN_COMMUNICATION's answer
+RAW_SUFFIX = b"+raw"  # Tag suffix meaning the payload frame is the input bytes themselves
+ZERO_COPY_BYTES = 64 * 1024  # Payload frames above this are handed to zmq without copying
+
+
+class JsonCodec:
+    name = b"json"
+
+    @staticmethod
+    def dumps(value):
+        return json_dumps(value).encode("utf-8")
+
+    @staticmethod
+    def loads(buffer):
+        return json.loads(bytes(buffer))
+
+
+class MsgpackCodec:
+    name = b"msgpack"
+
+    @staticmethod
+    def dumps(value):
+        return msgpack.packb(value, use_bin_type=True)
+
+    @staticmethod
+    def loads(buffer):
+        return msgpack.unpackb(buffer, raw=False)
+
+
+# Preferred first; msgpack is optional and only offered when it is installed
+CODECS = {codec.name: codec for codec in ([MsgpackCodec] if msgpack is not None else []) + [JsonCodec]}
+
+
+## === NEGOTIATION === ##
+
+def offer():
+    """Frames a protocol sends to offer the codecs it supports."""
+    return [HELLO, b",".join(CODECS)]
+
+def choose(offered):
+    """Picks our most preferred codec among the offered names. JSON is always acceptable."""
+    names = set(bytes(offered).split(b","))
+    return next((codec for name, codec in CODECS.items() if name in names), JsonCodec)
+
+def answer(frames):
+    """MAIN_COMMUNICATION side: returns (codec, reply frames) for a HELLO."""
+    codec = choose(frames[1])
+    return codec, [CHOSEN, codec.name]
+
+def negotiate(socket, timeout=5.0):
+    """Protocol side: offers our codecs and returns the one MAIN_COMMUNICATION picked.
+
+    Returns None if MAIN_COMMUNICATION does not answer in time (an older build), in
+    which case messages are sent as plain JSON strings."""
+    socket.send_multipart(offer())
+    if not socket.poll(int(timeout * 1000)):
+        return None
+    return _chosen(socket.recv_multipart())
+
+async def negotiate_async(socket, timeout=5.0):
+    """negotiate() for a zmq.asyncio socket."""
+    await socket.send_multipart(offer())
+    if not await socket.poll(int(timeout * 1000)):
+        return None
+    return _chosen(await socket.recv_multipart())
+
+def _chosen(frames):
+    if len(frames) == 2 and frames[0] == CHOSEN and bytes(frames[1]) in CODECS:
+        return CODECS[bytes(frames[1])]
+    return None
+
+
+## === FRAMING === ##
+
+def encode(message, codec=None):
+    """Encodes a Message or dict as [tag, header, payload] frames, or one JSON string frame if codec is None.
+
+    The header carries every field except input, so receivers that only route the
+    message never decode the payload frame. A decoded Message whose input was not
+    reassigned re-sends its received payload frame when codec matches. bytes-like
+    input travels as the payload frame itself, without base64 or a copy; a JSON
+    string frame base64-encodes it."""
+    if codec is None:
+        return [(message.to_wire() if isinstance(message, Message) else json_dumps(message)).encode("utf-8")]
+
+    if isinstance(message, Message):
+        frame = message.payload_frame(codec)
+        if frame is not None:
+            fields = {key: message[key] for key in message.keys() if key != "input"}
+            return [codec.name, codec.dumps(fields), frame]
+        fields = message.to_dict()
+    else:
+        fields = dict(message)
+    payload = fields.pop("input", None)
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return [codec.name + RAW_SUFFIX, codec.dumps(fields), payload]
+    return [codec.name, codec.dumps(fields), codec.dumps(payload)]
+
+def decode(frames):
+    """Decodes frames from encode() (or a legacy single JSON string frame) into a Message.
+
+    Only the header is decoded here; input is decoded when it is first read. Raises
+    ValueError for malformed frames, an unknown codec or an undecodable header (and
+    reading input raises ValueError if the payload frame is undecodable)."""
+    frames = [getattr(frame, "buffer", frame) for frame in frames]  # zmq.Frame exposes its bytes as .buffer
+    if len(frames) == 1:
+        return Message.from_wire(frames[0])
+    if len(frames) != 3:
+        raise ValueError(f"Expected 1 or 3 frames, got {len(frames)}")
+
+    tag, header, payload = frames
+    name, raw, _ = bytes(tag).partition(RAW_SUFFIX)
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown codec {name!r}")
+    try:
+        fields = codec.loads(header)
+    except Exception as e:
+        raise ValueError(f"Undecodable {name.decode(errors='replace')} frames: {e}") from e
+    if not isinstance(fields, dict):
+        raise ValueError("Message header is not a map")
+    if raw:
+        fields["input"] = payload
+        return Message.from_dict(fields)
+    return Message.from_frames(fields, codec, payload)
+
+def send(socket, message, codec=None):
+    """Sends a message on a zmq socket with encode()."""
+    frames = encode(message, codec)
+    copy = not any(len(frame) > ZERO_COPY_BYTES for frame in frames)
+    socket.send_multipart(frames, copy=copy)
+
+def recv(socket):
+    """Receives one message, or None for a stray handshake frame set."""
+    frames = socket.recv_multipart(copy=False)
+    if is_handshake(frames):
+        return None
+    return decode(frames)
+
+def is_hello(frames):
+    return len(frames) == 2 and bytes(frames[0]) == HELLO
+
+def is_handshake(frames):
+    return len(frames) == 2 and bytes(frames[0]) in (HELLO, CHOSEN)
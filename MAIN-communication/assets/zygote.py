@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import atexit
+import signal
+import select
+import socket
+import selectors
+import subprocess
+import importlib
+import traceback
+
+# Modules every protocol imports; loaded once in the zygote so forked workers start warm
+DEFAULT_PRELOAD = ["json", "time", "threading", "random", "hashlib", "zmq",
+                   "assets.logger", "assets.message", "assets.wirecodec", "assets.correlation", "assets.protocol_runtime"]
+ASSETS_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Directory holding the assets package
+
+
+## === CLIENT SIDE (MAIN_COMMUNICATION) === ##
+
+def _recv_line(conn):
+    """Reads one newline-terminated reply, leaving any following line on the socket. Returns b"" on EOF."""
+    line = b""
+    while not line.endswith(b"\n"):
+        byte = conn.recv(1)
+        if not byte:
+            break
+        line += byte
+    return line
+
+
+class ZygoteProcess:
+    def __init__(self, pid, args, conn, stdin_fd):
+        """Popen-like handle for a protocol forked by the zygote.
+
+        The zygote reports the exit code over conn, so poll() and wait() work even
+        though the process is not our own child."""
+        self.pid = pid
+        self.args = args
+        self.returncode = None
+        self.stdin = os.fdopen(stdin_fd, "w")
+        self._conn = conn
+
+    def _read_exit(self, timeout):
+        readable, _, _ = select.select([self._conn], [], [], timeout)
+        if not readable:
+            return False
+        data = _recv_line(self._conn)
+        # An empty read means the zygote itself went away; the exit code is then unknown
+        self.returncode = int(data.split()[1]) if data.startswith(b"exit ") else -1
+        self._conn.close()
+        return True
+
+    def poll(self):
+        if self.returncode is None:
+            self._read_exit(0)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is None and not self._read_exit(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ZygoteClient:
+    def __init__(self, python_interpreter, socket_path, idle_workers=2, preload=None):
+        """Starts a zygote process and spawns protocols through it."""
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.process = subprocess.Popen(
+            [python_interpreter, os.path.abspath(__file__), socket_path, str(idle_workers), *(preload or DEFAULT_PRELOAD)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def wait_ready(self, timeout=10):
+        """Blocks until the zygote accepts connections. Returns False if it did not start in time."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                return False
+            if os.path.exists(self.socket_path):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def spawn(self, script_path):
+        """Runs script_path as __main__ in a pre-warmed worker. Returns a ZygoteProcess."""
+        read_fd, write_fd = os.pipe()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+            request = json.dumps({"script": os.path.abspath(script_path), "cwd": os.getcwd()}).encode()
+            socket.send_fds(conn, [request], [read_fd])
+            reply = _recv_line(conn)  # A quick "exit N" may follow on the same socket
+        except OSError:
+            conn.close()
+            os.close(write_fd)
+            raise
+        finally:
+            os.close(read_fd)
+
+        if not reply.startswith(b"pid "):
+            conn.close()
+            os.close(write_fd)
+            raise RuntimeError(f"Zygote failed to spawn {script_path}: {reply!r}")
+        return ZygoteProcess(int(reply.split()[1]), [script_path], conn, write_fd)
+
+    def close(self):
+        """Stops the zygote. Protocols it already spawned keep running."""
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+## === ZYGOTE SIDE === ##
+
+def _run_worker(control):
+    """Body of a forked worker: waits for a script assignment, then runs it as __main__."""
+    import runpy
+
+    payload, fds, _, _ = socket.recv_fds(control, 65536, 1)
+    control.close()
+    if not payload:
+        os._exit(0)  # The zygote shut down before using this worker
+    request = json.loads(payload)
+
+    # Make the pipe from MAIN_COMMUNICATION our stdin, as Popen would
+    os.dup2(fds[0], 0)
+    os.close(fds[0])
+    sys.stdin = open(0, "r", closefd=False)
+
+    script = request["script"]
+    os.chdir(request["cwd"])
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(script))
+    runtime = sys.modules.get("assets.protocol_runtime")
+    if runtime is not None:
+        runtime.RUNTIME_STARTED = time.perf_counter()  # The startup report counts from the fork, not the preload
+
+    code = 0
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        atexit._run_exitfuncs()  # Flush buffered logs as a normal interpreter exit would
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(code)
+
+
+class Zygote:
+    def __init__(self, socket_path, idle_workers):
+        """Pre-imported parent process that forks protocol workers on demand."""
+        self.socket_path = socket_path
+        self.idle_workers = idle_workers
+        self.idle = []  # [(pid, control_socket)]
+        self.waiting = {}  # {pid: client connection waiting for the exit code}
+        self.selector = selectors.DefaultSelector()
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socket_path + ".tmp")
+        self.listener.listen(64)
+        os.rename(socket_path + ".tmp", socket_path)  # Appear only once ready to accept
+
+        # SIGCHLD wakes the selector through a self-pipe so exits are reaped promptly
+        self.wake_read, self.wake_write = os.pipe()
+        os.set_blocking(self.wake_write, False)
+        signal.set_wakeup_fd(self.wake_write)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        self.selector.register(self.listener, selectors.EVENT_READ, self.accept)
+        self.selector.register(self.wake_read, selectors.EVENT_READ, self.reap)
+
+    def fork_worker(self):
+        parent_end, child_end = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            # Child: drop everything that belongs to the zygote
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self.selector.close()
+            self.listener.close()
+            os.close(self.wake_read)
+            os.close(self.wake_write)
+            parent_end.close()
+            for _, control in self.idle:
+                control.close()
+            for conn in self.waiting.values():
+                conn.close()
+            _run_worker(child_end)
+        child_end.close()
+        return pid, parent_end
+
+    def replenish(self):
+        while len(self.idle) < self.idle_workers:
+            self.idle.append(self.fork_worker())
+
+    def accept(self):
+        conn, _ = self.listener.accept()
+        try:
+            payload, fds, _, _ = socket.recv_fds(conn, 65536, 1)
+            while True:
+                pid, control = self.idle.pop() if self.idle else self.fork_worker()
+                try:
+                    socket.send_fds(control, [payload], fds)
+                    break
+                except OSError:
+                    pass  # That idle worker died; try the next one
+                finally:
+                    control.close()
+            for fd in fds:
+                os.close(fd)
+            conn.sendall(f"pid {pid}\n".encode())
+            self.waiting[pid] = conn
+        except OSError as e:
+            conn.sendall(f"error {e}\n".encode())
+            conn.close()
+        self.replenish()
+
+    def reap(self):
+        os.read(self.wake_read, 4096)
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for idle_pid, control in self.idle:
+                if idle_pid == pid:
+                    control.close()
+            self.idle = [(idle_pid, control) for idle_pid, control in self.idle if idle_pid != pid]
+            conn = self.waiting.pop(pid, None)
+            if conn is not None:
+                try:
+                    conn.sendall(f"exit {os.waitstatus_to_exitcode(status)}\n".encode())
+                except OSError:
+                    pass
+                conn.close()
+
+    def serve(self):
+        self.replenish()
+        try:
+            while True:
+                for key, _ in self.selector.select():
+                    key.data()
+        finally:
+            for _, control in self.idle:
+                control.close()
+            os.unlink(self.socket_path)
+
+
+if __name__ == "__main__":
+    socket_path, idle_workers, *preload = sys.argv[1:]
+    sys.path.pop(0)  # Workers get the directory of their own script instead
+    # Protocols import the helpers as assets.X; preloading them under the same names lets workers reuse them
+    sys.path.append(ASSETS_PARENT)
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    Zygote(socket_path, int(idle_workers)).serve()
@@ -0,0 +1,154 @@
+import os
+import re
+import sys
+import json
+import queue
+import threading
+import subprocess
+
+import pytest
+
+ASSETS_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_PROTOCOL = os.path.join(os.path.dirname(ASSETS_PARENT), "Protocols", "Other-protocols", "template_protocol.py")
+MAIN_IDS = ("MAIN-communication/MAIN_COMMUNICATION.py", "Main-communication/MAIN_COMMUNICATION.py")
+
+# Tests import the shared helpers the way MAIN_COMMUNICATION does: from assets.X import ...
+sys.path.insert(0, ASSETS_PARENT)
+
+
+def write_protocol(path, functions=(), **constants):
+    """Writes a protocol made from template_protocol.py, as a protocol author would.
+
+    functions are the sources of the template functions to replace (e.g. a new main),
+    constants the module constants to change (e.g. USE_ASYNC_SDK=True)."""
+    with open(TEMPLATE_PROTOCOL) as file:
+        source = file.read()
+    for name, value in constants.items():
+        source, count = re.subn(rf"^{name} = .*$", f"{name} = {value!r}", source, flags=re.M)
+        assert count == 1, name
+    for function in functions:
+        name = re.search(r"def (\w+)", function).group(1)
+        source, count = re.subn(rf"^(?:async )?def {name}\(.*?(?=^\S)", function.strip() + "\n\n", source, flags=re.M | re.S)
+        assert count == 1, name
+    with open(path, "w") as file:
+        file.write(source)
+
+
+class FakeMain:
+    def __init__(self, directory):
+        """Stand-in for MAIN_COMMUNICATION: runs protocol scripts and routes their messages by receiver.
+
+        Answers the codec handshake, "Protocol loaded", initialize_subprocess and
+        deactivate_subprocess as MAIN_COMMUNICATION does. Every other message addressed
+        to MAIN lands in received. One thread owns all the sockets; other threads hand
+        it work through a queue."""
+        import zmq
+        from assets import wirecodec
+        self._zmq = zmq
+        self._wirecodec = wirecodec
+        self.directory = directory
+        self.context = zmq.Context()
+        self.pipes = {}  # {subprotocolID: zmq PAIR socket}
+        self.codecs = {}  # {subprotocolID: codec agreed in the handshake}
+        self.processes = {}  # {subprotocolID: Popen}
+        self.loaded = {}  # {subprotocolID: threading.Event}
+        self.waiting = {}  # {subprotocolID: initialize_subprocess request, answered once it has loaded}
+        self.received = queue.Queue()
+        self._calls = queue.Queue()
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    ## === API === ##
+
+    def start(self, script_path, subprotocolID, timeout=30):
+        """Starts a protocol whose mother is MAIN and waits until it has loaded."""
+        self.loaded[subprotocolID] = threading.Event()
+        self._calls.put(lambda: self._spawn(script_path, subprotocolID, {"mother_protocolID": MAIN_IDS[1], "main_protocolID": subprotocolID}))
+        assert self.loaded[subprotocolID].wait(timeout), f"{subprotocolID} did not load"
+
+    def send(self, message):
+        self._calls.put(lambda: self._route(message))
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        for subprotocolID in list(self.pipes):
+            self._stop(subprotocolID)
+        self.context.term()
+
+    ## === ROUTING THREAD === ##
+
+    def _spawn(self, script_path, subprotocolID, protocol_info):
+        ipc_path = subprotocolID.replace("subprocess_", "").replace(".py", "") + ".ipc"
+        pipe = self.context.socket(self._zmq.PAIR)
+        pipe.bind("ipc://" + os.path.join(self.directory, ipc_path))
+        process = subprocess.Popen(
+            [sys.executable, script_path], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            cwd=self.directory, env={**os.environ, "PYTHONPATH": ASSETS_PARENT}, text=True)
+        process.stdin.write(json.dumps({subprotocolID: {"subprocess_path": script_path, **protocol_info, "other_info": {}}}) + "\n")
+        process.stdin.close()
+        self.pipes[subprotocolID] = pipe
+        self.processes[subprotocolID] = process
+        self.loaded.setdefault(subprotocolID, threading.Event())
+
+    def _stop(self, subprotocolID):
+        self.pipes.pop(subprotocolID).close(linger=0)
+        self.codecs.pop(subprotocolID, None)
+        process = self.processes.pop(subprotocolID)
+        process.terminate()
+        try:
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def _route(self, message):
+        from assets.message import Message
+        message = Message.coerce(message)
+        receiver = message.get("receiver")
+        if receiver in MAIN_IDS:
+            self._handle_for_main(message)
+        elif receiver in self.pipes:
+            self._wirecodec.send(self.pipes[receiver], message, self.codecs.get(receiver))
+
+    def _handle_for_main(self, message):
+        command = message.get("request") or message.get("action")
+        if command == "initialize_subprocess":
+            self._spawn(**message["input"])
+            self.waiting[message["input"]["subprotocolID"]] = message
+        elif command == "deactivate_subprocess":
+            self._stop(message["input"]["subprotocolID"])
+            self._route(message.respond())
+        elif message.get("response") == "Protocol loaded":
+            self.loaded[message.get("sender")].set()
+            request = self.waiting.pop(message.get("sender"), None)
+            if request is not None:
+                self._route(request.respond())
+        else:
+            self.received.put(message)
+
+    def _serve(self):
+        while self._running:
+            while not self._calls.empty():
+                self._calls.get()()
+            poller = self._zmq.Poller()
+            for pipe in self.pipes.values():
+                poller.register(pipe, self._zmq.POLLIN)
+            ready = dict(poller.poll(20))
+            for subprotocolID, pipe in list(self.pipes.items()):
+                if pipe not in ready:
+                    continue
+                frames = pipe.recv_multipart(copy=False)
+                if self._wirecodec.is_hello(frames):
+                    self.codecs[subprotocolID], reply = self._wirecodec.answer(frames)
+                    pipe.send_multipart(reply)
+                else:
+                    self._route(self._wirecodec.decode(frames))
+
+
+@pytest.fixture
+def fake_main(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Protocols bind their relative ipc paths here
+    main = FakeMain(str(tmp_path))
+    yield main
+    main.close()
@@ -0,0 +1,38 @@
+from assets.codec import LineDecoder
+
+
+def test_decode_batch_pairs_each_line_with_its_own_message():
+    lines = ['{"a":1}', '  {"b": [1, 2]}  ', '', '{"c": "x"}']
+    results = LineDecoder().decode_batch(lines)
+    assert [(line, message) for line, message, _ in results] == [
+        ('{"a":1}', {"a": 1}),
+        ('{"b": [1, 2]}', {"b": [1, 2]}),
+        ('{"c": "x"}', {"c": "x"}),
+    ]
+
+
+def test_decode_batch_does_not_mispair_malformed_lines():
+    lines = ['{"a":1},{"b":2}', '[{"c":3}', '{"d":4}]', '{"e":5}']
+    decoder = LineDecoder()
+    results = decoder.decode_batch(lines)
+    assert [line for line, _, _ in results] == lines
+    assert results[1][2] is not None and results[2][2] is not None  # Both halves of the split array fail
+    assert results[3] == ('{"e":5}', {"e": 5}, None)
+    assert not isinstance(results[0][1], dict)  # Two objects on one line are not a message
+    assert decoder.stats()["failures"] == 2
+
+
+def test_decode_batch_falls_back_to_literal_eval_for_legacy_lines():
+    decoder = LineDecoder()
+    results = decoder.decode_batch(["{'receiver': 'tab_1', 'ok': True}"])
+    assert results == [("{'receiver': 'tab_1', 'ok': True}", {"receiver": "tab_1", "ok": True}, None)]
+    assert decoder.stats() == {"decoded": 1, "fallbacks": 1, "failures": 0}
+
+
+def test_decode_batch_keeps_the_good_lines_around_a_line_that_crashes_literal_eval():
+    lines = ['{"a": 1}', '{[1]: 2}', "[" * 100000, '{"b": 2}']
+    decoder = LineDecoder()
+    results = decoder.decode_batch(lines)
+    assert [message for _, message, _ in results] == [{"a": 1}, None, None, {"b": 2}]
+    assert isinstance(results[1][2], TypeError)
+    assert decoder.stats() == {"decoded": 2, "fallbacks": 0, "failures": 2}
@@ -0,0 +1,68 @@
+import time
+import queue
+import threading
+
+import pytest
+
+from assets import dispatcher as dispatcher_module
+from assets.dispatcher import MessageDispatcher
+
+
+def command(request, subprotocolID, seconds=0):
+    return {"request": request, "receiver": "MAIN", "input": {"subprotocolID": subprotocolID, "seconds": seconds}}
+
+
+def subprotocol(message):
+    return message["input"]["subprotocolID"]
+
+
+def test_blocking_commands_for_one_key_run_in_order_and_other_keys_run_alongside():
+    handled = []
+
+    def handle(message):
+        time.sleep(message["input"]["seconds"])
+        handled.append((message["request"], subprotocol(message)))
+
+    dispatcher = MessageDispatcher(handle, pool_size=1, blocking=lambda message: True, blocking_key=subprotocol)
+    started = time.monotonic()
+    dispatcher.submit(command("activate", "a", seconds=0.3))
+    dispatcher.submit(command("deactivate", "a"))
+    dispatcher.submit(command("activate", "b", seconds=0.3))
+    dispatcher.join()
+
+    assert handled.index(("activate", "a")) < handled.index(("deactivate", "a"))
+    assert time.monotonic() - started < 0.55  # "a" and "b" did not wait for each other
+    dispatcher.shutdown()
+
+
+def test_a_full_blocking_queue_pushes_back_on_the_producer():
+    release = threading.Event()
+    dispatcher = MessageDispatcher(lambda message: release.wait(5), pool_size=1, queue_depth=1,
+                                   blocking=lambda message: True, blocking_key=subprotocol)
+    dispatcher.submit(command("activate", "a"))  # Taken by the worker
+    deadline = time.monotonic() + 5
+    while dispatcher.pending():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    dispatcher.submit(command("activate", "a"))  # Fills the queue
+
+    with pytest.raises(queue.Full):
+        dispatcher.submit(command("deactivate", "a"), timeout=0.1)
+    release.set()
+    dispatcher.shutdown()
+
+
+def test_idle_blocking_workers_exit(monkeypatch):
+    monkeypatch.setattr(dispatcher_module, "BLOCKING_IDLE_TIMEOUT", 0.05)
+    handled = []
+    dispatcher = MessageDispatcher(handled.append, pool_size=1, blocking=lambda message: True,
+                                   blocking_key=subprotocol, blocking_workers=1)
+
+    dispatcher.submit(command("activate", "a"))
+    dispatcher.join()
+    time.sleep(0.3)
+    dispatcher.submit(command("activate", "b"), timeout=1)  # Needs the only worker slot, freed by "a"
+    dispatcher.join()
+
+    assert [subprotocol(message) for message in handled] == ["a", "b"]
+    dispatcher.shutdown()
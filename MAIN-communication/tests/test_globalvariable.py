@@ -0,0 +1,93 @@
+import threading
+
+from assets.globalvariable import GlobalVariable
+
+
+def test_writes_through_get_reach_the_parent():
+    variable = GlobalVariable({"protocol": {"loaded": False, "pid": 1}})
+
+    variable.get("protocol")["loaded"] = True
+    variable.get("protocol").update({"pid": 2, "path": "a.py"})
+    assert variable.get("protocol").pop("path") == "a.py"
+    assert variable.get("protocol").setdefault("pid", 3) == 2
+
+    assert variable["protocol"] == {"loaded": True, "pid": 2}
+
+
+def test_nested_views_chain_and_stay_current():
+    variable = GlobalVariable({"a": {"b": {"c": 1}}})
+    view = variable.get("a").get("b")
+
+    view["d"] = 2
+    variable.set_path(["a", "b", "c"], 3)
+
+    assert view.copy() == {"c": 3, "d": 2}
+    assert variable.get_path(["a", "b"]) == {"c": 3, "d": 2}
+    assert sorted(view) == ["c", "d"] and len(view) == 2 and "d" in view
+
+
+def test_get_of_a_missing_key_creates_it_on_first_write():
+    variable = GlobalVariable({})
+
+    assert len(variable.get("missing")) == 0
+    assert variable.get("missing").pop("x", "default") == "default"
+    assert "missing" not in variable  # Reads and no-op pops create nothing
+
+    variable.get("missing")["x"] = 1
+    variable.get("other", {}).get("deeper")["y"] = 2
+
+    assert variable.snapshot() == {"missing": {"x": 1}, "other": {"deeper": {"y": 2}}}
+
+
+def test_snapshots_taken_before_a_nested_write_keep_their_values():
+    variable = GlobalVariable({"a": {"x": 1}})
+    before = variable.snapshot()
+    view = variable.view()
+
+    variable.get("a")["x"] = 2
+
+    assert before == {"a": {"x": 1}}
+    assert view["a"] == {"x": 1}
+
+
+def test_writes_inside_a_transaction_do_not_deadlock():
+    variable = GlobalVariable({"a": {"x": 1}})
+    seen = {}
+
+    def run():
+        with variable.transaction() as batch:
+            batch["y"] = 1
+            variable["z"] = 1
+            variable.set_path(["a", "x"], 2)
+            variable.get("a")["w"] = 3
+            seen["inside"] = variable["y"]
+            with variable.transaction() as nested:
+                nested["n"] = 1
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert seen["inside"] is None  # Batched writes are published when the block ends
+    assert variable.snapshot() == {"a": {"x": 2, "w": 3}, "y": 1, "z": 1, "n": 1}
+
+
+def test_other_threads_wait_for_the_transaction():
+    variable = GlobalVariable({})
+    entered, done = threading.Event(), threading.Event()
+
+    def write():
+        entered.wait(5)
+        variable["key"] = "other thread"
+        done.set()
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    with variable.transaction() as batch:
+        entered.set()
+        assert not done.wait(0.2)
+        batch["key"] = "transaction"
+    thread.join(5)
+
+    assert variable["key"] == "other thread"
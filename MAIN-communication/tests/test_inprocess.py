@@ -0,0 +1,33 @@
+import time
+
+from assets.inprocess import InProcessChannel, InProcessProtocol
+
+BLOCKING_PROTOCOL = '''
+import threading
+from assets.protocol_runtime import ProtocolRuntime
+
+runtime = ProtocolRuntime(__file__)
+started = threading.Event()
+release = threading.Event()
+
+def handle_main_message(message):
+    started.set()
+    release.wait()
+'''
+
+
+def test_killed_protocol_is_reported_running_until_its_thread_stops(tmp_path):
+    script = tmp_path / "blocking.py"
+    script.write_text(BLOCKING_PROTOCOL)
+    channel = InProcessChannel()
+    process = InProcessProtocol(str(script), "subprocess_blocking.py_1", channel)
+    process.start({"subprocess_blocking.py_1": {"mother_protocolID": None, "main_protocolID": None}})
+    channel.send({"request": "start"})
+    assert process.module.started.wait(5)
+
+    process.kill()
+    time.sleep(0.05)
+    assert process.poll() is None  # Still inside handle_main_message
+
+    process.module.release.set()
+    assert process.wait(5) == 0
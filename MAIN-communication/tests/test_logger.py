@@ -0,0 +1,36 @@
+import time
+
+from assets import logger as logging_module
+from assets.logger import Logger, get_logger
+
+
+class BadRepr:
+    def __repr__(self):
+        raise RuntimeError("repr failed")
+
+
+def test_a_record_that_cannot_be_formatted_does_not_stop_the_writer(tmp_path):
+    logger = get_logger(str(tmp_path / "bad.log"))
+    logger.info("bad %r", BadRepr())
+    logger.info("after %s", "bad")
+
+    path = tmp_path / "bad.log"
+    deadline = time.monotonic() + 5
+    while not (path.exists() and "after bad" in path.read_text()):
+        assert time.monotonic() < deadline, "the writer thread stopped writing"
+        time.sleep(0.05)
+
+    lines = path.read_text().splitlines()
+    assert lines[0].endswith("<unformattable record: RuntimeError>")
+    assert logging_module._writer.is_alive()
+
+
+def test_a_full_queue_drops_the_oldest_records_and_says_so(tmp_path):
+    logger = Logger(str(tmp_path / "full.log"), max_queued=2)
+    for n in range(5):
+        logger.info("record %d", n)
+    logger.close()
+
+    lines = (tmp_path / "full.log").read_text().splitlines()
+    assert lines[0].endswith("WARNING - 3 records dropped: the log queue was full")
+    assert [line.rsplit(" - ", 1)[1] for line in lines[1:]] == ["record 3", "record 4"]
@@ -0,0 +1,36 @@
+import io
+import json
+
+from assets.nativemessaging import HEADER, FrameWriter
+
+
+def frames(stream):
+    data = stream.getvalue()
+    messages = []
+    while data:
+        length = HEADER.unpack_from(data)[0]
+        messages.append(json.loads(data[HEADER.size:HEADER.size + length]))
+        data = data[HEADER.size + length:]
+    return messages
+
+
+def test_batch_is_cut_to_the_messages_that_fit_one_frame():
+    stream = io.BytesIO()
+    writer = FrameWriter(stream, max_bytes=200)
+    batch = [{"n": n, "pad": "x" * 40} for n in range(6)]
+
+    sent = writer.write_batch(batch)
+
+    assert 0 < sent < len(batch)
+    assert frames(stream) == [{"messages": batch[:sent]}]
+    assert len(stream.getvalue()) - HEADER.size <= 200
+
+
+def test_batch_whose_first_message_is_too_large_writes_nothing():
+    stream = io.BytesIO()
+    writer = FrameWriter(stream, max_bytes=50)
+
+    assert writer.write_batch([{"pad": "x" * 100}, {"n": 1}]) == 0
+    assert stream.getvalue() == b""
+    assert writer.write_batch([]) == 0
+    assert frames(stream) == [{"messages": []}]
@@ -0,0 +1,21 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import TEMPLATE_PROTOCOL
+
+PROTOCOLS_DIR = os.path.dirname(os.path.dirname(TEMPLATE_PROTOCOL))
+
+
+@pytest.mark.parametrize("script", [
+    "Google-Protocols/Mia-protocols/sound_activation.py",
+    "Google-Protocols/Jarvis-initialize-protocols/initialize_jarvis.py",
+    "Protocol-analysis-protocols/map_protocols.py",
+    "Protocol-analysis-protocols/get_related_protocols.py",
+    "Other-protocols/template_protocol.py",
+])
+def test_protocol_reports_loaded_when_run_as_a_subprocess(tmp_path, fake_main, script):
+    # A copy, so the protocol writes its log into tmp_path
+    copy = shutil.copy(os.path.join(PROTOCOLS_DIR, script), tmp_path)
+    fake_main.start(copy, f"subprocess_{os.path.basename(copy)}_1", timeout=20)
@@ -0,0 +1,58 @@
+from assets.protocolregistry import ProtocolRegistry
+
+
+def protocol(mother_protocolID):
+    return {"mother_protocolID": mother_protocolID, "main_protocolID": "root", "loaded": False}
+
+
+def test_storing_an_entry_again_moves_it_to_its_new_mother():
+    registry = ProtocolRegistry()
+    registry["child"] = protocol("a")
+
+    registry["child"] = protocol("b")
+
+    assert registry.children("a") == []
+    assert registry.children("b") == ["child"]
+
+
+def test_pop_removes_the_entry_from_the_index():
+    registry = ProtocolRegistry()
+    registry["child"] = protocol("a")
+    registry["sibling"] = protocol("a")
+
+    assert registry.pop("child")["mother_protocolID"] == "a"
+    assert registry.pop("child", "gone") == "gone"
+
+    assert registry.children("a") == ["sibling"]
+
+
+def test_set_path_on_the_mother_field_moves_the_entry():
+    registry = ProtocolRegistry()
+    registry["child"] = protocol("a")
+
+    assert registry.set_path(["child", "loaded"], True)
+    assert registry.children("a") == ["child"]
+    assert registry.set_path(["child", "mother_protocolID"], "b")
+
+    assert registry.children("a") == []
+    assert registry.children("b") == ["child"]
+    assert not registry.set_path(["missing", "mother_protocolID"], "b")
+
+
+def test_subtree_lists_children_before_their_parents():
+    registry = ProtocolRegistry()
+    registry["root"] = protocol(None)
+    registry["a"] = protocol("root")
+    registry["b"] = protocol("root")
+    registry["a1"] = protocol("a")
+    registry["a2"] = protocol("a")
+    registry["a1x"] = protocol("a1")
+    registry["other"] = protocol(None)
+
+    order = registry.subtree("root")
+
+    assert sorted(order) == ["a", "a1", "a1x", "a2", "b", "root"]
+    for child, mother in (("a", "root"), ("b", "root"), ("a1", "a"), ("a2", "a"), ("a1x", "a1")):
+        assert order.index(child) < order.index(mother)
+    assert registry.subtree("a1") == ["a1x", "a1"]
+    assert registry.subtree("unregistered") == []
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import subprocess
+
+from assets.ringbuffer import RingBuffer, RingFileReader
+from assets.segments import SegmentedLog, SegmentReader
+
+
+def test_overflow_to_the_file_bus_keeps_the_order(tmp_path):
+    ring = RingBuffer(str(tmp_path / "bus.ring"), capacity=1024, create=True)
+    bus = SegmentedLog(str(tmp_path / "bus.log"), segment_bytes=4096)
+    producer = RingBuffer(str(tmp_path / "bus.ring"))
+    source = RingFileReader(ring, SegmentReader(bus, use_inotify=False))
+
+    received = []
+    sent = 0
+    for burst in (3, 40, 1, 25, 0, 60, 2):
+        for _ in range(burst):
+            producer.send_or_append(json.dumps({"n": sent, "pad": "x" * (sent % 50)}), bus)
+            sent += 1
+        received += [json.loads(line)["n"] for line in source.read_lines(limit=7)]
+    while True:
+        lines = source.read_lines()
+        if not lines:
+            break
+        received += [json.loads(line)["n"] for line in lines]
+
+    assert received == list(range(sent))
+    assert not ring.file_pending()
+
+
+def test_ring_left_by_a_stopped_owner_is_detected_and_removed(tmp_path):
+    path = str(tmp_path / "stale.ring")
+    assets = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {assets!r}); from assets.ringbuffer import RingBuffer; RingBuffer({path!r}, create=True)"], check=True)
+
+    assert not RingBuffer(path).owner_alive()
+    assert RingBuffer(path, create=True).owner_alive()
+    RingBuffer.remove(path)
+    assert not os.listdir(tmp_path)
+
+
+def test_peeked_records_stay_until_consumed(tmp_path):
+    ring = RingBuffer(str(tmp_path / "peek.ring"), capacity=1024, create=True)
+    for n in range(3):
+        ring.send(f"record {n}".encode())
+
+    assert ring.read_lines(consume=False) == ["record 0", "record 1", "record 2"]
+    ring.consume(1)
+    assert ring.read_lines(consume=False) == ["record 1", "record 2"]
+    ring.consume(0)
+    assert ring.read_lines() == ["record 1", "record 2"]
+    assert ring.read_lines() == []
@@ -0,0 +1,70 @@
+from assets.segments import SegmentedLog, SegmentReader
+
+
+def reader(log, cursor=None):
+    return SegmentReader(log, cursor, use_inotify=False)
+
+
+def test_lines_are_read_in_order_across_segments(tmp_path):
+    log = SegmentedLog(str(tmp_path / "bus.log"), segment_bytes=64)
+    for n in range(20):
+        log.append(f"message {n}")
+
+    assert len(log.segments()) > 1
+    assert reader(log).read_lines() == [f"message {n}" for n in range(20)]
+
+
+def test_an_unterminated_line_is_left_for_the_next_read(tmp_path):
+    log = SegmentedLog(str(tmp_path / "bus.log"))
+    log.append("first")
+    with open(log.segment_path(log.segments()[-1]), "ab") as segment:
+        segment.write(b"sec")
+    bus = reader(log)
+
+    assert bus.read_lines() == ["first"]
+    with open(log.segment_path(log.segments()[-1]), "ab") as segment:
+        segment.write(b"ond\n")
+    assert bus.read_lines() == ["second"]
+
+
+def test_a_saved_cursor_resumes_after_the_last_line_read(tmp_path):
+    log = SegmentedLog(str(tmp_path / "bus.log"), segment_bytes=64)
+    for n in range(10):
+        log.append(f"message {n}")
+    first = reader(log)
+    assert first.read_lines(limit=4) == [f"message {n}" for n in range(4)]
+
+    for n in range(10, 12):
+        log.append(f"message {n}")
+
+    assert reader(log, first.cursor).read_lines() == [f"message {n}" for n in range(4, 12)]
+
+
+def test_ack_deletes_only_the_segments_before_the_cursor(tmp_path):
+    log = SegmentedLog(str(tmp_path / "bus.log"), segment_bytes=64)
+    for n in range(20):
+        log.append(f"message {n}")
+    bus = reader(log)
+    bus.read_lines(limit=10)
+    cursor_segment = bus.cursor[0]
+
+    bus.ack()
+
+    assert log.segments()[0] == cursor_segment
+    assert bus.read_lines() == [f"message {n}" for n in range(10, 20)]
+
+
+def test_a_cursor_saved_before_a_reset_moves_to_the_new_head(tmp_path):
+    log = SegmentedLog(str(tmp_path / "bus.log"))
+    for n in range(3):
+        log.append(f"old {n}")
+    bus = reader(log)
+    bus.read_lines(limit=1)
+    saved = bus.cursor
+
+    log.reset()
+    log.append("new")
+
+    assert log.segments() == [saved[0] + 1]  # Numbering continues, so the old cursor cannot match a new segment
+    assert reader(log, saved).read_lines() == ["new"]
+    assert bus.read_lines() == ["new"]
@@ -0,0 +1,46 @@
+import sys
+import time
+import threading
+import subprocess
+
+from assets.teardown import join_threads, stop_processes
+
+OBEYS_SIGTERM = "import time; time.sleep(60)"
+IGNORES_SIGTERM = "import signal, sys, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print('ready', flush=True); time.sleep(60)"
+
+
+def start(code):
+    return subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE)
+
+
+def test_stop_processes_terminates_then_kills_under_one_deadline():
+    exited = start("pass")
+    exited.wait()
+    obedient = [start(OBEYS_SIGTERM) for _ in range(3)]
+    stubborn = start(IGNORES_SIGTERM)
+    stubborn.stdout.readline()  # SIGTERM is ignored from here on
+
+    started = time.monotonic()
+    report = stop_processes([exited, *obedient, stubborn], grace=0.5, kill_timeout=2)
+    elapsed = time.monotonic() - started
+
+    assert report["exited"] == [exited]
+    assert sorted(process.pid for process in report["terminated"]) == sorted(process.pid for process in obedient)
+    assert report["killed"] == [stubborn] and report["stuck"] == []
+    assert 0.5 <= elapsed < 2.5  # The grace period once for everyone, not once per process
+    for process in (exited, *obedient, stubborn):
+        process.stdout.close()
+
+
+def test_join_threads_shares_one_deadline():
+    release = threading.Event()
+    threads = [threading.Thread(target=release.wait, daemon=True) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+
+    started = time.monotonic()
+    alive = join_threads([*threads, None], time.monotonic() + 0.2)
+
+    assert alive == threads
+    assert time.monotonic() - started < 0.5
+    release.set()
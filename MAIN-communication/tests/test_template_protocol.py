@@ -0,0 +1,90 @@
+from conftest import MAIN_IDS, write_protocol
+
+PARENT_MAIN = '''
+def main(input):
+    child = Subprotocol("Python file", input.get('child_path'))
+    response = child.execute_subprotocol(input.get('payload'))
+    return {"child": response.get('sender'), "output": response.get('input')}
+'''
+
+CHILD_MAIN = '''
+def main(input):
+    return {"echo": input}
+'''
+
+
+def test_execute_subprotocol_returns_the_child_output(tmp_path, fake_main):
+    write_protocol(tmp_path / "parent.py", [PARENT_MAIN])
+    write_protocol(tmp_path / "child.py", [CHILD_MAIN])
+    fake_main.start(str(tmp_path / "parent.py"), "subprocess_parent.py_1")
+
+    fake_main.send({
+        "request": "start",
+        "input": {"child_path": str(tmp_path / "child.py"), "payload": {"n": 1}},
+        "sender": MAIN_IDS[1],
+        "receiver": "subprocess_parent.py_1",
+        "messageID": "Main_1",
+        "other_info": {},
+    })
+    output = fake_main.received.get(timeout=30)
+
+    assert output["messageID"] == "Main_1"
+    assert output["input"]["output"] == {"echo": {"n": 1}}
+    assert output["input"]["child"].startswith(f"subprocess_{tmp_path / 'child.py'}_")
+    assert list(fake_main.processes) == ["subprocess_parent.py_1"]  # The child was deactivated
+
+
+ASYNC_PARENT_MAIN = '''
+async def main_async(client, input):
+    children = [AsyncSubprotocol(client, "Python file", input.get('child_path')) for _ in range(2)]
+    responses = await asyncio.gather(*(child.execute({"n": n}) for n, child in enumerate(children)))
+    return [response.get('input') for response in responses]
+'''
+
+ASYNC_CHILD_MAIN = '''
+async def main_async(client, input):
+    return {"echo": input}
+'''
+
+
+def test_async_subprotocols_return_the_child_outputs(tmp_path, fake_main):
+    write_protocol(tmp_path / "parent.py", [ASYNC_PARENT_MAIN], USE_ASYNC_SDK=True)
+    write_protocol(tmp_path / "child.py", [ASYNC_CHILD_MAIN], USE_ASYNC_SDK=True)
+    fake_main.start(str(tmp_path / "parent.py"), "subprocess_parent.py_1")
+
+    fake_main.send({
+        "request": "start",
+        "input": {"child_path": str(tmp_path / "child.py")},
+        "sender": MAIN_IDS[1],
+        "receiver": "subprocess_parent.py_1",
+        "messageID": "Main_1",
+        "other_info": {},
+    })
+    output = fake_main.received.get(timeout=30)
+
+    assert output["messageID"] == "Main_1"
+    assert output["input"] == [{"echo": {"n": 0}}, {"echo": {"n": 1}}]
+    assert list(fake_main.processes) == ["subprocess_parent.py_1"]
+
+
+SLOW_MAIN = '''
+def main(input):
+    time.sleep(input.get('seconds'))
+    return "done"
+'''
+
+
+def test_release_is_confirmed_only_after_running_requests_finish(tmp_path, fake_main):
+    write_protocol(tmp_path / "slow.py", [SLOW_MAIN])
+    fake_main.start(str(tmp_path / "slow.py"), "subprocess_slow.py_1")
+
+    def send(request, messageID, input=None):
+        fake_main.send({"request": request, "input": input, "sender": MAIN_IDS[1],
+                        "receiver": "subprocess_slow.py_1", "messageID": messageID, "other_info": {}})
+
+    send("start", "Main_1", {"seconds": 0.5})
+    send("release", "Main_2")
+    first, second = fake_main.received.get(timeout=10), fake_main.received.get(timeout=10)
+
+    assert (first["messageID"], first["input"]) == ("Main_1", "done")
+    assert (second["messageID"], second["response"]) == ("Main_2", "Protocol released")
@@ -0,0 +1,75 @@
+import json
+
+from assets import wirecodec
+from assets.message import BASE64_KEY, Message, to_wire
+
+
+def test_binary_input_reaches_json_only_peers_as_base64():
+    payload = bytes(range(256)) * 4
+    sent = Message(request="transcribe", input=memoryview(payload), sender="Protocols/a.py",
+                   receiver="Protocols/b.py", messageID="a_1", other_info={})
+
+    # A codec peer sends the input as a raw payload frame...
+    received = wirecodec.decode(wirecodec.encode(sent, wirecodec.JsonCodec))
+    assert bytes(received.input) == payload
+
+    # ...which MAIN forwards to a peer that only speaks JSON strings, and to the extension
+    frames = wirecodec.encode(received, None)
+    assert len(frames) == 1
+    assert wirecodec.decode(frames).input == payload
+    assert set(json.loads(to_wire(received))["input"]) == {BASE64_KEY}
+
+
+def test_unserialisable_input_still_raises_type_error():
+    try:
+        to_wire({"input": {1, 2}})
+    except TypeError as e:
+        assert "set" in str(e)
+    else:
+        raise AssertionError("expected TypeError")
+
+
+class CountingCodec(wirecodec.JsonCodec):
+    loaded = 0
+
+    @classmethod
+    def loads(cls, buffer):
+        cls.loaded += 1
+        return super().loads(buffer)
+
+
+def test_forwarding_resends_the_payload_frame_without_decoding_it(monkeypatch):
+    monkeypatch.setitem(wirecodec.CODECS, CountingCodec.name, CountingCodec)
+    sent = Message(request="start", input={"text": "x" * 1000}, sender="Protocols/a.py",
+                   receiver="Protocols/b.py", messageID="a_1", other_info={})
+    frames = wirecodec.encode(sent, CountingCodec)
+
+    received = wirecodec.decode(frames)
+    assert received.receiver == "Protocols/b.py" and "input" in received
+    forwarded = wirecodec.encode(received, CountingCodec)
+
+    assert CountingCodec.loaded == 1  # The header only
+    assert forwarded[2] is frames[2]
+    assert wirecodec.decode(forwarded).input == {"text": "x" * 1000}
+
+
+def test_reassigned_input_is_encoded_again():
+    sent = Message(request="start", input={"n": 1}, sender="a", receiver="b", messageID="a_1")
+    received = wirecodec.decode(wirecodec.encode(sent, wirecodec.JsonCodec))
+
+    received.input = {"n": 2}
+
+    assert wirecodec.decode(wirecodec.encode(received, wirecodec.JsonCodec)).input == {"n": 2}
+
+
+def test_an_undecodable_payload_fails_when_input_is_read():
+    frames = wirecodec.encode({"request": "start", "input": 1, "receiver": "b"}, wirecodec.JsonCodec)
+    received = wirecodec.decode([frames[0], frames[1], b"{not json"])
+
+    assert received.get("receiver") == "b"
+    try:
+        received.get("input")
+    except ValueError as e:
+        assert "json" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
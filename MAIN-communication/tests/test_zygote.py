@@ -0,0 +1,31 @@
+import sys
+import json
+import time
+
+from assets.zygote import ZygoteClient
+
+PROBE = '''
+import sys, json
+preloaded = {name: name in sys.modules for name in ("assets.protocol_runtime", "assets.wirecodec", "assets.message", "assets.logger")}
+from assets.protocol_runtime import startup_report
+preloaded["startup_seconds"] = startup_report()["seconds"]
+with open(sys.argv[0] + ".json", "w") as f:
+    json.dump(preloaded, f)
+'''
+
+
+def test_forked_workers_start_with_the_protocol_runtime_loaded(tmp_path):
+    script = tmp_path / "probe.py"
+    script.write_text(PROBE)
+    zygote = ZygoteClient(sys.executable, str(tmp_path / "zygote.sock"), idle_workers=1)
+    try:
+        assert zygote.wait_ready()
+        time.sleep(0.5)  # The idle worker has long been forked when it is handed the script
+        process = zygote.spawn(str(script))
+        assert process.wait(timeout=30) == 0
+    finally:
+        zygote.close()
+
+    result = json.loads((tmp_path / "probe.py.json").read_text())
+    assert result.pop("startup_seconds") < 0.5  # Counted from the fork, not from the zygote's preload
+    assert all(result.values()), result
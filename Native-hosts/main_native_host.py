@@ -2,16 +2,25 @@
 
 import sys
 import json
-import struct
 import traceback
 import os
 import time
-import ast
+import select
+import threading
 
 # Paths for communication and log files
 LOCAL_FOLDER = "/Users/killercookie/Jarvis/"
 
 IDENTITY_PATH = os.path.abspath(__file__)
+# Shared helpers live in MAIN-communication/assets
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(IDENTITY_PATH)), "MAIN-communication"))
+from assets.codec import LineDecoder
+from assets import logger as logging_runtime
+from assets.segments import SegmentedLog, SegmentReader
+from assets.filewatcher import DirectoryWatcher
+from assets.nativemessaging import FrameReader, FrameWriter
+from assets.ringbuffer import RingBuffer
+
 LOG_FILE_PATH = os.path.join(os.path.dirname(IDENTITY_PATH), os.path.basename(IDENTITY_PATH).replace("_", "").replace(".py", ".log"))
 # Create log file if not exist
 if not os.path.exists(LOG_FILE_PATH):
@@ -22,143 +31,344 @@ if not os.path.exists(LOG_FILE_PATH):
 COMPUTER_COMMS_LOG = LOCAL_FOLDER + "Communication-Folder/computer_comms.log"
 EXTENSION_COMMS_LOG = LOCAL_FOLDER + "Communication-Folder/extension_comms.log"
 LAST_POSITION_FILE = LOCAL_FOLDER + "Communication-Folder/last_position.log"
+COMMS_SEGMENT_BYTES = 1024 * 1024 # Size at which a comms bus starts a new segment file
+# Ring buffers created by MAIN_COMMUNICATION when USE_COMMS_RING is enabled; the files are used when they are missing
+COMPUTER_COMMS_RING = LOCAL_FOLDER + "Communication-Folder/computer_comms.ring"
+EXTENSION_COMMS_RING = LOCAL_FOLDER + "Communication-Folder/extension_comms.ring"
+COMMS_RING_SEND_TIMEOUT = 0.05 # Seconds to wait for room in a full ring before falling back to the file bus
+BATCH_MAX_BYTES = 512 * 1024 # Message bytes per batched reply, well under Chrome's 1 MB limit for host replies
+LONG_POLL_MAX_SECONDS = 30 # Longest a keep_alive with "wait" may block before replying empty
 
 message_rate = 10 # message per second
+line_decoder = LineDecoder() # JSON first, literal_eval only for legacy lines
+# Comms buses are segmented (<log>.00000000, ...); consumed segments are deleted once the reader acknowledges them
+extension_bus = SegmentedLog(EXTENSION_COMMS_LOG, segment_bytes=COMMS_SEGMENT_BYTES)
+computer_bus = SegmentedLog(COMPUTER_COMMS_LOG, segment_bytes=COMMS_SEGMENT_BYTES)
+comms_rings = {} # {path: RingBuffer}, reopened when MAIN_COMMUNICATION restarts
+frame_reader = FrameReader(sys.stdin.buffer) # Frames from the extension
+frame_writer = FrameWriter(sys.stdout.buffer) # Frames to the extension; thread-safe for the streaming host
+
+
+def get_ring(path):
+    """Returns the ring buffer at path, or None if no running MAIN_COMMUNICATION owns one"""
+    ring = comms_rings.get(path)
+    if ring is not None and ring.owner_alive():
+        return ring
+    if ring is not None:
+        ring.close()  # MAIN_COMMUNICATION stopped; a restarted one creates a new buffer
+        del comms_rings[path]
+    try:
+        ring = RingBuffer(path)
+    except (OSError, ValueError):
+        return None
+    if not ring.owner_alive():
+        ring.close()  # Left behind by a MAIN_COMMUNICATION that is gone; nobody would read it
+        return None
+    comms_rings[path] = ring
+    return ring
+
+
+logger = logging_runtime.get_logger(LOG_FILE_PATH)
 
 
 # Global variable to control monitoring
 def log(message, file_path=LOG_FILE_PATH):
     """Utility function to log into log file"""
-    with open(file_path, "a") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    logging_runtime.get_logger(file_path).info(message)
 
 def clear_log(file_path):
     """Utility function to clear the contents of a log file"""
-    with open(file_path, "w") as log_file:
-        log_file.write("")  # Clear the file content
+    logging_runtime.clear(file_path)
 
 def clear_all_logs():
     """Utility function to clear all logs it is connected to"""
-    clear_log(COMPUTER_COMMS_LOG)
-    clear_log(EXTENSION_COMMS_LOG)
+    computer_bus.reset()
+    extension_bus.reset()
     clear_log(LAST_POSITION_FILE)
     clear_log(LOG_FILE_PATH)
     log("All logs cleared on initialization.")
 
 def read_message():
-    """Read a full JSON message from stdin using newline as a delimiter."""
-    buffer = sys.stdin.readline().strip()  # Read until newline
+    """Read one native messaging frame (4-byte native-endian length, then UTF-8 JSON) from stdin. Returns None once Chrome closes the pipe."""
     try:
-        message = json.loads(buffer)
-        log(f"Complete message received: {message}")
-        return message
-    except json.JSONDecodeError:
-        log(f"Failed to parse JSON message: {buffer}")
+        message = frame_reader.read()
+    except ValueError as e:
+        log(f"Failed to parse JSON message: {e}")
         sys.exit(1)
+    logger.info("Complete message received: %s", message)
+    return message
+
+def send_message(response, chunked=False):
+    """Sends message back to the extension, split into chunks above Chrome's 1 MB limit if chunked (streaming port only)"""
+    if frame_writer.write(response, chunked=chunked) == 0:
+        log(f"Reply of more than {frame_writer.max_bytes} bytes dropped: {str(response)[:200]}")
+        frame_writer.write({"messages": [], "error": "Reply too large for native messaging"})
+
+def send_reply(response, pending=None):
+    """Sends a one-shot reply, then marks the messages it carried as read
+
+    A batch is cut down to the messages that fit in one frame; the others stay unread
+    for the next keep_alive. Only a single message too large for any reply is dropped."""
+    if pending is None:
+        send_message(response)
+    elif "messages" in response:
+        sent = frame_writer.write_batch(pending)
+        if pending and sent == 0:
+            send_message(pending[0])  # Logs it and tells the extension
+            sent = 1
+        elif sent < len(pending):
+            log(f"Batch split: {len(pending) - sent} message(s) left for the next reply")
+        pending.commit(sent)
+    else:
+        send_message(response)
+        pending.commit()
 
-def send_message(response):
-    """Sends message back to the extension"""
-    response_str = json.dumps(response)
-    response_bytes = response_str.encode('utf-8')
-    response_length = struct.pack('I', len(response_bytes))
-    sys.stdout.buffer.write(response_length)
-    sys.stdout.buffer.write(response_bytes)
-    sys.stdout.buffer.flush()
-
-def read_computer_comms():
-    """Read the messages from MAIN_COMMUNICATION.py through the computer_comms.log file"""
+class PendingMessages(list):
+    """Messages read from MAIN_COMMUNICATION.py, left unread until commit() is called once they are sent"""
+    def __init__(self, messages=(), commit=None):
+        super().__init__(messages)
+        self._commit = commit
+
+    def commit(self, count=None):
+        """Marks the first count messages (all of them by default) as read"""
+        if self._commit is not None:
+            self._commit(len(self) if count is None else count)
+            self._commit = None
+
+def collect_computer_comms(limit=None, max_bytes=None):
+    """Reads the pending messages from MAIN_COMMUNICATION.py, ring first, then the computer_comms.log segments
+
+    Returns PendingMessages: nothing is consumed until their commit() is called"""
     # Utility functions
     def get_last_position():
-        """Gets the line last read from the last_position.log file"""
+        """Gets the (segment, offset) cursor from the last_position.log file"""
         if os.path.exists(LAST_POSITION_FILE):
             with open(LAST_POSITION_FILE, "r") as file:
-                position = file.read().strip()
-                return int(position) if position.isdigit() else 0
-        return 0
+                position = file.read().split()
+                if len(position) == 2 and all(part.isdigit() for part in position):
+                    return (int(position[0]), int(position[1]))
+        return None  # Missing or pre-segment position: start from the oldest segment
 
     def save_last_position(position):
-        """Saves the current position into log_position.log file"""
+        """Saves the current (segment, offset) cursor into last_position.log file"""
         with open(LAST_POSITION_FILE, "w") as file:
-            file.write(str(position))
+            file.write(f"{position[0]} {position[1]}")
+
+    def remaining(count, used):
+        """What is left of the limits after count messages of used bytes"""
+        return (None if limit is None else limit - count), (None if max_bytes is None else max_bytes - used)
 
     # Main function
-    global message_rate
-    last_position = get_last_position()
-
-    if not os.path.exists(COMPUTER_COMMS_LOG):
-        log("computer_comms.log file does not exist")
-        return {}
-
-    while True:  # Continuous loop to keep monitoring
-        log("Monitoring computer comms")
-        with open(COMPUTER_COMMS_LOG, "r") as comm_file:
-            comm_file.seek(last_position)
-            new_lines = comm_file.readlines()
-
-            # If no new lines, wait for a while and check again
-            if not new_lines:
-                wait_time = 1 / message_rate
-                time.sleep(wait_time)
-                return {}
-            
-            # If new lines, process them
-            line = new_lines[0]
-            log(f"New message from computer_comms.log: {line.strip()}")
-
-            # Attempt to parse the line as a dictionary
+    while True:
+        # Messages sent through the ring never touch the file or the saved position
+        ring = get_ring(COMPUTER_COMMS_RING)
+        ring_lines = ring.read_lines(limit, max_bytes, consume=False) if ring is not None else []
+        used = sum(len(line) for line in ring_lines)
+
+        file_lines = []
+        reader = None
+        start = get_last_position()
+        file_limit, file_bytes = remaining(len(ring_lines), used)
+        if (file_limit is None or file_limit > 0) and (file_bytes is None or file_bytes > 0):
+            reader = SegmentReader(computer_bus, cursor=start, use_inotify=False)
             try:
-                message = ast.literal_eval(line.strip())
-            except (SyntaxError, ValueError) as e:
-                log(f"Failed to parse line: {line.strip()}. Error: {e}")
-                continue  # Skip this line if parsing fails
+                file_lines = reader.read_lines(file_limit, file_bytes)
+            finally:
+                reader.close()
+
+        # Attempt to parse each line as a dictionary, skipping the ones that fail
+        messages = []
+        parsed = []  # Per line read, ring first: whether it became a message
+        fallbacks = line_decoder.fallbacks
+        for source, lines in (("computer_comms.ring", ring_lines), ("computer_comms.log", file_lines)):
+            for line in lines:
+                log(f"New message from {source}: {line.strip()}")
+                try:
+                    messages.append(line_decoder.decode(line))
+                    parsed.append(True)
+                except ValueError as e:
+                    log(f"Failed to parse line: {line.strip()}. Error: {e}")
+                    parsed.append(False)
+        if line_decoder.fallbacks != fallbacks:
+            log(f"Legacy line parsed with literal_eval: {line_decoder.stats()}")
+
+        def commit(count, ring=ring, reader=reader, start=start, ring_count=len(ring_lines), parsed=parsed, total=len(messages)):
+            """Consumes the lines behind the first count messages, and any unparsable lines among them"""
+            lines = len(parsed)
+            if count < total:
+                lines = [index for index, ok in enumerate(parsed) if ok][count]  # Up to the first message not sent
+            if ring is not None:
+                ring.consume(min(lines, ring_count))
+            if reader is None:
+                return
+            file_count = max(lines - ring_count, 0)
+            if file_count < len(parsed) - ring_count:
+                # Only part of the file lines were sent: find where the last of them ends
+                reader = SegmentReader(computer_bus, cursor=start, use_inotify=False)
+                try:
+                    if file_count:
+                        reader.read_lines(file_count)
+                finally:
+                    reader.close()
+            if file_count:
+                save_last_position(reader.cursor)
+                reader.ack()
+            if ring is not None:
+                ring.mark_file_read(reader.cursor)  # MAIN_COMMUNICATION goes back to the ring once the file is drained
 
-            save_last_position(comm_file.tell())  # Save position after each action
+        if messages or not parsed:
+            return PendingMessages(messages, commit)
+        commit(0)  # Only unparsable lines: skip them and read again
 
-            return message
+def wait_for_computer_comms(read, timeout):
+    """Calls read() until it returns messages or timeout seconds pass, sleeping on inotify and the ring doorbell in between"""
+    deadline = time.monotonic() + timeout
+    # Watch before the first read so a message written in between still wakes us
+    watcher = DirectoryWatcher(computer_bus.directory, computer_bus.is_segment, poll_interval=1 / message_rate)
+    ring = get_ring(COMPUTER_COMMS_RING)
+    try:
+        while True:
+            messages = read()
+            remaining = deadline - time.monotonic()
+            if messages or remaining <= 0:
+                return messages
+
+            descriptors = [fd for fd in (watcher.fileno(), ring.fileno() if ring is not None else None) if fd is not None]
+            if watcher.fileno() is None:
+                remaining = min(remaining, watcher.poll_interval)  # No inotify: the files must be polled
+            if descriptors:
+                select.select(descriptors, [], [], remaining)
+            else:
+                time.sleep(remaining)
+
+            # Consume the wake-ups so the next select blocks again
+            watcher.wait(0)
+            if ring is not None:
+                ring.wait(0)
+    finally:
+        watcher.close()
+
+def read_computer_comms(wait=0):
+    """Read the next message from MAIN_COMMUNICATION.py, or {} if there is none within wait seconds
+
+    Returns (reply, PendingMessages) so the message is only marked read once the reply is sent"""
+    global message_rate
+
+    logger.debug("Monitoring computer comms")
+    if wait > 0:
+        messages = wait_for_computer_comms(lambda: collect_computer_comms(limit=1), min(wait, LONG_POLL_MAX_SECONDS))
+        return (messages[0] if messages else {}), messages
+    messages = collect_computer_comms(limit=1)
+
+    # If no new lines, wait for a while before the extension checks again
+    if not messages:
+        time.sleep(1 / message_rate)
+        return {}, messages
+    return messages[0], messages
+
+def read_computer_comms_batch(wait=0):
+    """Read every pending message from MAIN_COMMUNICATION.py, up to BATCH_MAX_BYTES, as ({"messages": [...]}, PendingMessages)"""
+    global message_rate
+
+    logger.debug("Monitoring computer comms")
+    if wait > 0:
+        messages = wait_for_computer_comms(lambda: collect_computer_comms(max_bytes=BATCH_MAX_BYTES), min(wait, LONG_POLL_MAX_SECONDS))
+        return {"messages": messages}, messages
+    messages = collect_computer_comms(max_bytes=BATCH_MAX_BYTES)
+
+    if not messages:
+        time.sleep(1 / message_rate)
+    return {"messages": messages}, messages
                 
 def write_extension_comms(message):
     """Send message to MAIN_COMMUNICATION.py through the extension_comms.log file"""
 
     json_message = json.dumps(message)
 
-    log(f"Writing into extension_comms: {str(json_message)}")
+    logger.info("Writing into extension_comms: %s", json_message)
 
-    with open(EXTENSION_COMMS_LOG, "a") as log_file:
-        log_file.write(f"{str(json_message)}\n")
+    ring = get_ring(EXTENSION_COMMS_RING)
+    if ring is not None:
+        # Overflows to the file bus, keeping the order MAIN_COMMUNICATION reads them in
+        ring.send_or_append(json_message, extension_bus, timeout=COMMS_RING_SEND_TIMEOUT)
+    else:
+        extension_bus.append(json_message)
 
 def handle_extension_message(json_message):
-    """Relays the messages between the extension and MAIN_COMMUNICATION.py"""
+    """Relays the messages between the extension and MAIN_COMMUNICATION.py
+
+    Returns (reply, PendingMessages or None); send_reply() marks the messages read once sent"""
 
     if json_message.get("action") == "activate":
         log("Received activation message from Chrome extension")
         clear_all_logs()  # Clear the log before writing
         log("Sound native host activated")
-        return {}
+        return {}, None
     
     elif json_message.get("action") == "keep_alive":
-        log("Received keep_alive message from Chrome extension")
-        return read_computer_comms()  # Keep sending new messages from the log
+        logger.debug("Received keep_alive message from Chrome extension")
+        wait = float(json_message.get("wait") or 0)  # Long-poll: block up to this many seconds for a message
+        if json_message.get("batch"):
+            return read_computer_comms_batch(wait)  # Every pending message in one reply
+        return read_computer_comms(wait)  # Keep sending new messages from the log
     
     else:
-        log(f"Relaying message {json_message} from extension to main")
+        logger.info("Relaying message %s from extension to main", json_message)
         write_extension_comms(json_message)
         return read_computer_comms()
         
 
+def stream_computer_comms():
+    """Pushes messages from MAIN_COMMUNICATION.py to the extension as soon as they arrive"""
+    while True:
+        try:
+            messages = wait_for_computer_comms(lambda: collect_computer_comms(max_bytes=BATCH_MAX_BYTES), LONG_POLL_MAX_SECONDS)
+            if messages:
+                send_message({"messages": messages}, chunked=True)
+                messages.commit()
+        except Exception as e:
+            log(f"Exception while streaming computer comms: {e}")
+            log(traceback.format_exc())
+            time.sleep(1 / message_rate)
+
+def run_streaming_host():
+    """Serves a connectNative port: relays every frame from the extension and pushes replies as they appear, until Chrome disconnects"""
+    log("Streaming mode started")
+    threading.Thread(target=stream_computer_comms, daemon=True).start()
+    while True:
+        json_message = read_message()
+        if json_message is None:
+            log("Extension disconnected")
+            return
+
+        if json_message.get("action") == "activate":
+            handle_extension_message(json_message)
+        elif json_message.get("action") in ("keep_alive", "stream"):
+            pass  # Messages are pushed without being asked for
+        else:
+            logger.info("Relaying message %s from extension to main", json_message)
+            write_extension_comms(json_message)
+
+
 if __name__ == "__main__":
     """Read message from extension and reponds with a message"""
     try:
         log("Sound native host started")
         while True:
             try:
-                message = read_message()
-                log(f"Message received from google: {message}")
-                json_message = json.loads(message)
-                log(f"JSON message: {json_message}")
-
-                response = handle_extension_message(json_message)
-                log(f"Response: {response}")
-                send_message(response)
+                json_message = read_message()
+                if json_message is None:
+                    break  # Chrome closed the pipe
+                logger.info("JSON message: %s", json_message)
+
+                # A connectNative port opens with {"action": "stream"} and stays connected
+                if json_message.get("action") == "stream":
+                    run_streaming_host()
+                    break
+
+                response, pending = handle_extension_message(json_message)
+                logger.info("Response: %s", response)
+                send_reply(response, pending)
 
             except Exception as e:
                 log(f"Exception in message handling: {e}")
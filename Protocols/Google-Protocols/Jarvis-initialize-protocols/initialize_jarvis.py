@@ -11,20 +11,17 @@ Location: Protocols/Other-protocols/template_protocol.py
 
 import time
 import os
-import zmq
 import threading
-import json
 import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "MAIN-communication"))
+from assets.protocol_runtime import ProtocolRuntime
 
-LOG_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.basename(os.path.abspath(__file__)).replace("_", "").replace(".py", ".log"))
-# Create log file if not exist
-if not os.path.exists(LOG_FILE_PATH):
-    with open(LOG_FILE_PATH, 'a') as log_file:
-        pass
 
+runtime = ProtocolRuntime(__file__) # Pipe, log file and message loop
+LOG_FILE_PATH = runtime.log_file_path
+logger = runtime.logger
 
-pipe = None
 
 # active_requests = {requestID: message}
 active_requests = {}
@@ -41,41 +38,17 @@ main_protocolID = ""
 
 def set_up_communication():
     """This function sets up the communication with the main process."""
-    global pipe
-
-    context = zmq.Context()
-    pipe = context.socket(zmq.PAIR)
-    pipe.connect(f"ipc://{identityID}.ipc")
-
-    finish_loading = {
-        "response": "Protocol loaded",
-        "input": None,
-        "sender": identityID,
-        "receiver": "MAIN-communication/MAIN_COMMUNICATION.py",
-        "requestID": main_protocolID,
-    }
-    send_request_message(finish_loading, wait_for_response=False)
-
-    while True:
-        try:
-            message_str = pipe.recv_string().replace("'", '"')
-            message = json.loads(message_str)
-
-            log(f"Received message from main: {message}")
-            handle_main_message(message)
-        except zmq.ZMQError as e:
-            log(f"Error in communication with main: {e}")
-            break
+    runtime.connect(negotiate=False)
+    runtime.mark_loaded()  # "Protocol loaded" with the startup report
+    runtime.serve(handle_main_message)
 
 def log(message, file_path=LOG_FILE_PATH):
     """This function logs messages to a log file."""
-    with open(file_path, "a") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    runtime.log(message)
 
 def clear_log(file_path):
     """This function clears the content of a log file."""
-    with open(file_path, "w") as log_file:
-        log_file.write("")  # Clear the file content
+    runtime.clear_log()
 
 def send_request_message(message, wait_for_response=True):
     """This function sends a request message to the main process, and waits for a response.
@@ -86,12 +59,7 @@ def send_request_message(message, wait_for_response=True):
         message (dict): The response message."""
     global active_requests
 
-    json_message = json.dumps(message)
-    if pipe:
-        pipe.send_string(str(json_message))
-        log(f"Message sent to MAIN_COMMUNICATION: {str(json_message)}")
-    else:
-        log("Pipe is not open, message not sent.")
+    runtime.send(message)
 
     active_requests[message.get('requestID')] = message
 
@@ -259,7 +227,7 @@ class Subprotocol():
 def handle_main_message(message):
     global active_requests
 
-    log(f"Handling message from main: {message}")
+    logger.info("Handling message from main: %s", message)
     
     if message.get('request'):
         handle_requests(message)
@@ -309,8 +277,9 @@ if __name__ == "__main__":
     clear_log(LOG_FILE_PATH)  # Clear sound_logs.log on start
     log("Template Protocol started")
 
-    identityID = sys.stdin.readline().strip()
-    main_protocolID = sys.stdin.readline().strip()
+    runtime.read_subprocess_info()  # {subprotocolID: info} line MAIN_COMMUNICATION writes to stdin
+    identityID = runtime.identityID
+    main_protocolID = runtime.main_protocolID
     # Create and start a thread for handling communication
     communication_thread = threading.Thread(target=set_up_communication, daemon=True)
     communication_thread.start()
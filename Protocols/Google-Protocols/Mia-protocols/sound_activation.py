@@ -10,69 +10,46 @@ Location: Protocols/Audio-protocols/sound_activation.py
 """
 
 
-import pyaudio
-import numpy as np
 import time
 import os
 import traceback
-import zmq
 import threading
-import json
+import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "MAIN-communication"))
+from assets.protocol_runtime import ProtocolRuntime, lazy_import
 
-IDENTITY_PATH = os.path.abspath(__file__)
-LOG_FILE_PATH = os.path.join(os.path.dirname(IDENTITY_PATH), os.path.basename(IDENTITY_PATH).replace("_", "").replace(".py", ".log"))
-# Create log file if not exist
-if not os.path.exists(LOG_FILE_PATH):
-    with open(LOG_FILE_PATH, 'a') as log_file:
-        pass
+# Imported when the first audio chunk is processed, not before the protocol can take messages
+pyaudio = lazy_import("pyaudio")
+np = lazy_import("numpy")
 
-stop_event = threading.Event()
 
+runtime = ProtocolRuntime(__file__) # Pipe, log file and message loop
+IDENTITY_PATH = runtime.identity_path
+LOG_FILE_PATH = runtime.log_file_path
+logger = runtime.logger
+
+stop_event = threading.Event()
 
-pipe = None
 
 def set_up_communication():
-    global pipe
-
-    context = zmq.Context()
-    pipe = context.socket(zmq.PAIR)
-    pipe.connect(f"ipc://{IDENTITY_PATH}.ipc")
-    handle_main_communication(pipe)
+    """Connects to MAIN_COMMUNICATION.py then processes the messages it sends"""
+    runtime.read_subprocess_info()  # {subprotocolID: info} line MAIN_COMMUNICATION writes to stdin
+    runtime.connect(negotiate=False)
+    runtime.mark_loaded()  # MAIN_COMMUNICATION waits for this before sending "start"
+    runtime.serve(handle_main_message)
 
 def log(message, file_path=LOG_FILE_PATH):
     """Utility function to log into log file."""
-    with open(file_path, "a") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    runtime.log(message)
 
 def clear_log(file_path):
     """Utility function to clear the contents of a log file."""
-    with open(file_path, "w") as log_file:
-        log_file.write("")  # Clear the file content
-
-def handle_main_communication(pipe):
-    """Read the message from the pipe from MAIN_COMMUNICATION.py then process it"""
-    while True:
-        try:
-            message_str = pipe.recv_string().replace("'", '"')
-            message = json.loads(message_str)
-
-            log(f"Received message from main: {message}")
-            handle_main_message(message)
-        except zmq.ZMQError as e:
-            log(f"Error in communication with main: {e}")
-            break
+    runtime.clear_log()
 
 def send_main_message(message):
     """"Send message to MAIN_COMMUNICATION.py"""
-    json_message = json.dumps(message)
-        
-    # Ensure the pipe is open and ready before sending
-    if pipe:
-        pipe.send_string(str(json_message))
-        log(f"Message sent to MAIN_COMMUNICATION: {str(json_message)}")
-    else:
-        log("Pipe is not open, message not sent.")
+    runtime.send(message)
 
 
 
@@ -81,7 +58,7 @@ def send_main_message(message):
 def handle_main_message(message):
     """Process the message from MAIN_COMMUNICATION.py"""
     global stop_event
-    log(f"Handling message from main: {message}")
+    logger.info("Handling message from main: %s", message)
 
     if message['action'] == "start":
         log("Message for sound_activation main process start")
@@ -145,7 +122,7 @@ def main():
             if rms is None:
                 continue
 
-            log(f"RMS value: {rms}")
+            logger.debug("RMS value: %s", rms)
 
             if rms > VOICE_THRESHOLD:
                 continuous_voice_frames += 1
@@ -7,31 +7,35 @@ Inputs: None
 Outputs: None
 Subprotocols: None
 Location: Protocols/Other-protocols/template_protocol.py
+Execution: process
 """
 
 import time
 import os
-import zmq
 import threading
-import json
 import sys
-import random
-import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "MAIN-communication"))
+from assets.protocol_runtime import ProtocolRuntime, generate_ID
+from assets.correlation import PendingRequests
 
-LOG_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.basename(os.path.abspath(__file__)).replace("_", "").replace(".py", ".log"))
-# Create log file if not exist
-if not os.path.exists(LOG_FILE_PATH):
-    with open(LOG_FILE_PATH, 'a') as log_file:
-        pass
+# Heavy dependencies are imported on first use so they do not delay "Protocol loaded", e.g.
+# from assets.protocol_runtime import lazy_import
+# np = lazy_import("numpy")
 
+runtime = ProtocolRuntime(__file__) # Pipe, log file and message loop
+LOG_FILE_PATH = runtime.log_file_path
+logger = runtime.logger
 
-pipe = None
 
-# active_requests = {messageID: message}
-active_requests = {}
-# request_responses = {messageID: response_message}
-request_responses = {}
+REQUEST_TIMEOUT = 120 # Seconds to wait for a response before send_request_message raises TimeoutError
+USE_ASYNC_SDK = False # Run on an asyncio event loop with handle_requests_async / main_async instead of threads
+
+# Requests waiting for a response, completed by handle_main_message
+pending_requests = PendingRequests()
+request_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="request") # Runs incoming requests
+running_requests = set() # Futures of the requests request_executor is running, drained before "release" is confirmed
 # active_subprotocols = {subprotocolID: subprotocol_path}
 active_subprotocols = {}
 # global_variables = {variable_name: variable_value}
@@ -47,134 +51,82 @@ MOTHER_PROTOCOLID = None
 #%% Functions
 def set_up_communication():
     """This function sets up the communication with the main process."""
-    global pipe
-
-    context = zmq.Context()
-    pipe = context.socket(zmq.PAIR)
-    ipc_path = IDENTITYID.replace("subprocess_", "").replace(".py", "") + ".ipc"
-    pipe.connect(f"ipc://{ipc_path}")
-
-    finish_loading = {
-        "response": "Protocol loaded",
-        "input": None,
-        "sender": IDENTITYID,
-        "receiver": "MAIN-communication/MAIN_COMMUNICATION.py",
-        "messageID": IDENTITYID + f"_{generate_ID()}",
-    }
-    send_request_message(finish_loading, wait_for_response=False)
-
-    while True:
-        try:
-            message_str = pipe.recv_string().replace("'", '"')
-            message = json.loads(message_str)
-
-            log(f"Received message from main: {message}")
-            handle_main_message(message)
-        except zmq.ZMQError as e:
-            log(f"Error in communication with main: {e}")
-            break
+    runtime.connect()
+    runtime.mark_loaded(rebindable=True) # handle_main_message answers "rebind"
+    runtime.serve(handle_main_message)
 
 def log(message, file_path=LOG_FILE_PATH):
     """This function logs messages to a log file."""
-    with open(file_path, "a") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    runtime.log(message)
 
 def clear_log(file_path):
     """This function clears the content of a log file."""
-    with open(file_path, "w") as log_file:
-        log_file.write("")  # Clear the file content
-
-def generate_ID():
-    BASE62_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    runtime.clear_log()
 
-    def base62_encode(num):
-        """Convert a number to Base-62 string."""
-        if num == 0:
-            return BASE62_ALPHABET[0]
-
-        base62 = []
-        while num:
-            num, rem = divmod(num, 62)
-            base62.append(BASE62_ALPHABET[rem])
-
-        return ''.join(reversed(base62))
-
-    # Get current timestamp (milliseconds)
-    timestamp = int(time.time() * 1000)  # e.g., 1700101234567
-
-    # Convert timestamp to Base-62
-    timestamp_base62 = base62_encode(timestamp)
-
-    # Generate a random 3-character Base-62 string
-    rand_str = ''.join(random.choices(BASE62_ALPHABET, k=3))
-
-    # Compute a short hash checksum (Base-62)
-    hash_input = f"{timestamp_base62}{rand_str}".encode()
-    checksum = hashlib.md5(hash_input).digest()  # Generate MD5 hash
-    hash_int = int.from_bytes(checksum, "big")  # Convert bytes to int
-    hash_base62 = base62_encode(hash_int)[:2]  # Take first 2 characters
-
-    return f"{timestamp_base62}{rand_str}{hash_base62}"
-
-def send_request_message(message, wait_for_response=True):
+def send_request_message(message, wait_for_response=True, timeout=REQUEST_TIMEOUT):
     """This function sends a request message to the main process, and waits for a response.
     
     Args:
         message (dict): The message to send.
+        wait_for_response (bool): Whether to block until the response arrives.
+        timeout (float): Seconds to wait before raising TimeoutError, None to wait forever.
     Ouput:
-        message (dict): The response message."""
-    global active_requests
+        message (dict): The response message, or None if not waiting."""
+    messageID = message.get('messageID')
+    # Registered before sending so a fast response cannot arrive first
+    future = pending_requests.register(messageID) if wait_for_response else None
 
-    json_message = json.dumps(message)
-    if pipe:
-        pipe.send_string(str(json_message))
-        log(f"Message sent to MAIN_COMMUNICATION: {str(json_message)}")
-    else:
-        log("Pipe is not open, message not sent.")
+    if not runtime.send(message):
+        if future is not None:
+            pending_requests.discard(messageID)
+        return None
 
-    active_requests[message.get('messageID')] = message
+    if future is None:
+        return None
+    return pending_requests.wait(messageID, future, timeout)
 
-    # Wait for response
-    def waiting_for_response():
-        while message.get('messageID') in active_requests:
-            time.sleep(1)
-        request_response = request_responses[message.get('messageID')]
-        request_responses.pop(message.get('messageID'))
-        return request_response
-
-    if wait_for_response:
-        return waiting_for_response()
-    else:
-        response_thread = threading.Thread(target=waiting_for_response, daemon=True)
-        response_thread.start()
-        response_thread.join()
-
-def send_output(output):
+def send_output(output, request=None):
     """Send the output to the main protocol that activated this protocol.
     
     Args:
         output (dict): The output of the protocol.
+        request (dict): The "start" request being answered. The output reuses its messageID,
+            so the mother protocol waiting on that request receives it.
     """
     response_message = {
         "response": IDENTITYID + " response",
         "input": output,
         "sender": IDENTITYID,
         "receiver": MOTHER_PROTOCOLID,
-        "messageID": IDENTITYID + f"_{generate_ID()}",
+        "messageID": request.get('messageID') if request else IDENTITYID + f"_{generate_ID()}",
     }
     send_request_message(response_message, wait_for_response=False)
 
 def handle_main_message(message):
-    global active_requests
-
-    log(f"Handling message from main: {message}")
+    logger.info("Handling message from main: %s", message)
     
-    if message.get('request'):
-        handle_requests(message)
+    if message.get('request') == "rebind":
+        # Reused from MAIN_COMMUNICATION's pool; handled here so it is applied before the next request runs
+        runtime.rebind(message.get('input'))
+        initialize_constants()
+        # Nothing from the previous activation carries over
+        active_subprotocols.clear()
+        pending_requests.clear()
+
+    elif message.get('request') == "release":
+        # Deactivated: confirm once the running requests are done, so MAIN_COMMUNICATION only pools an idle protocol
+        threading.Thread(target=confirm_release, args=(message,), daemon=True).start()
+
+    elif message.get('request'):
+        # Off the receiving thread, so requests that wait on responses cannot block their delivery
+        future = request_executor.submit(handle_requests, message)
+        running_requests.add(future)
+        future.add_done_callback(running_requests.discard)
+        future.add_done_callback(
+            lambda done: done.exception() and log(f"Error handling request {message.get('messageID')}: {done.exception()}"))
 
     elif message.get('response'):
-        active_requests.pop(message.get('messageID'))
-        request_responses[message.get('messageID')] = message
+        pending_requests.resolve(message.get('messageID'), message)  # Wakes the waiting sender, if any
 
         if message.get('response') == "Protocol activated":
             active_subprotocols[message.get('messageID')] = message.get('sender')
@@ -183,6 +135,17 @@ def handle_main_message(message):
             active_subprotocols.pop(message.get('messageID'))
     return
 
+def confirm_release(message):
+    """Answers MAIN_COMMUNICATION's "release" request once no request is running any more."""
+    wait(running_requests.copy())
+    send_request_message({
+        "response": "Protocol released",
+        "input": None,
+        "sender": IDENTITYID,
+        "receiver": message.get('sender'),
+        "messageID": message.get('messageID'),
+    }, wait_for_response=False)
+
 class Subprotocol():
     def __init__(self, subprotocol_type, subprotocol_path, subprotocolID=None, tab_name=None):
         self.subprotocol_type = subprotocol_type
@@ -207,9 +170,14 @@ class Subprotocol():
 
         if not self.subprotocolID:
             if self.subprotocol_type == "Python file":
+                # Only loads the subprotocol; execute_subprotocol sends the "start" request
                 message = {
-                    "request": "activate_subprotocol",
-                    "input": {"script_path": self.subprotocol_path, "subprotocolID": self.subprotocol_path + f"_{int(time.time())}"},
+                    "request": "initialize_subprocess",
+                    "input": {
+                        "script_path": self.subprotocol_path,
+                        "subprotocolID": f"subprocess_{self.subprotocol_path}_{generate_ID()}",
+                        "protocol_info": {"mother_protocolID": IDENTITYID, "main_protocolID": MAIN_PROTOCOLID},
+                    },
                     "sender": IDENTITYID,
                     "receiver": "MAIN-communication/MAIN_COMMUNICATION.py",
                     "messageID": IDENTITYID + f"_{generate_ID()}",
@@ -247,12 +215,13 @@ class Subprotocol():
             if self.subprotocol_type == "Python file":
                 active_subprotocols.pop(self.subprotocolID)
                 deactivate_message = {
-                    "request": "deactivate_subprotocol",
+                    "request": "deactivate_subprocess",
                     "input": {"subprotocolID": self.subprotocolID},
                     "sender": IDENTITYID,
                     "receiver": "MAIN-communication/MAIN_COMMUNICATION.py",
                     "messageID": IDENTITYID + f"_{generate_ID()}",
                 }
+                self.subprotocolID = None
                 send_request_message(deactivate_message, wait_for_response=True)
 
             elif self.subprotocol_type == "Google extension function":
@@ -273,7 +242,7 @@ class Subprotocol():
             subprotocolID (str): The subprotocol ID.
             input (dict): The input for the subprocess.
         Output:
-            message (dict): The response message.
+            message (dict): The response message, which carries the messageID of the "start" request.
         """
         if self.subprotocol_type == "Python file":
             if not self.subprotocolID:
@@ -312,7 +281,7 @@ def handle_requests(message):
     if message.get('request') == "start":
         log("Message for main process to start")
         output = main(message.get('input'))   
-        send_output(output)
+        send_output(output, message)
 
     else:
         log(f"Warning: Unkown request {message.get('request')}")
@@ -341,28 +310,62 @@ def main(input):
         return output
 
     output = do_something(input_a, input_b, input_c)
-    send_output(output)
+    return output
 
 
 
-#%% PROTOCOL MODIFICATION ABOVE
+async def handle_requests_async(client, message):
+    """handle_requests for USE_ASYNC_SDK. Each request runs in its own task."""
+    if message.get('request') == "start":
+        log("Message for main process to start")
+        output = await main_async(client, message.get('input'))
+        await client.send_output(output, message)
+
+    else:
+        log(f"Warning: Unkown request {message.get('request')}")
+
+async def main_async(client, input):
+    # Independent subprotocols run concurrently, so this takes as long as the slowest one
+    templete_subprotocols = [
+        AsyncSubprotocol(client, "Python file", "Protocols/Other-protocols/template_subprotocol.py")
+        for _ in range(3)
+    ]
+    search = AsyncSubprotocol(client, "Google extension function", "https://www.google.com", action="Tab_Protocols.search_google")
+    *outputs, search_output = await asyncio.gather(
+        *(subprotocol.execute({"input_a": input.get('input_a'), "input_b": index}) for index, subprotocol in enumerate(templete_subprotocols)),
+        search.execute({"query": input.get('input_c')}, timeout=30),
+    )
+    await search.deactivate()
+
+    # Cancelling (or a timeout) stops the children that are still running
+    try:
+        await asyncio.wait_for(templete_subprotocols[0].execute({"input_a": input.get('input_a')}), timeout=10)
+    except asyncio.TimeoutError:
+        log("Subprotocol took too long")
+
+    return [output.get('input') for output in outputs]
+
+async def run_async_protocol():
+    client = AsyncProtocolClient(IDENTITYID, MOTHER_PROTOCOLID, generate_ID, request_timeout=REQUEST_TIMEOUT, main_protocolID=MAIN_PROTOCOLID)
+    client.handle_request = lambda message: handle_requests_async(client, message)
+    try:
+        await client.run_forever()
+    finally:
+        await client.close()
 
-def read_subprotocol_info():
-    """Read the subprotocol info from the main process."""
-    subprocess_info = sys.stdin.readline().strip()
-    subprocess_info = json.loads(subprocess_info)
-    log(f"Subprocess info: {subprocess_info}")
-    return subprocess_info
+
+
+#%% PROTOCOL MODIFICATION ABOVE
 
 def initialize_constants():
     """Initialize the constants for the protocol."""
     global SUBPROCESS_INFO, IDENTITYID, MAIN_PROTOCOLID, MOTHER_PROTOCOLID
     
     # SUBPROCESS_INFO = {subprotocolID: {subprotocol_path, mother_protocolID, main_protocolID, process, pipe, loaded, thread, other_info: {}}}
-    SUBPROCESS_INFO = read_subprotocol_info()
-    IDENTITYID = list(SUBPROCESS_INFO.keys())[0]
-    MAIN_PROTOCOLID = SUBPROCESS_INFO.get(IDENTITYID).get('main_protocolID')
-    MOTHER_PROTOCOLID = SUBPROCESS_INFO.get(IDENTITYID).get('mother_protocolID')
+    SUBPROCESS_INFO = runtime.read_subprocess_info()
+    IDENTITYID = runtime.identityID
+    MAIN_PROTOCOLID = runtime.main_protocolID
+    MOTHER_PROTOCOLID = runtime.mother_protocolID
 
 if __name__ == "__main__":
     clear_log(LOG_FILE_PATH)  # Clear sound_logs.log on start
@@ -370,6 +373,13 @@ if __name__ == "__main__":
 
     initialize_constants()
 
+    if USE_ASYNC_SDK:
+        # Imported only here, so threaded protocols do not pay for asyncio before "Protocol loaded"
+        import asyncio
+        from assets.protocol_async import AsyncProtocolClient, AsyncSubprotocol
+        asyncio.run(run_async_protocol())
+        sys.exit(0)
+
     # Create and start a thread for handling communication
     communication_thread = threading.Thread(target=set_up_communication, daemon=True)
     communication_thread.start()
@@ -7,66 +7,46 @@ Inputs: Command details
 Outputs: Related protocols
 Subprotocols: None
 Location: Protocols/Protocol-analysis-protocols/get_related_protocols.py
+Execution: process
 """
 
 import time
 import os
-import zmq
 import threading
 import json
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "MAIN-communication"))
+from assets.protocol_runtime import ProtocolRuntime
 
 
 # Paths for communication and log files
-IDENTITY_PATH = os.path.abspath(__file__)
-LOG_FILE_PATH = os.path.join(os.path.dirname(IDENTITY_PATH), os.path.basename(IDENTITY_PATH).replace("_", "").replace(".py", ".log"))
-# Create log file if not exist
-if not os.path.exists(LOG_FILE_PATH):
-    with open(LOG_FILE_PATH, 'a') as log_file:
-        pass
-
-pipe = None
+runtime = ProtocolRuntime(__file__) # Pipe, log file and message loop
+IDENTITY_PATH = runtime.identity_path
+LOG_FILE_PATH = runtime.log_file_path
+logger = runtime.logger
+
 requests_sent = {}
 request_responses = {}
 
 def set_up_communication():
     """This function sets up the communication with the main process."""
-    global pipe
-
-    context = zmq.Context()
-    pipe = context.socket(zmq.PAIR)
-    pipe.connect(f"ipc://{IDENTITY_PATH}.ipc")
-    handle_main_communication(pipe)
+    runtime.read_subprocess_info()  # {subprotocolID: info} line MAIN_COMMUNICATION writes to stdin
+    runtime.connect(negotiate=False)
+    runtime.mark_loaded()  # MAIN_COMMUNICATION waits for this before sending "start"
+    runtime.serve(handle_main_message)
 
 def log(message, file_path=LOG_FILE_PATH):
     """This function logs messages to a log file."""
-    with open(file_path, "a") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    runtime.log(message)
 
 def clear_log(file_path):
     """This function clears the content of a log file."""
-    with open(file_path, "w") as log_file:
-        log_file.write("")  # Clear the file content
-
-def handle_main_communication(pipe):
-    while True:
-        try:
-            message_str = pipe.recv_string().replace("'", '"')
-            message = json.loads(message_str)
-
-            log(f"Received message from main: {message}")
-            handle_main_message(message)
-        except zmq.ZMQError as e:
-            log(f"Error in communication with main: {e}")
-            break
+    runtime.clear_log()
 
 def send_main_message(message):
     """This function sends a message to the main process."""
-    json_message = json.dumps(message)
-    if pipe:
-        pipe.send_string(str(json_message))
-        log(f"Message sent to MAIN_COMMUNICATION: {str(json_message)}")
-    else:
-        log("Pipe is not open, message not sent.")
+    runtime.send(message)
 
 def send_quit_message():
     """This function sends a quit message to the main process."""
@@ -99,7 +79,7 @@ def wait_for_response(request_message):
 def handle_main_message(message):
     global requests_sent
 
-    log(f"Handling message from main: {message}")
+    logger.info("Handling message from main: %s", message)
 
     if message.get('action'):
         if message.get('action') == "start":
@@ -7,6 +7,7 @@ Outputs: protocol_mapping.json
 Tags: protocol, mapping, json
 Subprotocols: None
 Location: Protocols/Protocol-analysis-protocols/map_protocols.py
+Execution: in-process
 
 
 Author: Nguyen Ba Phi
@@ -16,57 +17,33 @@ Date: 2024-11-4
 
 import time
 import os
-import zmq
 import threading
 import json
 
 import ast
 from collections import defaultdict
+import sys
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "MAIN-communication"))
+from assets.protocol_runtime import ProtocolRuntime
 
-# Paths for communication and log files
-IDENTITY_PATH = os.path.abspath(__file__)
-LOG_FILE_PATH = os.path.join(os.path.dirname(IDENTITY_PATH), os.path.basename(IDENTITY_PATH).replace("_", "").replace(".py", ".log"))
-# Create log file if not exist
-if not os.path.exists(LOG_FILE_PATH):
-    with open(LOG_FILE_PATH, 'a') as log_file:
-        pass
 
-context = zmq.Context()
-pipe = context.socket(zmq.PAIR)
-pipe.connect(f"ipc://{IDENTITY_PATH}.ipc")
+# Paths for communication and log files
+runtime = ProtocolRuntime(__file__) # Pipe, log file and message loop
+IDENTITY_PATH = runtime.identity_path
+LOG_FILE_PATH = runtime.log_file_path
+logger = runtime.logger
 
 stop_event = threading.Event()
 
 def log(message, file_path=LOG_FILE_PATH):
-    with open(file_path, "a") as log_file:
-        log_file.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    runtime.log(message)
 
 def clear_log(file_path):
-    with open(file_path, "w") as log_file:
-        log_file.write("")  # Clear the file content
-
-def handle_main_communication(pipe):
-    while True:
-        try:
-            message_str = pipe.recv_string().replace("'", '"')
-            message = json.loads(message_str)
-
-            log(f"Received message from main: {message}")
-            handle_main_message(message)
-        except zmq.ZMQError as e:
-            log(f"Error in communication with main: {e}")
-            break
+    runtime.clear_log()
 
 def send_main_message(message):
-    json_message = json.dumps(message)
-        
-    # Ensure the pipe is open and ready before sending
-    if pipe:
-        pipe.send_string(str(json_message))
-        log(f"Message sent to MAIN_COMMUNICATION: {str(json_message)}")
-    else:
-        log("Pipe is not open, message not sent.")
+    runtime.send(message)
 
 def send_quit_message():
     quit_message = {
@@ -83,7 +60,7 @@ def send_quit_message():
 
 def handle_main_message(message):
     global stop_event
-    log(f"Handling message from main: {message}")
+    logger.info("Handling message from main: %s", message)
 
     if message['action'] == "start":
         log("Message for main process to start")
@@ -202,8 +179,10 @@ if __name__ == "__main__":
     log("Template Protocol started")
 
     # Create and start a thread for handling communication
-    communication_thread = threading.Thread(target=handle_main_communication, args=(pipe,), daemon=True)
-    communication_thread.start()
+    runtime.read_subprocess_info()  # {subprotocolID: info} line MAIN_COMMUNICATION writes to stdin
+    runtime.connect(negotiate=False)
+    runtime.mark_loaded()  # MAIN_COMMUNICATION waits for this before sending "start"
+    communication_thread = runtime.serve_in_background(handle_main_message)
 
     while True:
         time.sleep(1)
\ No newline at end of file